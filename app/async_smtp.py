@@ -0,0 +1,276 @@
+import asyncio
+import os
+import threading
+import time
+from typing import List, Optional
+import aiosmtplib
+from app.config import settings
+from app.metrics import ASYNC_POOL_IN_USE, ASYNC_POOL_MAX, SMTP_AUTH, SMTP_CONNECT, SMTP_SEND
+from app.mime import PreparedMessage
+from app.tracing import span, with_current_context
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPooledConnection:
+    """Conexión aiosmtplib autenticada con metadatos para reciclarla"""
+
+    def __init__(self, client: aiosmtplib.SMTP):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+    async def close(self):
+        try:
+            await self.client.quit()
+        except Exception:
+            self.client.close()
+
+
+class AsyncSMTPPool:
+    """
+    Pool de conexiones aiosmtplib para el motor de envío asíncrono.
+
+    Mismas reglas de reciclaje que ``SMTPConnectionPool``; el número de
+    conexiones abiertas lo acota un semáforo de ``max_size``.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        use_ssl: bool = False,
+        use_tls: bool = True,
+        max_size: int = 20,
+        idle_timeout: float = 60.0,
+        max_lifetime: float = 600.0,
+        max_messages: int = 100,
+        health_check_interval: float = 15.0,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl or port == 465
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.max_messages = max_messages
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self._idle: List[AsyncPooledConnection] = []
+        self._slots = asyncio.Semaphore(max_size)
+        self._in_use = 0
+        ASYNC_POOL_MAX.set(max_size)
+
+    async def _connect(self) -> AsyncPooledConnection:
+        """Abre y autentica una nueva conexión SMTP asíncrona"""
+        client = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            use_tls=self.use_ssl,
+            start_tls=False,
+            timeout=self.timeout,
+        )
+        start = time.perf_counter()
+        with span("smtp.connect", {"smtp.ssl": self.use_ssl}):
+            await client.connect()
+        if self.use_tls and not self.use_ssl:
+            with span("smtp.starttls"):
+                await client.starttls()
+        SMTP_CONNECT.observe(time.perf_counter() - start)
+        if self.user:
+            start = time.perf_counter()
+            with span("smtp.login"):
+                await client.login(self.user, self.password)
+            SMTP_AUTH.observe(time.perf_counter() - start)
+        return AsyncPooledConnection(client)
+
+    async def _is_reusable(self, conn: AsyncPooledConnection) -> bool:
+        now = time.monotonic()
+        if not conn.client.is_connected:
+            return False
+        if now - conn.created_at > self.max_lifetime:
+            return False
+        if now - conn.last_used > self.idle_timeout:
+            return False
+        if conn.messages_sent >= self.max_messages:
+            return False
+        if now - conn.last_used > self.health_check_interval:
+            try:
+                response = await conn.client.noop()
+                return response.code == 250
+            except (aiosmtplib.SMTPException, OSError):
+                return False
+        return True
+
+    async def acquire(self) -> AsyncPooledConnection:
+        """Obtiene una conexión sana del pool o abre una nueva"""
+        await self._slots.acquire()
+        try:
+            conn = None
+            while self._idle and conn is None:
+                candidate = self._idle.pop()
+                if await self._is_reusable(candidate):
+                    conn = candidate
+                else:
+                    await candidate.close()
+            if conn is None:
+                conn = await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_use += 1
+        ASYNC_POOL_IN_USE.inc()
+        return conn
+
+    async def release(self, conn: AsyncPooledConnection, discard: bool = False):
+        """Devuelve una conexión al pool (o la cierra si está rota o agotada)"""
+        conn.last_used = time.monotonic()
+        self._in_use -= 1
+        ASYNC_POOL_IN_USE.dec()
+        try:
+            if discard or conn.messages_sent >= self.max_messages:
+                await conn.close()
+            else:
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    async def send_message(self, message) -> None:
+        """Envía un mensaje reconectando una vez si el servidor cerró la sesión"""
+        for attempt in range(2):
+            conn = await self.acquire()
+            discard = False
+            try:
+                start = time.perf_counter()
+                with span("smtp.send"):
+                    if isinstance(message, PreparedMessage):
+                        await conn.client.sendmail(message.from_addr, message.to_addrs, message.data)
+                    else:
+                        await conn.client.send_message(message)
+                SMTP_SEND.observe(time.perf_counter() - start)
+                conn.messages_sent += 1
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                discard = True
+                if attempt:
+                    raise
+                logger.warning("Conexión SMTP asíncrona cerrada por el servidor, reconectando")
+            except (aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError, OSError):
+                discard = True
+                raise
+            finally:
+                await self.release(conn, discard=discard)
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+        }
+
+    async def close_all(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
+
+
+class AsyncDeliveryEngine:
+    """
+    Event loop dedicado por proceso worker para envíos concurrentes.
+
+    El loop corre en un hilo propio y conserva el pool de conexiones entre
+    tareas; las tareas de Celery (síncronas) le envían corrutinas con
+    ``run``.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="async-smtp-engine", daemon=True
+        )
+        self._thread.start()
+        self.pool = self.run(self._create_pool())
+
+    async def _create_pool(self) -> AsyncSMTPPool:
+        # El semáforo del pool debe crearse dentro del loop del motor
+        return AsyncSMTPPool(
+            host=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            user=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            use_ssl=settings.SMTP_USE_SSL,
+            use_tls=settings.SMTP_USE_TLS,
+            max_size=settings.ASYNC_SMTP_POOL_SIZE,
+            idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+            max_lifetime=settings.SMTP_POOL_MAX_LIFETIME,
+            max_messages=settings.SMTP_POOL_MAX_MESSAGES,
+            health_check_interval=settings.SMTP_POOL_HEALTH_CHECK_INTERVAL,
+            timeout=settings.SMTP_TIMEOUT,
+        )
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Ejecuta una corrutina en el loop del motor (con la traza actual) y espera su resultado"""
+        return asyncio.run_coroutine_threadsafe(with_current_context(coro), self.loop).result(timeout)
+
+    async def _send_all(self, messages: list) -> list:
+        # Limita las corrutinas activas; el pool limita las conexiones abiertas
+        concurrency = asyncio.Semaphore(settings.ASYNC_SMTP_CONCURRENCY)
+
+        async def send_one(message):
+            async with concurrency:
+                try:
+                    await self.pool.send_message(message)
+                    return None
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*(send_one(message) for message in messages))
+
+    def send_messages(self, messages: list) -> list:
+        """
+        Envía ``messages`` concurrentemente.
+
+        Devuelve una lista paralela con ``None`` para cada mensaje enviado o
+        la excepción que lo rechazó.
+        """
+        return self.run(self._send_all(messages))
+
+    def close(self):
+        try:
+            self.run(self.pool.close_all(), timeout=settings.SMTP_TIMEOUT)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_engine: Optional[AsyncDeliveryEngine] = None
+_engine_pid: Optional[int] = None
+_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncDeliveryEngine:
+    """Devuelve el motor asíncrono del proceso actual (se recrea tras un fork)"""
+    global _engine, _engine_pid
+    pid = os.getpid()
+    if _engine is None or _engine_pid != pid:
+        with _engine_lock:
+            if _engine is None or _engine_pid != pid:
+                _engine = AsyncDeliveryEngine()
+                _engine_pid = pid
+    return _engine
+
+
+def close_async_engine():
+    """Detiene el motor del proceso actual si existe"""
+    global _engine
+    if _engine is not None and _engine_pid == os.getpid():
+        _engine.close()
+    _engine = None
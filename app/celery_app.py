@@ -1,25 +1,77 @@
 from celery import Celery
+from kombu import Exchange, Queue
 from app.config import settings
+from app.progress import tracks_started
+from app.serialization import register_serializers, configured_serializer
+from app.worker_profiles import celery_options
+
+# Clases de mensaje -> cola de Redis
+QUEUE_TRANSACTIONAL = 'email_transactional'
+QUEUE_BULK = 'email_bulk'
+QUEUE_LOW = 'email_low'
+
+MESSAGE_CLASS_QUEUES = {
+    'transactional': QUEUE_TRANSACTIONAL,
+    'bulk': QUEUE_BULK,
+    'low': QUEUE_LOW,
+}
+
+# Prioridad por defecto de cada clase (Redis: 0 es la más alta, 9 la más baja)
+MESSAGE_CLASS_PRIORITY = {
+    'transactional': 0,
+    'bulk': 5,
+    'low': 9,
+}
 
 def create_celery_app() -> Celery:
     celery_app = Celery(
         "email_queue_system",
         broker=settings.REDIS_URL,
-        backend=settings.REDIS_URL,
-        include=['app.tasks']
+        # Backend Redis que no escribe nada para mensajes con ignore_result
+        backend=f"app.results:EmailResultBackend+{settings.REDIS_URL}",
+        include=['app.tasks', 'app.scheduler']
     )
     
+    # Se aceptan todos los codecs disponibles: cambiar CELERY_SERIALIZER no
+    # invalida los mensajes ya encolados
+    accepted = register_serializers()
+    serializer = configured_serializer()
+    
     # Configuración de Celery
     celery_app.conf.update(
-        task_serializer='json',
-        accept_content=['json'],
-        result_serializer='json',
+        task_serializer=serializer,
+        accept_content=accepted,
+        result_serializer=serializer,
         timezone='UTC',
         enable_utc=True,
-        task_track_started=True,
+        task_track_started=tracks_started(),
+        # Los resultados caducan: sin TTL las claves celery-task-meta-* crecen sin límite
+        result_expires=settings.RESULT_EXPIRES or None,
+        # Pool de conexiones al broker dimensionado explícitamente
+        broker_pool_limit=settings.BROKER_POOL_LIMIT,
+        broker_transport_options={
+            'max_connections': settings.BROKER_MAX_CONNECTIONS,
+            # Una lista de Redis por nivel de prioridad (0-9)
+            'priority_steps': list(range(10)),
+            'sep': ':',
+            'queue_order_strategy': 'priority',
+            # Con acks_late, tiempo que un mensaje reservado espera antes de reentregarse
+            'visibility_timeout': settings.BROKER_VISIBILITY_TIMEOUT,
+        },
+        # Exchange propio por cola para que cada routing key llegue a una sola cola
+        task_queues=[
+            Queue(name, Exchange(name, type='direct'), routing_key=name)
+            for name in MESSAGE_CLASS_QUEUES.values()
+        ],
+        task_default_queue=QUEUE_TRANSACTIONAL,
+        task_default_priority=MESSAGE_CLASS_PRIORITY['transactional'],
         task_routes={
-            'app.tasks.send_email_task': 'email_queue'
-        }
+            'send_email_task': {'queue': QUEUE_TRANSACTIONAL},
+            'send_email_batch_task': {'queue': QUEUE_BULK},
+            'send_email_async_batch_task': {'queue': QUEUE_BULK},
+        },
+        # Pool, concurrencia, prefetch, acks_late y reciclado según WORKER_PROFILE
+        **celery_options()
     )
     
     return celery_app
@@ -7,6 +7,8 @@ load_dotenv()
 class Settings:
     # Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
     
     # SMTP Configuration
     SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.gmail.com")
@@ -15,6 +17,130 @@ class Settings:
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
     SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
     SMTP_USE_SSL: bool = os.getenv("SMTP_USE_SSL", "false").lower() == "true"
+    SMTP_TIMEOUT: float = float(os.getenv("SMTP_TIMEOUT", "30"))
+    
+    # SMTP Connection Pool (por proceso worker)
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "4"))  # 0 = una conexión por hilo del worker
+    SMTP_POOL_IDLE_TIMEOUT: float = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "60"))
+    SMTP_POOL_MAX_LIFETIME: float = float(os.getenv("SMTP_POOL_MAX_LIFETIME", "600"))
+    SMTP_POOL_MAX_MESSAGES: int = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "100"))
+    SMTP_POOL_HEALTH_CHECK_INTERVAL: float = float(os.getenv("SMTP_POOL_HEALTH_CHECK_INTERVAL", "15"))
+    
+    # Async delivery engine (aiosmtplib)
+    ASYNC_SMTP_POOL_SIZE: int = int(os.getenv("ASYNC_SMTP_POOL_SIZE", "50"))
+    ASYNC_SMTP_CONCURRENCY: int = int(os.getenv("ASYNC_SMTP_CONCURRENCY", "200"))
+    
+    # Worker profiles (io | cpu | batch; vacío = valores por defecto de Celery)
+    WORKER_PROFILE: str = os.getenv("WORKER_PROFILE", "")
+    # Sobrescriben el perfil; 0 o vacío = valor del perfil
+    WORKER_POOL: str = os.getenv("WORKER_POOL", "")  # prefork | threads | gevent
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "0"))
+    WORKER_PREFETCH_MULTIPLIER: int = int(os.getenv("WORKER_PREFETCH_MULTIPLIER", "0"))
+    WORKER_MAX_TASKS_PER_CHILD: int = int(os.getenv("WORKER_MAX_TASKS_PER_CHILD", "0"))
+    TASK_ACKS_LATE: str = os.getenv("TASK_ACKS_LATE", "")  # true | false
+    BROKER_VISIBILITY_TIMEOUT: int = int(os.getenv("BROKER_VISIBILITY_TIMEOUT", "3600"))  # Segundos
+    
+    # Bulk publishing
+    BULK_MAX_MESSAGES: int = int(os.getenv("BULK_MAX_MESSAGES", "100000"))
+    PUBLISH_CHUNK_SIZE: int = int(os.getenv("PUBLISH_CHUNK_SIZE", "500"))
+    PUBLISH_PIPELINE_DEPTH: int = int(os.getenv("PUBLISH_PIPELINE_DEPTH", "10"))
+    
+    # Background publisher (API -> broker)
+    PUBLISH_QUEUE_SIZE: int = int(os.getenv("PUBLISH_QUEUE_SIZE", "10000"))
+    PUBLISH_MICROBATCH_SIZE: int = int(os.getenv("PUBLISH_MICROBATCH_SIZE", "200"))
+    PUBLISH_MICROBATCH_WAIT: float = float(os.getenv("PUBLISH_MICROBATCH_WAIT", "0.002"))
+    BROKER_POOL_LIMIT: int = int(os.getenv("BROKER_POOL_LIMIT", "10"))
+    BROKER_MAX_CONNECTIONS: int = int(os.getenv("BROKER_MAX_CONNECTIONS", "20"))
+    
+    STATUS_BATCH_MAX: int = int(os.getenv("STATUS_BATCH_MAX", "10000"))
+    STATUS_STREAM_TIMEOUT: float = float(os.getenv("STATUS_STREAM_TIMEOUT", "300"))
+    STATUS_STREAM_KEEPALIVE: float = float(os.getenv("STATUS_STREAM_KEEPALIVE", "15"))
+    
+    # Batch delivery (send_email_batch_task)
+    EMAIL_BATCH_SIZE: int = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
+    EMAIL_BATCH_ENGINE: str = os.getenv("EMAIL_BATCH_ENGINE", "smtp")  # smtp | async
+    EMAIL_BATCH_MAX_RETRIES: int = int(os.getenv("EMAIL_BATCH_MAX_RETRIES", "3"))
+    EMAIL_BATCH_RETRY_DELAY: int = int(os.getenv("EMAIL_BATCH_RETRY_DELAY", "30"))
+    
+    # Retries de errores SMTP transitorios (4xx, desconexiones, timeouts)
+    EMAIL_MAX_RETRIES: int = int(os.getenv("EMAIL_MAX_RETRIES", "5"))
+    EMAIL_RETRY_BACKOFF: float = float(os.getenv("EMAIL_RETRY_BACKOFF", "10"))
+    EMAIL_RETRY_BACKOFF_MAX: float = float(os.getenv("EMAIL_RETRY_BACKOFF_MAX", "600"))
+    
+    # Dead letters (Redis Stream con los envíos fallidos definitivamente)
+    DEAD_LETTER_STREAM: str = os.getenv("DEAD_LETTER_STREAM", "email_dead_letter")
+    DEAD_LETTER_MAXLEN: int = int(os.getenv("DEAD_LETTER_MAXLEN", "100000"))
+    DEAD_LETTER_PAGE_SIZE: int = int(os.getenv("DEAD_LETTER_PAGE_SIZE", "1000"))
+    DEAD_LETTER_REPLAY_MAX: int = int(os.getenv("DEAD_LETTER_REPLAY_MAX", "100000"))
+    
+    # Adjuntos por referencia (ruta local o blob subido con POST /attachments)
+    ATTACHMENT_DIR: str = os.getenv("ATTACHMENT_DIR", "")  # Vacío = adjuntos por ruta deshabilitados
+    ATTACHMENT_MAX_BYTES: int = int(os.getenv("ATTACHMENT_MAX_BYTES", "10485760"))  # 10 MB
+    ATTACHMENT_TTL: int = int(os.getenv("ATTACHMENT_TTL", "86400"))  # Segundos que se guarda cada blob
+    
+    # Transporte de /send-email: celery (listas del broker) | streams (Redis Streams, python -m app.streams)
+    EMAIL_TRANSPORT: str = os.getenv("EMAIL_TRANSPORT", "celery")
+    STREAM_PREFIX: str = os.getenv("STREAM_PREFIX", "email_stream")  # Un stream por cola: email_stream:<cola>
+    STREAM_GROUP: str = os.getenv("STREAM_GROUP", "email_senders")
+    STREAM_BATCH_SIZE: int = int(os.getenv("STREAM_BATCH_SIZE", "100"))  # Entradas por XREADGROUP/XAUTOCLAIM
+    STREAM_BLOCK_MS: int = int(os.getenv("STREAM_BLOCK_MS", "1000"))
+    STREAM_CONCURRENCY: int = int(os.getenv("STREAM_CONCURRENCY", "0"))  # 0 = tamaño del pool SMTP
+    STREAM_CLAIM_IDLE: float = float(os.getenv("STREAM_CLAIM_IDLE", "120"))  # Segundos sin XACK antes de reclamar
+    STREAM_CLAIM_INTERVAL: float = float(os.getenv("STREAM_CLAIM_INTERVAL", "30"))
+    STREAM_MAX_DELIVERIES: int = int(os.getenv("STREAM_MAX_DELIVERIES", "5"))  # Más entregas = dead letter
+    
+    # Envíos programados (send_at): ZSET en Redis liberado por lotes
+    SCHEDULE_KEY: str = os.getenv("SCHEDULE_KEY", "email_schedule")
+    SCHEDULE_PAYLOAD_KEY: str = os.getenv("SCHEDULE_PAYLOAD_KEY", "email_schedule_payload")
+    SCHEDULER_ENABLED: bool = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"  # Dispatcher en cada worker
+    SCHEDULER_BATCH_SIZE: int = int(os.getenv("SCHEDULER_BATCH_SIZE", "1000"))
+    SCHEDULER_POLL_INTERVAL: float = float(os.getenv("SCHEDULER_POLL_INTERVAL", "1.0"))
+    
+    # Idempotencia de /send-email (idempotency_key)
+    IDEMPOTENCY_TTL: int = int(os.getenv("IDEMPOTENCY_TTL", "86400"))  # Segundos que se recuerda cada clave
+    IDEMPOTENCY_CLAIM_TTL: int = int(os.getenv("IDEMPOTENCY_CLAIM_TTL", "300"))  # Reserva del worker durante el envío
+    
+    # Rate limiting (token bucket en Redis): "N/s", "N/m" o "N/h"; vacío = sin límite
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+    RATE_LIMIT_ACCOUNT: str = os.getenv("RATE_LIMIT_ACCOUNT", "10/s")
+    RATE_LIMIT_DOMAIN_DEFAULT: str = os.getenv("RATE_LIMIT_DOMAIN_DEFAULT", "")
+    RATE_LIMIT_DOMAINS: str = os.getenv("RATE_LIMIT_DOMAINS", "")  # gmail.com=20/s,outlook.com=600/m
+    RATE_LIMIT_MIN_DELAY: float = float(os.getenv("RATE_LIMIT_MIN_DELAY", "0.5"))
+    
+    # Email templates (Jinja2)
+    TEMPLATE_CACHE_SIZE: int = int(os.getenv("TEMPLATE_CACHE_SIZE", "256"))
+    
+    # Serialización: json | msgpack para broker y backend, json | orjson para la API
+    CELERY_SERIALIZER: str = os.getenv("CELERY_SERIALIZER", "json")
+    SERIALIZER_COMPRESSION: str = os.getenv("SERIALIZER_COMPRESSION", "none")  # none | zlib | zstd
+    SERIALIZER_COMPRESSION_THRESHOLD: int = int(os.getenv("SERIALIZER_COMPRESSION_THRESHOLD", "1024"))  # Bytes
+    API_JSON_RESPONSE: str = os.getenv("API_JSON_RESPONSE", "json")
+    
+    # Result backend: retención y tamaño de los resultados
+    RESULT_EXPIRES: int = int(os.getenv("RESULT_EXPIRES", "86400"))  # Segundos; 0 = sin expiración
+    RESULT_COMPACT: bool = os.getenv("RESULT_COMPACT", "false").lower() == "true"
+    BULK_RESULT_MODE: str = os.getenv("BULK_RESULT_MODE", "full")  # full | ignore | aggregate
+    
+    # Progress reporting: full | coalesced | off | final-only
+    PROGRESS_MODE: str = os.getenv("PROGRESS_MODE", "full")
+    PROGRESS_MIN_INTERVAL: float = float(os.getenv("PROGRESS_MIN_INTERVAL", "1.0"))
+    
+    # Health checks
+    HEALTH_REDIS_TIMEOUT: float = float(os.getenv("HEALTH_REDIS_TIMEOUT", "0.25"))
+    HEALTH_CACHE_TTL: float = float(os.getenv("HEALTH_CACHE_TTL", "30"))
+    HEALTH_INSPECT_TIMEOUT: float = float(os.getenv("HEALTH_INSPECT_TIMEOUT", "1.0"))
+    
+    # Prometheus metrics (requiere prometheus_client)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", "0"))  # 0 = sin exportador en el worker
+    
+    # Tracing (OpenTelemetry, requiere opentelemetry-sdk)
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))  # Fracción de solicitudes trazadas
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "otlp")  # otlp | file | console
+    TRACING_OTLP_ENDPOINT: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACING_FILE: str = os.getenv("TRACING_FILE", "traces.jsonl")  # Con TRACING_EXPORTER=file
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "email-queue")  # Sufijos -api / -worker
     
     # Application Configuration
     APP_NAME: str = os.getenv("APP_NAME", "Email Queue System")
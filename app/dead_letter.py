@@ -0,0 +1,140 @@
+import json
+import time
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def record_dead_letter(task_name: str, payload: dict, error: BaseException, error_class: str,
+                       code: Optional[int] = None, task_id: Optional[str] = None,
+                       attempts: int = 1) -> Optional[str]:
+    """
+    Guarda un envío fallido definitivamente en el stream de dead letters.
+
+    ``payload`` son los kwargs originales del correo (para poder reenviarlo).
+    Devuelve el ID de la entrada o ``None`` si Redis no responde: perder la
+    entrada no debe ocultar el fallo original de la tarea.
+    """
+    to_email = payload.get("to_email", "")
+    entry = {
+        "task_name": task_name,
+        "task_id": task_id or "",
+        "to_email": to_email,
+        "domain": to_email.rsplit("@", 1)[-1].lower(),
+        "error": str(error),
+        "error_type": type(error).__name__,
+        "error_class": error_class,
+        "code": "" if code is None else str(code),
+        "attempts": attempts,
+        "failed_at": time.time(),
+        "payload": json.dumps(payload),
+    }
+    try:
+        return get_redis().xadd(
+            settings.DEAD_LETTER_STREAM, entry,
+            maxlen=settings.DEAD_LETTER_MAXLEN, approximate=True,
+        ).decode()
+    except Exception as e:
+        logger.error(f"No se pudo guardar el dead letter de {to_email}: {str(e)}")
+        return None
+
+
+def decode_entry(entry_id: bytes, fields: dict) -> dict:
+    """Convierte una entrada del stream en el formato de la API"""
+    fields = {key.decode(): value.decode() for key, value in fields.items()}
+    return {
+        "id": entry_id.decode(),
+        "task_name": fields["task_name"],
+        "task_id": fields.get("task_id") or None,
+        "to_email": fields["to_email"],
+        "domain": fields["domain"],
+        "error": fields["error"],
+        "error_type": fields["error_type"],
+        "error_class": fields["error_class"],
+        "code": int(fields["code"]) if fields.get("code") else None,
+        "attempts": int(fields["attempts"]),
+        "failed_at": float(fields["failed_at"]),
+        "payload": json.loads(fields["payload"]),
+    }
+
+
+def _matches(entry: dict, error_class: Optional[str], domain: Optional[str], code: Optional[int]) -> bool:
+    return (
+        (error_class is None or entry["error_class"] == error_class)
+        and (domain is None or entry["domain"] == domain.lower())
+        and (code is None or entry["code"] == code)
+    )
+
+
+async def list_dead_letters(redis_client, error_class: Optional[str] = None, domain: Optional[str] = None,
+                            code: Optional[int] = None, limit: int = 100,
+                            cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Dead letters más recientes primero que cumplen los filtros.
+
+    Recorre el stream con ``XREVRANGE`` en páginas de
+    ``DEAD_LETTER_PAGE_SIZE`` entradas. Devuelve las entradas y el cursor
+    (ID de la última devuelta) para pedir la página siguiente, o ``None``
+    si se llegó al final del stream.
+    """
+    entries = []
+    max_id = f"({cursor}" if cursor else "+"
+    while True:
+        page = await redis_client.xrevrange(
+            settings.DEAD_LETTER_STREAM, max=max_id, min="-", count=settings.DEAD_LETTER_PAGE_SIZE
+        )
+        for entry_id, fields in page:
+            entry = decode_entry(entry_id, fields)
+            if _matches(entry, error_class, domain, code):
+                entries.append(entry)
+                if len(entries) == limit:
+                    return entries, entry["id"]
+        if len(page) < settings.DEAD_LETTER_PAGE_SIZE:
+            return entries, None
+        max_id = f"({page[-1][0].decode()}"
+
+
+async def fetch_dead_letters(redis_client, ids: List[str]) -> List[dict]:
+    """Lee dead letters por ID en un solo pipeline (ignora los que ya no existen)"""
+    pipe = redis_client.pipeline(transaction=False)
+    for entry_id in ids:
+        pipe.xrange(settings.DEAD_LETTER_STREAM, min=entry_id, max=entry_id)
+    return [decode_entry(*found[0]) for found in await pipe.execute() if found]
+
+
+async def delete_dead_letters(redis_client, ids: List[str]) -> int:
+    """Borra dead letters del stream en bloques de ``DEAD_LETTER_PAGE_SIZE``"""
+    deleted = 0
+    for start in range(0, len(ids), settings.DEAD_LETTER_PAGE_SIZE):
+        deleted += await redis_client.xdel(
+            settings.DEAD_LETTER_STREAM, *ids[start:start + settings.DEAD_LETTER_PAGE_SIZE]
+        )
+    return deleted
+
+
+def to_replay_batches(entries: List[dict], batch_size: Optional[int] = None) -> List[dict]:
+    """
+    Agrupa dead letters en lotes para las tareas de lote.
+
+    Los correos de ``send_email_task`` y de lotes sin plantilla ya tienen
+    ``to_email``/``subject``/``body``; los de plantilla se agrupan por
+    plantilla y versión para renderizarse igual que la primera vez.
+    """
+    size = batch_size or settings.EMAIL_BATCH_SIZE
+    groups = {}
+    for entry in entries:
+        item = dict(entry["payload"])
+        template = item.pop("template", None)
+        key = json.dumps(template, sort_keys=True)
+        groups.setdefault(key, (template, []))[1].append(item)
+
+    batches = []
+    for template, items in groups.values():
+        batches.extend(
+            {"messages": items[start:start + size], "template": template}
+            for start in range(0, len(items), size)
+        )
+    return batches
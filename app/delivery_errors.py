@@ -0,0 +1,59 @@
+import random
+import smtplib
+from typing import Optional, Tuple
+import aiosmtplib
+from app.config import settings
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+class EmailDeliveryError(Exception):
+    """Fallo definitivo de un envío (se registra como FAILURE en Celery)"""
+
+
+def smtp_code(error: BaseException) -> Optional[int]:
+    """Código de respuesta SMTP de una excepción de smtplib/aiosmtplib, si lo tiene"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return codes[0] if codes else None
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        codes = [refused.code for refused in error.recipients]
+        return codes[0] if codes else None
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code
+    return None
+
+
+def classify_error(error: BaseException) -> Tuple[str, Optional[int]]:
+    """
+    Clasifica un error de envío como ``transient`` o ``permanent``.
+
+    - Respuestas 4xx, desconexiones, timeouts y errores de red: transitorios,
+      el mismo envío puede funcionar más tarde.
+    - Respuestas 5xx y cualquier otro error (plantilla inválida, mensaje mal
+      formado...): permanentes, reintentar no cambia el resultado.
+    """
+    code = smtp_code(error)
+    if code is not None:
+        return (TRANSIENT if 400 <= code < 500 else PERMANENT), code
+    if isinstance(error, (smtplib.SMTPServerDisconnected, aiosmtplib.SMTPServerDisconnected,
+                          aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError, OSError)):
+        return TRANSIENT, None
+    return PERMANENT, None
+
+
+def retry_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """
+    Backoff exponencial con jitter para el reintento número ``attempt`` (desde 0).
+
+    Se usa la mitad del retardo fija y la otra mitad aleatoria, así los
+    correos que fallaron juntos durante una caída del proveedor no vuelven
+    todos en el mismo instante.
+    """
+    base = settings.EMAIL_RETRY_BACKOFF if base is None else base
+    cap = settings.EMAIL_RETRY_BACKOFF_MAX if cap is None else cap
+    delay = min(cap, base * (2 ** attempt))
+    return round(delay / 2 + random.uniform(0, delay / 2), 2)
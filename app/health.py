@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from app.celery_app import celery_app, MESSAGE_CLASS_QUEUES
+from app.config import settings
+from app.status import get_async_redis
+from app.streams import TRANSPORT_STREAMS, streams_enabled, stream_key
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def redis_ready() -> bool:
+    """PING asíncrono a Redis con timeout corto"""
+    try:
+        return await asyncio.wait_for(
+            get_async_redis().ping(), timeout=settings.HEALTH_REDIS_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning(f"Redis no disponible: {str(e)}")
+        return False
+
+
+class WorkerReportCache:
+    """
+    Informe de workers de Celery refrescado en segundo plano.
+
+    ``inspect().stats()`` es un broadcast que espera la respuesta de todos
+    los workers; se ejecuta cada ``ttl`` segundos en un hilo aparte y los
+    endpoints solo leen la última copia. Con ``EMAIL_TRANSPORT=streams`` el
+    estado depende de los consumidores de los streams, no de Celery.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._report = {
+            "status": "unknown",
+            "celery_workers": 0,
+            "redis_connection": "unknown",
+            "workers": {},
+            "checked_at": None,
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def _inspect(self) -> dict:
+        inspection = celery_app.control.inspect(timeout=settings.HEALTH_INSPECT_TIMEOUT)
+        return inspection.stats() or {}
+
+    def _stream_consumers(self) -> dict:
+        """
+        Consumidores de los streams activos en los últimos ``STREAM_CLAIM_IDLE`` segundos.
+
+        Un consumidor caído sigue en el grupo hasta que se borra: cuenta
+        como vivo solo si ha leído (o reclamado) dentro del mismo plazo que
+        usa ``XAUTOCLAIM`` para darlo por muerto.
+        """
+        queues = list(MESSAGE_CLASS_QUEUES.values())
+        pipe = get_redis().pipeline(transaction=False)
+        for queue in queues:
+            pipe.xinfo_consumers(stream_key(queue), settings.STREAM_GROUP)
+        consumers = {}
+        # Stream o grupo sin crear (ningún consumidor ha arrancado): ResponseError
+        for queue, infos in zip(queues, pipe.execute(raise_on_error=False)):
+            if isinstance(infos, Exception):
+                continue
+            for info in infos:
+                idle = info["idle"] / 1000
+                if idle > settings.STREAM_CLAIM_IDLE:
+                    continue
+                consumer = consumers.setdefault(info["name"].decode(), {"streams": [], "pending": 0, "idle_seconds": idle})
+                consumer["streams"].append(queue)
+                consumer["pending"] += info["pending"]
+                consumer["idle_seconds"] = min(consumer["idle_seconds"], idle)
+        return consumers
+
+    def _collect(self) -> dict:
+        stats = self._inspect()
+        report = {
+            "status": "healthy" if stats else "unhealthy",
+            "celery_workers": len(stats),
+            "redis_connection": "connected" if stats else "disconnected",
+            "workers": {
+                name: {
+                    "pool": worker.get("pool", {}),
+                    "total": worker.get("total", {}),
+                    "uptime": worker.get("uptime"),
+                }
+                for name, worker in stats.items()
+            },
+        }
+        if streams_enabled():
+            # /send-email no pasa por Celery: la salud depende de los consumidores
+            consumers = self._stream_consumers()
+            report.update(
+                status="healthy" if consumers else "unhealthy",
+                redis_connection="connected",
+                transport=TRANSPORT_STREAMS,
+                stream_consumers=consumers,
+            )
+        return report
+
+    async def refresh(self):
+        try:
+            report = await run_in_threadpool(self._collect)
+        except Exception as e:
+            logger.error(f"Error en health check: {str(e)}")
+            report = {
+                "status": "unhealthy",
+                "celery_workers": 0,
+                "redis_connection": "disconnected",
+                "workers": {},
+                "error": str(e),
+            }
+        report["checked_at"] = time.time()
+        self._report = report
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.ttl)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> dict:
+        report = dict(self._report)
+        checked_at = report.get("checked_at")
+        report["age_seconds"] = round(time.time() - checked_at, 3) if checked_at else None
+        return report
+
+
+worker_report = WorkerReportCache(ttl=settings.HEALTH_CACHE_TTL)
@@ -0,0 +1,83 @@
+from typing import Optional, Tuple
+from app.config import settings
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Claves en Redis:
+#   email_idempotency:<key>  -> ID de la tarea creada para la clave (API)
+#   email_delivery:<key>     -> "sending:<task_id>" mientras un worker envía,
+#                               "sent:<task_id>" cuando el correo salió (worker)
+IDEMPOTENCY_KEY = "email_idempotency:{key}"
+DELIVERY_KEY = "email_delivery:{key}"
+
+SENDING = "sending"
+SENT = "sent"
+
+# Borra la reserva solo si sigue siendo de esta tarea
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def claim_task_id(redis_client, key: str, task_id: str) -> Optional[str]:
+    """
+    Asocia ``key`` a ``task_id`` con un ``SET NX`` atómico.
+
+    Devuelve ``None`` si la clave es nueva (hay que encolar ``task_id``) o el
+    ID de la tarea ya creada para esa clave.
+    """
+    redis_key = IDEMPOTENCY_KEY.format(key=key)
+    while True:
+        if await redis_client.set(redis_key, task_id, nx=True, ex=settings.IDEMPOTENCY_TTL):
+            return None
+        existing = await redis_client.get(redis_key)
+        # Si expiró entre el SET y el GET se vuelve a intentar
+        if existing is not None:
+            return existing.decode()
+
+
+async def release_task_id(redis_client, key: str, task_id: str):
+    """Libera la clave si no se pudo encolar la tarea (el cliente puede reintentar)"""
+    await redis_client.eval(RELEASE_LUA, 1, IDEMPOTENCY_KEY.format(key=key), task_id)
+
+
+def claim_delivery(key: str, task_id: str) -> Tuple[bool, Optional[str]]:
+    """
+    Reserva el envío de ``key`` para ``task_id`` antes de hablar con SMTP.
+
+    Devuelve ``(True, None)`` si esta tarea debe enviar el correo o
+    ``(False, estado)`` si ya se envió (``sent``) o lo está enviando otra
+    entrega del mensaje (``sending``). La reserva expira tras
+    ``IDEMPOTENCY_CLAIM_TTL`` segundos por si el worker muere a mitad.
+    """
+    client = get_redis()
+    redis_key = DELIVERY_KEY.format(key=key)
+    if client.set(redis_key, f"{SENDING}:{task_id}", nx=True, ex=settings.IDEMPOTENCY_CLAIM_TTL):
+        return True, None
+    current = client.get(redis_key)
+    if current is None:
+        # La reserva anterior expiró justo ahora
+        return claim_delivery(key, task_id)
+    return False, current.decode().split(":", 1)[0]
+
+
+def mark_delivered(key: str, task_id: str):
+    """Marca el correo como enviado durante ``IDEMPOTENCY_TTL`` segundos"""
+    try:
+        get_redis().set(DELIVERY_KEY.format(key=key), f"{SENT}:{task_id}", ex=settings.IDEMPOTENCY_TTL)
+    except Exception as e:
+        # El correo ya salió: no fallar la tarea (se reintentaría y se duplicaría)
+        logger.error(f"No se pudo marcar como enviado el correo con clave {key}: {str(e)}")
+
+
+def release_delivery(key: str, task_id: str):
+    """Libera la reserva tras un fallo para que el reintento pueda enviar"""
+    try:
+        get_redis().eval(RELEASE_LUA, 1, DELIVERY_KEY.format(key=key), f"{SENDING}:{task_id}")
+    except Exception as e:
+        logger.error(f"No se pudo liberar la reserva del correo con clave {key}: {str(e)}")
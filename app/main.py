@@ -1,10 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, HTTPException, Path, Query, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from app.schemas import EmailRequest, TaskResponse, TaskStatusResponse, TaskStatus
-from app.tasks import send_email_task
-from app.celery_app import celery_app
-from celery.result import AsyncResult
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.schemas import (
+    EmailRequest, BulkEmailRequest, TaskResponse, BulkTaskResponse, TaskStatusResponse,
+    BatchStatusRequest, BatchStatusResponse, TemplateRequest, TemplateResponse, TEMPLATE_ID_PATTERN,
+    MessageClass, DeadLetterListResponse, DeadLetterReplayRequest, AttachmentResponse, ScheduleStatsResponse
+)
+from app.tasks import send_email_task, send_email_batch_task, send_email_async_batch_task
+from app.publisher import publish_batch, get_publisher, get_background_publisher
+from app.templating import register_template, get_current_version, get_template_source
+from app.status import (
+    get_async_redis, fetch_task_meta, fetch_many_task_meta, fetch_group_task_ids, build_status_response,
+    summarize, summarize_aggregate, close_async_redis
+)
+from app.streaming import sse_stream, task_events, close_status_hub
+from app.health import redis_ready, worker_report
+from app.serialization import response_class, dumps
+from app.results import result_mode, fetch_batch_stats
+from app.idempotency import claim_task_id, release_task_id
+from app.mime import store_attachment
+from app.scheduler import to_timestamp, cancel_scheduled, scheduled_stats
+from app.metrics import ENABLED as METRICS_ENABLED, render_metrics
+from app.tracing import TracingMiddleware, record_validation, setup_tracing
+from app.streams import streams_enabled, enqueue as enqueue_stream
+from app.dead_letter import list_dead_letters, fetch_dead_letters, delete_dead_letters, to_replay_batches
+from app.celery_app import MESSAGE_CLASS_QUEUES, MESSAGE_CLASS_PRIORITY
+from app.config import settings
+from jinja2 import TemplateError
+from typing import Optional
+import asyncio
 import logging
+import queue
+import uuid
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -14,7 +42,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Email Queue System",
     description="Sistema de envío de correos con colas usando Celery y Redis",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson si API_JSON_RESPONSE=orjson
+    default_response_class=response_class()
 )
 
 # Configurar CORS
@@ -26,6 +56,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Span por solicitud (TRACING_ENABLED); el provider se crea en el arranque
+if settings.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+def resolve_priority(message_class: MessageClass, priority: Optional[int]) -> int:
+    """Prioridad explícita o, si no se indica, la de la clase de mensaje"""
+    return priority if priority is not None else MESSAGE_CLASS_PRIORITY[message_class.value]
+
+async def release_idempotency_key(key: Optional[str], task_id: Optional[str]):
+    """Libera la clave de una tarea que no se llegó a encolar"""
+    if not (key and task_id):
+        return
+    try:
+        await release_task_id(get_async_redis(), key, task_id)
+    except Exception as e:
+        logger.error(f"No se pudo liberar la clave de idempotencia {key}: {str(e)}")
+
+@app.on_event("startup")
+async def startup():
+    """Inicia el refresco en segundo plano del informe de workers"""
+    setup_tracing(settings.TRACING_SERVICE_NAME + "-api")
+    worker_report.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Cierra el cliente Redis asíncrono al detener la API"""
+    await worker_report.stop()
+    await close_status_hub()
+    await close_async_redis()
+
 @app.get("/")
 async def root():
     """Endpoint raíz con información de la API"""
@@ -34,7 +94,22 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "send_email": "/send-email",
+            "send_emails": "/send-emails",
+            "attachments": "/attachments",
+            "schedule": "/schedule",
+            "templates": "/templates/{template_id}",
             "task_status": "/status/{task_id}",
+            "batch_status": "/status/batch",
+            "group_status": "/status/group/{batch_id}",
+            "task_stream": "/status/{task_id}/stream",
+            "group_stream": "/status/group/{batch_id}/stream",
+            "status_websocket": "/ws/status",
+            "dead_letters": "/dead-letters",
+            "dead_letters_replay": "/dead-letters/replay",
+            "health": "/health",
+            "health_live": "/health/live",
+            "health_ready": "/health/ready",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
@@ -48,68 +123,254 @@ async def send_email(email_request: EmailRequest):
     - **subject**: Asunto del correo
     - **body**: Contenido del mensaje
     - **from_email**: Email del remitente (opcional, usa el configurado por defecto)
+    - **queue**: Clase de mensaje: transactional (por defecto), bulk o low
+    - **priority**: Prioridad 0 (más alta) a 9 (más baja); por defecto la de la clase
+    - **idempotency_key**: Clave para reintentar la solicitud sin duplicar el correo (opcional)
+    - **attachments**: Adjuntos por referencia: `path` (en ATTACHMENT_DIR) o `blob` de POST /attachments
+    - **send_at**: Fecha de envío programado (opcional; UTC si no lleva zona horaria)
     """
+    record_validation()
+    key = email_request.idempotency_key
+    task_id = None
     try:
         logger.info(f"Recibida solicitud de envío de correo para: {email_request.to}")
         
-        # Enviar tarea a Celery
-        task = send_email_task.delay(
-            to_email=str(email_request.to),
-            subject=email_request.subject,
-            body=email_request.body,
-            from_email=email_request.from_email
+        kwargs = email_request.to_task_kwargs()
+        if key:
+            # SET NX: solo la primera solicitud con la clave crea la tarea
+            task_id = str(uuid.uuid4())
+            existing = await claim_task_id(get_async_redis(), key, task_id)
+            if existing:
+                logger.info(f"Clave de idempotencia {key} ya usada por la tarea {existing}")
+                meta = await fetch_task_meta(existing)
+                return TaskResponse(
+                    task_id=existing,
+                    status=meta["status"],
+                    message=f"Tarea existente para la clave de idempotencia. ID: {existing}",
+                    duplicate=True
+                )
+            kwargs["idempotency_key"] = key
+        
+        priority = resolve_priority(email_request.queue, email_request.priority)
+        queue_name = MESSAGE_CLASS_QUEUES[email_request.queue.value]
+        send_at = to_timestamp(email_request.send_at)
+        if streams_enabled():
+            # EMAIL_TRANSPORT=streams: un XADD directo, lo consume python -m app.streams
+            task_id = task_id or str(uuid.uuid4())
+            await enqueue_stream(get_async_redis(), queue_name, task_id, kwargs, send_at)
+            logger.info(f"Tarea {task_id} añadida al stream de {queue_name}")
+            return TaskResponse(
+                task_id=task_id,
+                status="PENDING",
+                message=f"Tarea de envío de correo creada. ID: {task_id}",
+                send_at=email_request.send_at if send_at is not None else None
+            )
+        if send_at is not None:
+            # Programado: el mensaje espera en el ZSET del scheduler, no en el worker
+            task_id = task_id or str(uuid.uuid4())
+            await run_in_threadpool(
+                get_publisher().publish, send_email_task.name, [kwargs],
+                priority=priority, options={'queue': queue_name}, task_ids=[task_id], send_at=send_at
+            )
+            logger.info(f"Tarea {task_id} programada para {email_request.send_at}")
+            return TaskResponse(
+                task_id=task_id,
+                status="PENDING",
+                message=f"Envío de correo programado. ID: {task_id}",
+                send_at=email_request.send_at
+            )
+        
+        # Enviar tarea a Celery sin bloquear el event loop
+        task_id = await get_background_publisher().enqueue(
+            send_email_task.name,
+            kwargs,
+            priority=priority,
+            queue=queue_name,
+            task_id=task_id
         )
         
-        logger.info(f"Tarea creada con ID: {task.id}")
+        logger.info(f"Tarea creada con ID: {task_id}")
         
         return TaskResponse(
-            task_id=task.id,
+            task_id=task_id,
             status="PENDING",
-            message=f"Tarea de envío de correo creada. ID: {task.id}"
+            message=f"Tarea de envío de correo creada. ID: {task_id}"
         )
         
+    except queue.Full:
+        logger.warning("Cola de publicación llena, rechazando solicitud")
+        await release_idempotency_key(key, task_id)
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio saturado, reintenta en unos segundos"
+        )
     except Exception as e:
         logger.error(f"Error creando tarea de envío de correo: {str(e)}")
+        await release_idempotency_key(key, task_id)
         raise HTTPException(
             status_code=500,
             detail=f"Error interno del servidor: {str(e)}"
         )
 
-@app.get("/status/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str):
+@app.post("/attachments", response_model=AttachmentResponse)
+async def upload_attachment(file: UploadFile = File(...)):
     """
-    Endpoint para consultar el estado de una tarea
+    Sube un adjunto para referenciarlo como `blob` en /send-email y /send-emails
     
-    - **task_id**: ID de la tarea a consultar
+    El contenido se guarda en Redis durante `ATTACHMENT_TTL` segundos; los
+    mensajes encolados solo llevan el ID y el worker lo codifica una vez por lote.
+    """
+    data = await file.read(settings.ATTACHMENT_MAX_BYTES + 1)
+    if len(data) > settings.ATTACHMENT_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Adjunto mayor de {settings.ATTACHMENT_MAX_BYTES} bytes"
+        )
+    filename = file.filename or "adjunto"
+    content_type = file.content_type or "application/octet-stream"
+    blob_id = await store_attachment(get_async_redis(), filename, content_type, data)
+    logger.info(f"Adjunto {filename} ({len(data)} bytes) guardado con ID {blob_id}")
+    return AttachmentResponse(blob=blob_id, filename=filename, content_type=content_type, size=len(data))
+
+@app.put("/templates/{template_id}", response_model=TemplateResponse)
+async def put_template(template_request: TemplateRequest,
+                       template_id: str = Path(..., pattern=TEMPLATE_ID_PATTERN)):
     """
+    Endpoint para registrar (o versionar) una plantilla Jinja2 de correo
+    
+    - **subject**: Plantilla del asunto
+    - **text**: Plantilla del cuerpo en texto plano
+    - **html**: Plantilla del cuerpo HTML (opcional, se escapa automáticamente)
+    - **from_email**: Remitente por defecto (opcional)
+    """
+    source = template_request.model_dump()
     try:
-        # Obtener resultado de la tarea
-        task_result = AsyncResult(task_id, app=celery_app)
-        
-        if not task_result:
+        version = await register_template(get_async_redis(), template_id, source)
+    except TemplateError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Plantilla inválida: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Error registrando plantilla {template_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+    
+    logger.info(f"Plantilla {template_id} registrada en versión {version}")
+    return TemplateResponse(template_id=template_id, version=version, **source)
+
+@app.get("/templates/{template_id}", response_model=TemplateResponse)
+async def get_template(template_id: str = Path(..., pattern=TEMPLATE_ID_PATTERN)):
+    """
+    Endpoint para consultar la versión vigente de una plantilla
+    
+    - **template_id**: ID de la plantilla
+    """
+    source = await get_template_source(get_async_redis(), template_id)
+    if source is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Plantilla {template_id} no encontrada"
+        )
+    return TemplateResponse(**source)
+
+@app.post("/send-emails", response_model=BulkTaskResponse)
+async def send_emails(bulk_request: BulkEmailRequest):
+    """
+    Endpoint para encolar correos electrónicos en lote
+    
+    - **messages**: Lista de correos (to, subject, body, from_email, attachments); queue, priority y send_at van en el lote
+    - **template**: Asunto/cuerpo común (alternativa a messages)
+    - **recipients**: Destinatarios de la plantilla
+    - **template_id**: Plantilla registrada en /templates (alternativa a template)
+    - **variables**: Variables comunes para la plantilla registrada
+    - **personalized**: Destinatarios con variables propias para la plantilla registrada
+    - **batch_size**: Correos por tarea de envío (opcional, usa EMAIL_BATCH_SIZE)
+    - **queue**: Clase de mensaje: bulk (por defecto), transactional o low
+    - **priority**: Prioridad 0 (más alta) a 9 (más baja); por defecto la de la clase
+    - **result_mode**: full, ignore o aggregate (opcional, usa BULK_RESULT_MODE)
+    - **send_at**: Fecha de envío programado del lote (opcional)
+    """
+    record_validation()
+    template_version = None
+    if bulk_request.template_id:
+        template_version = await get_current_version(get_async_redis(), bulk_request.template_id)
+        if template_version is None:
             raise HTTPException(
                 status_code=404,
-                detail=f"Tarea con ID {task_id} no encontrada"
+                detail=f"Plantilla {bulk_request.template_id} no encontrada"
             )
+    
+    try:
+        mode = result_mode(bulk_request.result_mode.value if bulk_request.result_mode else None)
+        batches = bulk_request.to_batches(template_version, mode)
+        total = sum(len(batch["messages"]) for batch in batches)
+        logger.info(f"Recibida solicitud de envío en lote de {total} correos")
         
-        # Mapear estados de Celery a nuestro enum
-        status = task_result.status
+        # Motor de envío de cada lote: smtplib secuencial o asyncio concurrente
+        batch_task = send_email_async_batch_task if settings.EMAIL_BATCH_ENGINE == "async" else send_email_batch_task
         
-        response = TaskStatusResponse(
-            task_id=task_id,
-            status=TaskStatus(status) if status in TaskStatus.__members__ else TaskStatus.PENDING
+        # Publicar en Redis por pipelines fuera del event loop
+        send_at = to_timestamp(bulk_request.send_at)
+        batch_id, task_ids = await run_in_threadpool(
+            publish_batch, batch_task.name, batches,
+            resolve_priority(bulk_request.queue, bulk_request.priority),
+            MESSAGE_CLASS_QUEUES[bulk_request.queue.value], mode, send_at
         )
         
-        if task_result.successful():
-            response.result = task_result.result
-        elif task_result.failed():
-            response.error = str(task_result.info)
-        elif status == 'PROGRESS':
-            response.progress = task_result.info
-        else:
-            response.progress = task_result.info if task_result.info else None
+        logger.info(f"Lote {batch_id} creado con {len(task_ids)} tareas")
+        
+        return BulkTaskResponse(
+            batch_id=batch_id,
+            task_ids=task_ids,
+            total=total,
+            batch_size=bulk_request.batch_size or settings.EMAIL_BATCH_SIZE,
+            status="PENDING",
+            message=f"Lote de {total} correos {'programado' if send_at else 'creado'} en {len(task_ids)} tareas. ID: {batch_id}",
+            send_at=bulk_request.send_at if send_at else None
+        )
+        
+    except Exception as e:
+        logger.error(f"Error creando lote de envío de correos: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+@app.get("/schedule", response_model=ScheduleStatsResponse)
+async def get_schedule():
+    """Envíos programados pendientes de liberar y fecha del próximo"""
+    return ScheduleStatsResponse(**await scheduled_stats(get_async_redis()))
+
+@app.delete("/schedule/{task_id}")
+async def cancel_schedule(task_id: str):
+    """
+    Cancela un envío programado (de /send-email o una tarea de un lote)
+    
+    Devuelve `404` si la tarea no está programada o ya se liberó a la cola.
+    """
+    if not await cancel_scheduled(get_async_redis(), task_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"La tarea {task_id} no está programada o ya se envió a la cola"
+        )
+    return {"task_id": task_id, "cancelled": True}
+
+@app.get("/status/{task_id}", response_model=TaskStatusResponse)
+async def get_task_status(task_id: str):
+    """
+    Endpoint para consultar el estado de una tarea
+    
+    - **task_id**: ID de la tarea a consultar
+    """
+    try:
+        # Leer la meta de la tarea una sola vez sin bloquear el event loop
+        meta = await fetch_task_meta(task_id)
+        response = build_status_response(task_id, meta)
         
-        logger.info(f"Estado de tarea {task_id}: {status}")
+        logger.debug(f"Estado de tarea {task_id}: {meta['status']}")
         
         return response
         
@@ -126,25 +387,257 @@ async def get_task_status(task_id: str):
             detail=f"Error interno del servidor: {str(e)}"
         )
 
-@app.get("/health")
-async def health_check():
-    """Endpoint para verificar el estado de la API"""
+@app.post("/status/batch", response_model=BatchStatusResponse)
+async def get_batch_status(status_request: BatchStatusRequest):
+    """
+    Endpoint para consultar el estado de muchas tareas en una sola llamada
+    
+    - **task_ids**: IDs de las tareas a consultar (máximo STATUS_BATCH_MAX)
+    """
     try:
-        # Verificar conexión con Redis/Celery
-        inspection = celery_app.control.inspect()
-        stats = inspection.stats()
-        
-        return {
-            "status": "healthy",
-            "celery_workers": len(stats) if stats else 0,
-            "redis_connection": "connected" if stats else "disconnected"
-        }
+        # Un único MGET para todas las tareas
+        metas = await fetch_many_task_meta(status_request.task_ids)
+        return summarize(status_request.task_ids, metas)
+        
     except Exception as e:
-        logger.error(f"Error en health check: {str(e)}")
-        return {
-            "status": "unhealthy",
-            "error": str(e)
-        }
+        logger.error(f"Error consultando estado de {len(status_request.task_ids)} tareas: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+@app.get("/status/group/{batch_id}", response_model=BatchStatusResponse)
+async def get_group_status(batch_id: str):
+    """
+    Endpoint para consultar el estado agregado de un lote de /send-emails
+    
+    - **batch_id**: ID del lote devuelto por /send-emails
+    """
+    try:
+        # Lotes en modo aggregate: solo hay contadores
+        stats = await fetch_batch_stats(get_async_redis(), batch_id)
+        if stats is not None:
+            return summarize_aggregate(batch_id, stats)
+        task_ids = await fetch_group_task_ids(batch_id)
+    except Exception as e:
+        logger.error(f"Error consultando lote {batch_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+    
+    if task_ids is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Lote con ID {batch_id} no encontrado"
+        )
+    
+    try:
+        metas = await fetch_many_task_meta(task_ids)
+        return summarize(task_ids, metas, batch_id=batch_id)
+        
+    except Exception as e:
+        logger.error(f"Error consultando lote {batch_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/status/{task_id}/stream")
+async def stream_task_status(task_id: str):
+    """
+    Endpoint Server-Sent Events con los cambios de estado de una tarea
+    
+    - **task_id**: ID de la tarea a seguir
+    """
+    return StreamingResponse(sse_stream([task_id]), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/status/group/{batch_id}/stream")
+async def stream_group_status(batch_id: str):
+    """
+    Endpoint Server-Sent Events con los cambios de estado de un lote
+    
+    - **batch_id**: ID del lote devuelto por /send-emails
+    """
+    task_ids = await fetch_group_task_ids(batch_id)
+    if task_ids is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Lote con ID {batch_id} no encontrado"
+        )
+    return StreamingResponse(sse_stream(task_ids), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.websocket("/ws/status")
+async def websocket_status(websocket: WebSocket):
+    """
+    WebSocket de estados: el cliente envía {"task_ids": [...]} o
+    {"batch_id": "..."} y recibe un mensaje por cada cambio de estado
+    """
+    await websocket.accept()
+    try:
+        request = await websocket.receive_json()
+        task_ids = request.get("task_ids") or []
+        if request.get("batch_id"):
+            task_ids = await fetch_group_task_ids(request["batch_id"]) or []
+        if not task_ids or len(task_ids) > settings.STATUS_BATCH_MAX:
+            await websocket.send_json({"error": "Se requiere 'task_ids' o un 'batch_id' válido"})
+            await websocket.close(code=1008)
+            return
+        
+        async def forward():
+            async for event in task_events(task_ids):
+                if event is not None:
+                    await websocket.send_text(dumps(event))
+        
+        async def wait_disconnect():
+            # Lo que envíe el cliente después se ignora; solo importa la desconexión
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        
+        # Si el cliente se va, cancelar la suscripción sin esperar al siguiente evento
+        sender = asyncio.create_task(forward())
+        watcher = asyncio.create_task(wait_disconnect())
+        done, pending = await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if sender not in done:
+            logger.debug("Cliente WebSocket desconectado")
+            return
+        sender.result()
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        logger.debug("Cliente WebSocket desconectado")
+
+@app.get("/dead-letters", response_model=DeadLetterListResponse)
+async def get_dead_letters(error_class: Optional[str] = None, domain: Optional[str] = None,
+                           code: Optional[int] = None, limit: int = Query(100, ge=1, le=1000),
+                           cursor: Optional[str] = None):
+    """
+    Endpoint para consultar los correos fallidos definitivamente
+    
+    - **error_class**: Filtrar por clase de error (transient o permanent)
+    - **domain**: Filtrar por dominio del destinatario
+    - **code**: Filtrar por código SMTP
+    - **limit**: Entradas por página (más recientes primero)
+    - **cursor**: `next_cursor` de la página anterior
+    """
+    try:
+        redis_client = get_async_redis()
+        entries, next_cursor = await list_dead_letters(
+            redis_client, error_class=error_class, domain=domain, code=code, limit=limit, cursor=cursor
+        )
+        return DeadLetterListResponse(
+            total=await redis_client.xlen(settings.DEAD_LETTER_STREAM),
+            count=len(entries),
+            next_cursor=next_cursor,
+            entries=entries,
+        )
+        
+    except Exception as e:
+        logger.error(f"Error consultando dead letters: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+@app.post("/dead-letters/replay", response_model=BulkTaskResponse)
+async def replay_dead_letters(replay_request: DeadLetterReplayRequest):
+    """
+    Endpoint para reenviar dead letters en bloque por el camino de /send-emails
+    
+    - **ids**: IDs concretos a reenviar (si no se indican, se usan los filtros)
+    - **error_class**, **domain**, **code**: Filtros como en GET /dead-letters
+    - **limit**: Máximo de correos a reenviar
+    - **batch_size**: Correos por tarea de envío (opcional, usa EMAIL_BATCH_SIZE)
+    - **queue**, **priority**: Cola y prioridad de los lotes reenviados
+    - **delete**: Borrar del stream las entradas reenviadas (por defecto true)
+    """
+    redis_client = get_async_redis()
+    try:
+        if replay_request.ids:
+            entries = await fetch_dead_letters(redis_client, replay_request.ids)
+        else:
+            entries, _ = await list_dead_letters(
+                redis_client, error_class=replay_request.error_class, domain=replay_request.domain,
+                code=replay_request.code, limit=replay_request.limit,
+            )
+    except Exception as e:
+        logger.error(f"Error leyendo dead letters: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+    
+    if not entries:
+        raise HTTPException(
+            status_code=404,
+            detail="No hay dead letters que coincidan con la solicitud"
+        )
+    
+    try:
+        batches = to_replay_batches(entries, replay_request.batch_size)
+        batch_task = send_email_async_batch_task if settings.EMAIL_BATCH_ENGINE == "async" else send_email_batch_task
+        
+        # Mismo publicador por pipelines que /send-emails
+        batch_id, task_ids = await run_in_threadpool(
+            publish_batch, batch_task.name, batches,
+            resolve_priority(replay_request.queue, replay_request.priority),
+            MESSAGE_CLASS_QUEUES[replay_request.queue.value]
+        )
+        if replay_request.delete:
+            await delete_dead_letters(redis_client, [entry["id"] for entry in entries])
+        
+        logger.info(f"Reenviados {len(entries)} dead letters en el lote {batch_id}")
+        
+        return BulkTaskResponse(
+            batch_id=batch_id,
+            task_ids=task_ids,
+            total=len(entries),
+            batch_size=replay_request.batch_size or settings.EMAIL_BATCH_SIZE,
+            status="PENDING",
+            message=f"Reenvío de {len(entries)} correos creado en {len(task_ids)} tareas. ID: {batch_id}"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error reenviando dead letters: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+@app.get("/health")
+async def health_check():
+    """Endpoint para verificar el estado de la API (informe de workers cacheado)"""
+    report = worker_report.snapshot()
+    report["publisher"] = get_background_publisher().stats()
+    return report
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: el proceso responde, sin tocar dependencias"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: PING asíncrono a Redis con timeout corto"""
+    if await redis_ready():
+        return {"status": "ready", "redis_connection": "connected"}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "not_ready", "redis_connection": "disconnected"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato Prometheus, con la profundidad de las colas leída al momento"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas")
+    content, content_type = await run_in_threadpool(render_metrics)
+    return Response(content=content, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
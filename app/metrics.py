@@ -0,0 +1,219 @@
+import os
+from typing import Optional, Tuple
+from celery.signals import worker_ready, worker_process_shutdown
+from app.config import settings
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover - dependencia opcional
+    prometheus_client = None
+    CollectorRegistry = Counter = Gauge = Histogram = None
+
+ENABLED = settings.METRICS_ENABLED and prometheus_client is not None
+
+# Con varios procesos (uvicorn --workers, pool prefork) cada uno escribe sus
+# valores en este directorio y el exportador los suma
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+REDIS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SMTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NullMetric:
+    """Métrica sin efecto cuando prometheus_client no está instalado o ``METRICS_ENABLED=false``"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, amount):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+_NULL = _NullMetric()
+
+
+def _metric(kind, name: str, documentation: str, labelnames=(), **kwargs):
+    if not ENABLED:
+        return _NULL
+    return kind(name, documentation, labelnames, **kwargs)
+
+
+# Las etiquetas se resuelven una vez aquí: en el camino caliente solo se
+# llama a observe()/inc() sobre el hijo ya creado
+
+ENQUEUE_LATENCY = _metric(
+    Histogram, "email_enqueue_latency_seconds",
+    "Desde que la API pide encolar hasta que Redis confirma", buckets=REDIS_BUCKETS,
+)
+ENQUEUE_FAILURES = _metric(Counter, "email_enqueue_failures_total", "Tareas que no se pudieron encolar")
+
+_redis_roundtrip = _metric(
+    Histogram, "email_redis_roundtrip_seconds", "Round trips a Redis por operación",
+    ["operation"], buckets=REDIS_BUCKETS,
+)
+REDIS_PUBLISH = _redis_roundtrip.labels("publish")
+REDIS_STATUS = _redis_roundtrip.labels("status")
+REDIS_RATE_LIMIT = _redis_roundtrip.labels("rate_limit")
+REDIS_RESULT = _redis_roundtrip.labels("result")
+
+# Mismas fases que reporta send_email_sync
+_smtp_phase = _metric(
+    Histogram, "email_smtp_phase_seconds", "Duración de cada fase SMTP",
+    ["phase"], buckets=SMTP_BUCKETS,
+)
+SMTP_CONNECT = _smtp_phase.labels("connecting")
+SMTP_AUTH = _smtp_phase.labels("authenticating")
+SMTP_SEND = _smtp_phase.labels("sending")
+
+EMAILS_SENT = _metric(Counter, "email_sent_total", "Correos aceptados por el servidor SMTP")
+
+_retries = _metric(Counter, "email_retries_total", "Correos reencolados por motivo", ["reason"])
+RETRY_TRANSIENT = _retries.labels("transient")
+RETRY_RATE_LIMITED = _retries.labels("rate_limited")
+RETRY_IN_FLIGHT = _retries.labels("in_flight")
+
+_failures = _metric(
+    Counter, "email_failures_total", "Intentos de envío fallidos por tipo y código SMTP",
+    ["error_class", "code"],
+)
+_failure_children = {}
+
+# Escrituras al backend de resultados por PROGRESS_MODE (el efectivo de cada tarea)
+_backend_writes = _metric(
+    Counter, "email_backend_writes_total", "Escrituras al backend de resultados por modo de progreso", ["mode"],
+)
+_backend_write_tasks = _metric(
+    Counter, "email_backend_write_tasks_total", "Tareas terminadas por modo de progreso", ["mode"],
+)
+_backend_write_children = {}
+
+_pool_in_use = _metric(
+    Gauge, "email_smtp_pool_in_use", "Conexiones SMTP prestadas", ["pool"], multiprocess_mode="livesum",
+)
+_pool_max = _metric(
+    Gauge, "email_smtp_pool_max_connections", "Tamaño máximo de los pools SMTP", ["pool"],
+    multiprocess_mode="livesum",
+)
+SMTP_POOL_IN_USE = _pool_in_use.labels("smtp")
+SMTP_POOL_MAX = _pool_max.labels("smtp")
+ASYNC_POOL_IN_USE = _pool_in_use.labels("async")
+ASYNC_POOL_MAX = _pool_max.labels("async")
+
+
+def record_failure(error_class: str, code: Optional[int]):
+    """Cuenta un envío fallido; los códigos SMTP no se conocen de antemano"""
+    key = (error_class, code)
+    child = _failure_children.get(key)
+    if child is None:
+        child = _failure_children[key] = _failures.labels(error_class, "none" if code is None else str(code))
+    child.inc()
+
+
+def record_backend_writes(mode: str, writes: int):
+    """Cuenta las escrituras al backend de una tarea terminada"""
+    children = _backend_write_children.get(mode)
+    if children is None:
+        children = _backend_write_children[mode] = (_backend_writes.labels(mode), _backend_write_tasks.labels(mode))
+    children[0].inc(writes)
+    children[1].inc()
+
+
+class QueueDepthCollector:
+    """
+    Longitud de cada cola (por prioridad) y envíos programados pendientes.
+
+    Se lee de Redis en cada scrape con un solo pipeline, no en el camino de
+    envío.
+    """
+
+    def collect(self):
+        # Import diferido: celery_app importa módulos que usan estas métricas
+        from app.celery_app import celery_app, MESSAGE_CLASS_QUEUES
+        options = celery_app.conf.broker_transport_options
+        sep = options.get("sep", ":")
+        series = [
+            (queue, priority, f"{queue}{sep}{priority}" if priority else queue)
+            for queue in MESSAGE_CLASS_QUEUES.values()
+            for priority in options.get("priority_steps", [0])
+        ]
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for _, _, key in series:
+                pipe.llen(key)
+            pipe.zcard(settings.SCHEDULE_KEY)
+            *lengths, scheduled = pipe.execute()
+        except Exception as e:
+            logger.warning(f"No se pudo leer la profundidad de las colas: {str(e)}")
+            return
+
+        depth = GaugeMetricFamily("email_queue_depth", "Mensajes en cada cola del broker", labels=["queue", "priority"])
+        for (queue, priority, _), length in zip(series, lengths):
+            depth.add_metric([queue, str(priority)], length)
+        yield depth
+        yield GaugeMetricFamily("email_scheduled_pending", "Envíos programados pendientes", value=scheduled)
+
+
+def _process_registry():
+    """Registro con las métricas de este proceso (o de todos, en modo multiproceso)"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+_queue_registry = None
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Métricas de la API en formato de texto de Prometheus (hace I/O síncrona con Redis)"""
+    global _queue_registry
+    if _queue_registry is None:
+        _queue_registry = CollectorRegistry()
+        _queue_registry.register(QueueDepthCollector())
+    output = prometheus_client.generate_latest(_process_registry())
+    return output + prometheus_client.generate_latest(_queue_registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_worker_exporter():
+    """Exportador HTTP del worker en ``WORKER_METRICS_PORT`` (0 = deshabilitado)"""
+    if not ENABLED or not settings.WORKER_METRICS_PORT:
+        return
+    try:
+        prometheus_client.start_http_server(settings.WORKER_METRICS_PORT, registry=_process_registry())
+        logger.info(f"📈 Métricas del worker en :{settings.WORKER_METRICS_PORT}/metrics")
+    except OSError as e:
+        logger.warning(f"No se pudo abrir el puerto de métricas {settings.WORKER_METRICS_PORT}: {str(e)}")
+
+
+@worker_ready.connect
+def _start_worker_exporter(sender=None, **kwargs):
+    # Con prefork las tareas corren en procesos hijos: sin directorio
+    # multiproceso el exportador solo vería el proceso principal
+    pool = getattr(sender, "pool", None)
+    if ENABLED and not MULTIPROCESS and type(pool).__module__ == "celery.concurrency.prefork":
+        logger.warning("El pool prefork requiere PROMETHEUS_MULTIPROC_DIR, exportador de métricas deshabilitado")
+        return
+    start_worker_exporter()
+
+
+@worker_process_shutdown.connect
+def _mark_process_dead(pid=None, **kwargs):
+    # Los gauges livesum de un proceso prefork terminado dejan de sumar
+    if ENABLED and MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
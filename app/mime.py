@@ -0,0 +1,174 @@
+import base64
+import mimetypes
+import os
+import uuid
+from collections import namedtuple
+from email import policy
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import parseaddr
+from io import BytesIO
+from typing import List, Optional
+from app.config import settings
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Adjuntos subidos con POST /attachments (hash con filename, content_type y data)
+ATTACHMENT_BLOB_KEY = "email_attachment:{blob_id}"
+
+# Múltiplo de 57 bytes: cada bloque se codifica en líneas base64 completas de 76 caracteres
+ENCODE_CHUNK_SIZE = 57 * 1024
+
+# Mensaje listo para SMTP: sobre (remitente y destinatarios) + bytes RFC 5322
+PreparedMessage = namedtuple('PreparedMessage', ['from_addr', 'to_addrs', 'data'])
+
+
+class AttachmentError(Exception):
+    """Adjunto inexistente, fuera de ``ATTACHMENT_DIR`` o demasiado grande (error permanente)"""
+
+
+def resolve_attachment_path(path: str) -> str:
+    """Ruta absoluta de un adjunto, siempre dentro de ``ATTACHMENT_DIR``"""
+    if not settings.ATTACHMENT_DIR:
+        raise AttachmentError("Adjuntos por ruta deshabilitados (ATTACHMENT_DIR vacío)")
+    root = os.path.realpath(settings.ATTACHMENT_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise AttachmentError(f"Adjunto fuera de ATTACHMENT_DIR: {path}")
+    return resolved
+
+
+def _encode_stream(handle) -> str:
+    """Codifica en base64 leyendo por bloques (sin cargar el fichero y su copia codificada a la vez)"""
+    lines = []
+    while True:
+        chunk = handle.read(ENCODE_CHUNK_SIZE)
+        if not chunk:
+            return "".join(lines)
+        lines.append(base64.encodebytes(chunk).decode("ascii"))
+
+
+def load_attachment(reference: dict) -> dict:
+    """
+    Lee y codifica un adjunto referenciado por ``path`` o ``blob``.
+
+    Devuelve ``filename``, ``content_type`` y el contenido ya en base64.
+    """
+    filename = reference.get("filename")
+    content_type = reference.get("content_type")
+    if reference.get("path"):
+        path = resolve_attachment_path(reference["path"])
+        try:
+            if os.path.getsize(path) > settings.ATTACHMENT_MAX_BYTES:
+                raise AttachmentError(f"Adjunto mayor de {settings.ATTACHMENT_MAX_BYTES} bytes: {reference['path']}")
+            with open(path, "rb") as handle:
+                encoded = _encode_stream(handle)
+        except OSError as e:
+            # Un fichero que no existe no se arregla reintentando
+            raise AttachmentError(f"No se pudo leer el adjunto {reference['path']}: {str(e)}") from e
+        filename = filename or os.path.basename(path)
+    else:
+        blob = get_redis().hgetall(ATTACHMENT_BLOB_KEY.format(blob_id=reference["blob"]))
+        if not blob:
+            raise AttachmentError(f"Adjunto {reference['blob']} no encontrado o expirado")
+        encoded = _encode_stream(BytesIO(blob[b"data"]))
+        filename = filename or blob[b"filename"].decode()
+        content_type = content_type or blob[b"content_type"].decode()
+
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return {"filename": filename, "content_type": content_type, "data": encoded}
+
+
+def _attachment_part(attachment: dict) -> MIMEBase:
+    maintype, _, subtype = attachment["content_type"].partition("/")
+    part = MIMEBase(maintype, subtype or "octet-stream")
+    # Contenido ya codificado: no se vuelve a pasar por encode_base64
+    part.set_payload(attachment["data"])
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header("Content-Disposition", "attachment", filename=attachment["filename"])
+    return part
+
+
+def _flatten(message) -> bytes:
+    """Serializa un mensaje igual que ``smtplib.send_message`` (CRLF)"""
+    output = BytesIO()
+    BytesGenerator(output).flatten(message, linesep="\r\n")
+    return output.getvalue()
+
+
+class MessageBuilder:
+    """
+    Construye mensajes MIME reutilizando las partes compartidas.
+
+    El cuerpo (texto, HTML y adjuntos) y las cabeceras comunes se codifican
+    una sola vez por combinación de asunto/cuerpo/remitente/adjuntos; para
+    cada destinatario solo se antepone la cabecera ``To``. Los adjuntos se
+    leen y codifican una vez por builder aunque aparezcan en varios cuerpos.
+    """
+
+    def __init__(self):
+        self._shared = {}
+        self._attachments = {}
+
+    @staticmethod
+    def _reference_key(reference: dict) -> tuple:
+        return (reference.get("path"), reference.get("blob"), reference.get("filename"), reference.get("content_type"))
+
+    def _attachment(self, reference: dict) -> dict:
+        key = self._reference_key(reference)
+        if key not in self._attachments:
+            self._attachments[key] = load_attachment(reference)
+        return self._attachments[key]
+
+    def _shared_part(self, subject: str, body: str, from_email: str, html: Optional[str],
+                     attachments: List[dict]) -> bytes:
+        key = (subject, body, from_email, html, tuple(self._reference_key(a) for a in attachments))
+        shared = self._shared.get(key)
+        if shared is not None:
+            return shared
+
+        if attachments:
+            message = MIMEMultipart("mixed")
+            if html:
+                alternative = MIMEMultipart("alternative")
+                alternative.attach(MIMEText(body, "plain"))
+                alternative.attach(MIMEText(html, "html"))
+                message.attach(alternative)
+            else:
+                message.attach(MIMEText(body, "plain"))
+            for reference in attachments:
+                message.attach(_attachment_part(self._attachment(reference)))
+        else:
+            # Sin adjuntos: multipart simple (solo texto) o alternative (texto + HTML)
+            message = MIMEMultipart("alternative") if html else MIMEMultipart()
+            message.attach(MIMEText(body, "plain"))
+            if html:
+                message.attach(MIMEText(html, "html"))
+        message["From"] = from_email
+        message["Subject"] = subject
+
+        shared = self._shared[key] = _flatten(message)
+        return shared
+
+    def build(self, to_email: str, subject: str, body: str, from_email: Optional[str] = None,
+              html: Optional[str] = None, attachments: Optional[List[dict]] = None) -> PreparedMessage:
+        """Mensaje listo para enviar a ``to_email``"""
+        from_email = from_email or settings.SMTP_USER
+        shared = self._shared_part(subject, body, from_email, html, attachments or [])
+        to_header = policy.SMTP.fold_binary("To", to_email)
+        return PreparedMessage(parseaddr(from_email)[1] or from_email, [to_email], to_header + shared)
+
+
+async def store_attachment(redis_client, filename: str, content_type: str, data: bytes) -> str:
+    """Guarda un adjunto subido por la API durante ``ATTACHMENT_TTL`` segundos y devuelve su ID"""
+    blob_id = uuid.uuid4().hex
+    key = ATTACHMENT_BLOB_KEY.format(blob_id=blob_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(key, mapping={"filename": filename, "content_type": content_type, "data": data})
+    pipe.expire(key, settings.ATTACHMENT_TTL)
+    await pipe.execute()
+    return blob_id
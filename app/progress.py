@@ -0,0 +1,77 @@
+import time
+from app.config import settings
+from app.metrics import record_backend_writes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modos de reporte de progreso (PROGRESS_MODE)
+PROGRESS_FULL = "full"            # STARTED + cada fase PROGRESS + resultado final
+PROGRESS_COALESCED = "coalesced"  # STARTED + PROGRESS limitado por tiempo + resultado final
+PROGRESS_OFF = "off"              # STARTED (task_track_started) + resultado final
+PROGRESS_FINAL_ONLY = "final-only"  # Solo el resultado final
+
+PROGRESS_MODES = (PROGRESS_FULL, PROGRESS_COALESCED, PROGRESS_OFF, PROGRESS_FINAL_ONLY)
+
+
+def progress_mode() -> str:
+    """Devuelve el modo configurado (``full`` si el valor no es válido)"""
+    mode = settings.PROGRESS_MODE.lower()
+    if mode not in PROGRESS_MODES:
+        logger.warning(f"PROGRESS_MODE inválido '{mode}', usando '{PROGRESS_FULL}'")
+        return PROGRESS_FULL
+    return mode
+
+
+def tracks_started() -> bool:
+    """Indica si el worker debe escribir el estado STARTED de cada tarea"""
+    return progress_mode() != PROGRESS_FINAL_ONLY
+
+
+class ProgressReporter:
+    """
+    Escribe estados intermedios de una tarea según ``PROGRESS_MODE``.
+
+    Cuenta las escrituras al backend (incluyendo STARTED y el resultado
+    final que escribe Celery) para poder comparar el coste de cada modo.
+    """
+
+    def __init__(self, task=None, mode: str = None, interval: float = None):
+        self.task = task
+        self.mode = mode or progress_mode()
+        self.interval = settings.PROGRESS_MIN_INTERVAL if interval is None else interval
+        self._last_write = time.monotonic()
+        # Mensajes con ignore_result: el backend no guarda ningún estado
+        self.ignore_result = bool(task is not None and getattr(task.request, 'ignore_result', False))
+        if self.ignore_result:
+            self.mode = PROGRESS_FINAL_ONLY
+        # STARTED lo escribe el worker si task_track_started está activo
+        self.writes = 1 if self.mode != PROGRESS_FINAL_ONLY else 0
+
+    def _write(self, state: str, meta: dict):
+        self.task.update_state(state=state, meta=meta)
+        self._last_write = time.monotonic()
+        self.writes += 1
+
+    def started(self, meta: dict):
+        """Estado inicial explícito (solo en modo ``full``)"""
+        if self.task and self.mode == PROGRESS_FULL:
+            self._write('STARTED', meta)
+
+    def update(self, meta: dict, state: str = 'PROGRESS'):
+        """Reporta progreso respetando el modo configurado"""
+        if not self.task:
+            return
+        if self.mode == PROGRESS_FULL:
+            self._write(state, meta)
+        elif self.mode == PROGRESS_COALESCED:
+            if time.monotonic() - self._last_write >= self.interval:
+                self._write(state, meta)
+
+    def finish(self) -> int:
+        """Registra la escritura del resultado final y devuelve el total de la tarea"""
+        if not self.ignore_result:
+            self.writes += 1
+        record_backend_writes(self.mode, self.writes)
+        return self.writes
+
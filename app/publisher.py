@@ -0,0 +1,359 @@
+import asyncio
+import queue as queue_module
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from itertools import repeat
+from concurrent.futures import Future
+from typing import Iterable, List, Optional, Tuple
+from kombu.serialization import dumps as serialize
+from kombu.utils.json import dumps as json_dumps
+from app.celery_app import celery_app
+from app.config import settings
+from app.results import RESULT_FULL, RESULT_AGGREGATE, init_batch_stats
+from app.scheduler import schedule_messages
+from app.metrics import ENQUEUE_FAILURES, ENQUEUE_LATENCY, REDIS_PUBLISH
+from app.tracing import ENQUEUED_AT_HEADER, inject_headers, producer_span
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PipelinedPublisher:
+    """
+    Publica tareas de Celery directamente en las listas de Redis del broker.
+
+    Construye los mensajes con el mismo protocolo que ``apply_async``
+    (cabeceras v2 + sobre de kombu) pero agrupa ``chunk_size`` mensajes en
+    cada ``LPUSH`` y envía ``pipeline_depth`` comandos por round trip, en
+    lugar de hacer un round trip al broker por tarea.
+
+    No dispara las señales ``before_task_publish``/``after_task_publish``.
+    """
+
+    def __init__(self, app=celery_app, chunk_size: Optional[int] = None,
+                 pipeline_depth: Optional[int] = None):
+        self.app = app
+        self.chunk_size = chunk_size or settings.PUBLISH_CHUNK_SIZE
+        self.pipeline_depth = pipeline_depth or settings.PUBLISH_PIPELINE_DEPTH
+        self._declared = set()
+
+    def _route(self, task_name: str, options: dict):
+        """Resuelve la cola destino igual que lo haría apply_async"""
+        route = self.app.amqp.router.route(options, task_name)
+        return route['queue']
+
+    def _declare(self, channel, queue):
+        # Registrar el binding una sola vez por proceso
+        if queue.name not in self._declared:
+            queue(channel).declare()
+            self._declared.add(queue.name)
+
+    def _build(self, channel, task_name: str, task_id: str, kwargs: dict,
+               group_id: Optional[str], group_index: Optional[int], priority: int,
+               queue, ignore_result: bool = False, trace_headers: Optional[dict] = None) -> str:
+        """Serializa un mensaje de tarea listo para insertarse en Redis"""
+        # repr() nativo truncado: saferepr domina el coste en lotes grandes
+        headers, properties, body, _ = self.app.amqp.as_task_v2(
+            task_id, task_name, kwargs=kwargs,
+            group_id=group_id, group_index=group_index, ignore_result=ignore_result,
+            argsrepr='()', kwargsrepr=repr(kwargs)[:self.app.amqp.kwargsrepr_maxsize],
+        )
+        if trace_headers:
+            # Llegan al worker como atributos de task.request
+            headers.update(trace_headers)
+        content_type, content_encoding, payload = serialize(
+            body, serializer=self.app.conf.task_serializer,
+        )
+        properties.update(delivery_mode=2, priority=priority)
+        message = channel.prepare_message(
+            payload, priority, content_type, content_encoding, headers, properties,
+        )
+        routing_key = queue.routing_key or queue.name
+        channel._inplace_augment_message(message, queue.exchange.name, routing_key)
+        return json_dumps(message)
+
+    def publish(self, task_name: str, kwargs_list: Iterable[dict],
+                group_id: Optional[str] = None, priority: int = 0,
+                options: Optional[dict] = None,
+                task_ids: Optional[List[str]] = None,
+                ignore_result: bool = False,
+                send_at: Optional[float] = None,
+                trace_headers: Optional[List[Optional[dict]]] = None) -> List[str]:
+        """
+        Encola una tarea por cada elemento de ``kwargs_list``.
+
+        Si se pasan ``task_ids`` se usan en lugar de generar IDs nuevos. Con
+        ``ignore_result`` los workers no guardan estado ni resultado. Con
+        ``send_at`` (epoch) los mensajes se guardan ya serializados en el
+        ZSET del scheduler en lugar de en la cola, y el dispatcher los mueve
+        a la cola al vencer. ``trace_headers`` trae el contexto de traza de
+        cada mensaje; sin él se usa el del span actual, si se está
+        muestreando. Devuelve los IDs de tarea en el mismo orden en que se
+        recibieron.
+        """
+        queue = self._route(task_name, options or {})
+        with producer_span("email.publish", {"messaging.destination.name": queue.name}):
+            return self._publish(
+                task_name, kwargs_list, queue, group_id, priority, task_ids, ignore_result, send_at,
+                trace_headers or repeat(inject_headers()),
+            )
+
+    def _publish(self, task_name: str, kwargs_list: Iterable[dict], queue,
+                 group_id: Optional[str], priority: int, task_ids: Optional[List[str]],
+                 ignore_result: bool, send_at: Optional[float], trace_headers: Iterable[Optional[dict]]) -> List[str]:
+        preassigned = iter(task_ids) if task_ids is not None else None
+        task_ids = []
+
+        with self.app.connection_for_write() as conn:
+            channel = conn.default_channel
+            self._declare(channel, queue)
+            key = channel._q_for_pri(queue.name, priority)
+
+            with channel.conn_or_acquire() as client:
+                pipe = client.pipeline(transaction=False)
+
+                def flush(chunk: dict):
+                    if send_at is None:
+                        pipe.lpush(key, *chunk.values())
+                    else:
+                        schedule_messages(pipe, key, chunk, send_at)
+
+                def execute():
+                    start = time.perf_counter()
+                    pipe.execute()
+                    REDIS_PUBLISH.observe(time.perf_counter() - start)
+
+                # La espera en cola de un envío programado empieza en send_at
+                enqueued_at = send_at if send_at is not None else time.time()
+                chunk = {}
+                for index, (kwargs, trace) in enumerate(zip(kwargs_list, trace_headers)):
+                    task_id = next(preassigned) if preassigned else str(uuid.uuid4())
+                    task_ids.append(task_id)
+                    if trace:
+                        trace = dict(trace, **{ENQUEUED_AT_HEADER: enqueued_at})
+                    chunk[task_id] = self._build(
+                        channel, task_name, task_id, kwargs,
+                        group_id, index if group_id else None, priority, queue, ignore_result, trace,
+                    )
+                    if len(chunk) >= self.chunk_size:
+                        flush(chunk)
+                        chunk = {}
+                    if len(pipe) >= self.pipeline_depth:
+                        execute()
+                if chunk:
+                    flush(chunk)
+                if len(pipe):
+                    execute()
+
+        logger.debug(f"Publicadas {len(task_ids)} tareas '{task_name}' en la cola {queue.name}")
+        return task_ids
+
+
+_publisher: Optional[PipelinedPublisher] = None
+
+
+def get_publisher() -> PipelinedPublisher:
+    """Devuelve el publicador compartido del proceso"""
+    global _publisher
+    if _publisher is None:
+        _publisher = PipelinedPublisher()
+    return _publisher
+
+
+def publish_batch(task_name: str, kwargs_list: List[dict], priority: int = 0,
+                  queue: Optional[str] = None, result_mode: str = RESULT_FULL,
+                  send_at: Optional[float] = None):
+    """
+    Publica un lote de tareas bajo un mismo ID de grupo.
+
+    En modo ``full`` el grupo se guarda en el backend de resultados para
+    poder consultarlo después; en ``aggregate`` se crean los contadores del
+    lote y en ``ignore`` no se guarda nada. Con ``send_at`` el lote queda
+    programado en el scheduler. Devuelve ``(batch_id, task_ids)``.
+    """
+    batch_id = str(uuid.uuid4())
+    if result_mode == RESULT_AGGREGATE:
+        # Antes de publicar: los workers pueden terminar antes de que volvamos
+        init_batch_stats(
+            batch_id, len(kwargs_list), sum(len(kwargs.get("messages", ())) for kwargs in kwargs_list)
+        )
+    task_ids = get_publisher().publish(
+        task_name, kwargs_list, group_id=batch_id, priority=priority,
+        options={'queue': queue} if queue else None,
+        ignore_result=result_mode != RESULT_FULL,
+        send_at=send_at,
+    )
+    if result_mode == RESULT_FULL:
+        celery_app.GroupResult(
+            batch_id, [celery_app.AsyncResult(task_id) for task_id in task_ids]
+        ).save()
+    return batch_id, task_ids
+
+
+_PendingPublish = namedtuple(
+    '_PendingPublish', ['task_name', 'priority', 'queue', 'task_id', 'kwargs', 'future', 'submitted_at', 'trace']
+)
+
+
+class BackgroundPublisher:
+    """
+    Publicador en un hilo dedicado para no bloquear el event loop de la API.
+
+    Los handlers ponen cada tarea en una cola acotada y esperan un
+    ``Future``; el hilo agrupa lo que llega en micro-lotes (hasta
+    ``batch_size`` tareas o ``max_wait`` segundos) y los publica con
+    ``PipelinedPublisher`` en un solo round trip. Registra la latencia de
+    encolado (desde ``submit`` hasta que Redis confirma) y el throughput.
+    """
+
+    def __init__(self, publisher: Optional[PipelinedPublisher] = None,
+                 max_queue: Optional[int] = None, batch_size: Optional[int] = None,
+                 max_wait: Optional[float] = None):
+        self.publisher = publisher or get_publisher()
+        self.batch_size = batch_size or settings.PUBLISH_MICROBATCH_SIZE
+        self.max_wait = settings.PUBLISH_MICROBATCH_WAIT if max_wait is None else max_wait
+        self._queue = queue_module.Queue(maxsize=max_queue or settings.PUBLISH_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=10000)
+        self._published = 0
+        self._failed = 0
+        self._batches = 0
+        self._started_at = time.monotonic()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="broker-publisher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, task_name: str, kwargs: dict, priority: int = 0,
+               queue: Optional[str] = None, task_id: Optional[str] = None) -> Tuple[str, Future]:
+        """
+        Pone una tarea en la cola de publicación.
+
+        Usa ``task_id`` si se indica (por ejemplo, uno ya reservado con una
+        clave de idempotencia). Devuelve el ID de la tarea y un ``Future``
+        que se resuelve cuando el mensaje está en Redis. Lanza
+        ``queue.Full`` si la cola está llena.
+        """
+        self.start()
+        task_id = task_id or str(uuid.uuid4())
+        future = Future()
+        # El contexto de traza se captura aquí: el hilo publicador no lo tiene
+        self._queue.put_nowait(_PendingPublish(
+            task_name, priority, queue, task_id, kwargs, future, time.perf_counter(), inject_headers()
+        ))
+        return task_id, future
+
+    async def enqueue(self, task_name: str, kwargs: dict, priority: int = 0,
+                      queue: Optional[str] = None, task_id: Optional[str] = None) -> str:
+        """Versión asíncrona de ``submit`` que espera la confirmación de Redis"""
+        with producer_span("email.publish", {"messaging.destination.name": queue or ""}):
+            task_id, future = self.submit(task_name, kwargs, priority, queue, task_id)
+            await asyncio.wrap_future(future)
+        return task_id
+
+    def _drain(self) -> list:
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue_module.Empty:
+                break
+        return items
+
+    @staticmethod
+    def _resolve(item, result=None, error: Optional[BaseException] = None):
+        """
+        Resuelve el ``Future`` de un handler.
+
+        Si el handler se canceló mientras esperaba (cliente desconectado o
+        timeout) su ``Future`` ya está cancelado: el mensaje se publica igual
+        (su ``task_id`` puede estar reservado con una clave de idempotencia)
+        pero no hay nadie a quien avisar. Un ``Future`` en mal estado nunca
+        debe tumbar el hilo publicador.
+        """
+        try:
+            if not item.future.set_running_or_notify_cancel():
+                return
+            if error is not None:
+                item.future.set_exception(error)
+            else:
+                item.future.set_result(result)
+        except Exception as e:
+            logger.error(f"No se pudo resolver la publicación de la tarea {item.task_id}: {str(e)}")
+
+    def _run(self):
+        while True:
+            items = self._drain()
+            groups = {}
+            for item in items:
+                groups.setdefault((item.task_name, item.priority, item.queue), []).append(item)
+
+            for (task_name, priority, queue), group in groups.items():
+                try:
+                    self.publisher.publish(
+                        task_name, [item.kwargs for item in group], priority=priority,
+                        options={'queue': queue} if queue else None,
+                        task_ids=[item.task_id for item in group],
+                        trace_headers=[item.trace for item in group],
+                    )
+                except Exception as e:
+                    logger.error(f"Error publicando {len(group)} tareas '{task_name}': {str(e)}")
+                    for item in group:
+                        self._resolve(item, error=e)
+                    ENQUEUE_FAILURES.inc(len(group))
+                    with self._stats_lock:
+                        self._failed += len(group)
+                    continue
+
+                done = time.perf_counter()
+                for item in group:
+                    self._resolve(item, result=item.task_id)
+                    ENQUEUE_LATENCY.observe(done - item.submitted_at)
+                with self._stats_lock:
+                    self._published += len(group)
+                    self._batches += 1
+                    self._latencies.extend(done - item.submitted_at for item in group)
+
+    def stats(self) -> dict:
+        """Latencia de encolado (ms) y throughput desde el arranque"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            published, failed, batches = self._published, self._failed, self._batches
+        elapsed = time.monotonic() - self._started_at
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+        return {
+            "published": published,
+            "failed": failed,
+            "batches": batches,
+            "avg_batch_size": round(published / batches, 1) if batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+            "throughput_per_s": round(published / elapsed, 1) if elapsed else 0.0,
+            "enqueue_latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+        }
+
+
+_background_publisher: Optional[BackgroundPublisher] = None
+
+
+def get_background_publisher() -> BackgroundPublisher:
+    """Devuelve el publicador en segundo plano del proceso"""
+    global _background_publisher
+    if _background_publisher is None:
+        _background_publisher = BackgroundPublisher()
+    return _background_publisher
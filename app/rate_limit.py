@@ -0,0 +1,175 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.metrics import REDIS_RATE_LIMIT
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+# Token bucket atómico para varios mensajes a la vez.
+# KEYS: buckets (cuenta SMTP y dominios)
+# ARGV[1..2*#KEYS]: tokens/segundo y capacidad de cada bucket
+# ARGV[resto]: por mensaje, pares (índice del bucket de cuenta, índice del
+#              bucket de dominio); 0 significa "sin límite"
+# Devuelve {concedidos (1/0 por mensaje), segundos hasta el próximo token}
+TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tokens, rates, caps = {}, {}, {}
+for i = 1, #KEYS do
+  rates[i] = tonumber(ARGV[2 * i - 1])
+  caps[i] = tonumber(ARGV[2 * i])
+  local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local level = tonumber(bucket[1])
+  local ts = tonumber(bucket[2])
+  if level == nil then
+    level = caps[i]
+    ts = now
+  end
+  tokens[i] = math.min(caps[i], level + math.max(0, now - ts) * rates[i])
+end
+
+local granted = {}
+local wait = 0
+for m = 2 * #KEYS + 1, #ARGV, 2 do
+  local a = tonumber(ARGV[m])
+  local d = tonumber(ARGV[m + 1])
+  local ok = (a == 0 or tokens[a] >= 1) and (d == 0 or tokens[d] >= 1)
+  if ok then
+    if a > 0 then tokens[a] = tokens[a] - 1 end
+    if d > 0 then tokens[d] = tokens[d] - 1 end
+    table.insert(granted, 1)
+  else
+    table.insert(granted, 0)
+    for _, k in ipairs({a, d}) do
+      if k > 0 and tokens[k] < 1 then
+        wait = math.max(wait, (1 - tokens[k]) / rates[k])
+      end
+    end
+  end
+end
+
+for i = 1, #KEYS do
+  redis.call('HSET', KEYS[i], 'tokens', tokens[i], 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil(caps[i] / rates[i] * 1000) + 1000)
+end
+return {granted, tostring(wait)}
+"""
+
+
+def parse_rate(value: str) -> Optional[Tuple[float, float]]:
+    """
+    Convierte ``"N/s"``, ``"N/m"`` o ``"N/h"`` en (tokens por segundo, capacidad).
+
+    La capacidad es N: se permite una ráfaga de un periodo completo.
+    Devuelve ``None`` si el valor está vacío o es 0 (sin límite).
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    amount, _, period = value.partition("/")
+    amount = float(amount)
+    if amount <= 0:
+        return None
+    return amount / PERIODS[period.strip() or "s"], amount
+
+
+def parse_domain_rates(value: str) -> Dict[str, Tuple[float, float]]:
+    """Convierte ``"gmail.com=20/s,outlook.com=600/m"`` en límites por dominio"""
+    rates = {}
+    for entry in (value or "").split(","):
+        if "=" not in entry:
+            continue
+        domain, rate = entry.split("=", 1)
+        parsed = parse_rate(rate)
+        if parsed:
+            rates[domain.strip().lower()] = parsed
+    return rates
+
+
+class SendRateLimiter:
+    """
+    Limitador distribuido (token bucket en Redis) por cuenta SMTP y por
+    dominio del destinatario.
+
+    Todos los workers comparten los buckets; un mensaje solo se envía si hay
+    token en el bucket de la cuenta y en el de su dominio.
+    """
+
+    def __init__(self, account: str, account_rate: Optional[Tuple[float, float]],
+                 domain_default: Optional[Tuple[float, float]],
+                 domain_rates: Dict[str, Tuple[float, float]]):
+        self.account = account
+        self.account_rate = account_rate
+        self.domain_default = domain_default
+        self.domain_rates = domain_rates
+        self._script = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.account_rate or self.domain_default or self.domain_rates)
+
+    def _domain_rate(self, domain: str) -> Optional[Tuple[float, float]]:
+        return self.domain_rates.get(domain, self.domain_default)
+
+    def acquire(self, recipients: List[str]) -> Tuple[List[bool], float]:
+        """
+        Reserva un token por destinatario (en orden) de forma atómica.
+
+        Devuelve qué destinatarios pueden enviarse ya y los segundos que
+        faltan para el siguiente token de los que no.
+        """
+        if not self.enabled or not recipients:
+            return [True] * len(recipients), 0.0
+
+        keys, limits, index = [], [], {}
+
+        def bucket(key: str, rate: Optional[Tuple[float, float]]) -> int:
+            if rate is None:
+                return 0
+            if key not in index:
+                keys.append(key)
+                limits.extend(rate)
+                index[key] = len(keys)
+            return index[key]
+
+        account_index = bucket(f"ratelimit:account:{self.account}", self.account_rate)
+        pairs = []
+        for recipient in recipients:
+            domain = recipient.rsplit("@", 1)[-1].lower()
+            pairs.extend((account_index, bucket(f"ratelimit:domain:{domain}", self._domain_rate(domain))))
+
+        if not keys:
+            return [True] * len(recipients), 0.0
+
+        if self._script is None:
+            self._script = get_redis().register_script(TOKEN_BUCKET_LUA)
+        start = time.perf_counter()
+        granted, wait = self._script(keys=keys, args=limits + pairs)
+        REDIS_RATE_LIMIT.observe(time.perf_counter() - start)
+        return [bool(flag) for flag in granted], float(wait)
+
+
+_limiter: Optional[SendRateLimiter] = None
+
+
+def get_rate_limiter() -> SendRateLimiter:
+    """Limitador configurado en ``Settings`` (uno por proceso)"""
+    global _limiter
+    if _limiter is None:
+        _limiter = SendRateLimiter(
+            account=settings.SMTP_USER or settings.SMTP_HOST,
+            account_rate=parse_rate(settings.RATE_LIMIT_ACCOUNT) if settings.RATE_LIMIT_ENABLED else None,
+            domain_default=parse_rate(settings.RATE_LIMIT_DOMAIN_DEFAULT) if settings.RATE_LIMIT_ENABLED else None,
+            domain_rates=parse_domain_rates(settings.RATE_LIMIT_DOMAINS) if settings.RATE_LIMIT_ENABLED else {},
+        )
+    return _limiter
+
+
+def throttle_delay(wait: float) -> float:
+    """Retardo para reencolar: espera del bucket con un mínimo razonable"""
+    return max(settings.RATE_LIMIT_MIN_DELAY, math.ceil(wait * 100) / 100)
@@ -0,0 +1,13 @@
+from typing import Optional
+import redis
+from app.config import settings
+
+_redis: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """Cliente Redis síncrono para los workers"""
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
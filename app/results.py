@@ -0,0 +1,121 @@
+import time
+from typing import Optional
+from celery import states
+from celery.backends.redis import RedisBackend
+from app.config import settings
+from app.metrics import REDIS_RESULT
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modos de resultado de los lotes (BULK_RESULT_MODE)
+RESULT_FULL = "full"            # Un resultado por tarea en celery-task-meta-<id>
+RESULT_IGNORE = "ignore"        # Sin resultados (fire-and-forget)
+RESULT_AGGREGATE = "aggregate"  # Sin resultados por tarea, solo contadores por lote
+
+RESULT_MODES = (RESULT_FULL, RESULT_IGNORE, RESULT_AGGREGATE)
+
+# Contadores por lote en modo aggregate
+BATCH_STATS_KEY = "email_batch_stats:{batch_id}"
+BATCH_COUNTERS = ("sent", "failed", "retried", "deferred")
+
+# Tareas de reintento y aplazadas de un lote en modo full: no están en el
+# GroupResult guardado al publicar y /status/group las suma desde aquí
+BATCH_CHILDREN_KEY = "email_batch_children:{batch_id}"
+
+# Campos que RESULT_COMPACT elimina (se pueden deducir del resto)
+VERBOSE_FIELDS = ("message", "subject", "to")
+
+
+class EmailResultBackend(RedisBackend):
+    """
+    Backend Redis que respeta ``ignore_result`` del mensaje en todos los estados.
+
+    Celery solo lo aplica al resultado final: STARTED y los ``update_state``
+    se escribirían igualmente y dejarían una clave por tarea.
+    """
+
+    def store_result(self, task_id, result, state, traceback=None, request=None, **kwargs):
+        if request is not None and getattr(request, 'ignore_result', False):
+            if not (state in states.EXCEPTION_STATES and self.app.conf.task_store_errors_even_if_ignored):
+                return result
+        start = time.perf_counter()
+        stored = super().store_result(task_id, result, state, traceback=traceback, request=request, **kwargs)
+        REDIS_RESULT.observe(time.perf_counter() - start)
+        return stored
+
+
+def result_mode(mode: Optional[str] = None) -> str:
+    """Modo indicado o el de ``BULK_RESULT_MODE`` (``full`` si no es válido)"""
+    mode = (mode or settings.BULK_RESULT_MODE).lower()
+    if mode not in RESULT_MODES:
+        logger.warning(f"Modo de resultado inválido '{mode}', usando '{RESULT_FULL}'")
+        return RESULT_FULL
+    return mode
+
+
+def compact_result(result: dict) -> dict:
+    """
+    Reduce el resultado de una tarea si ``RESULT_COMPACT`` está activo.
+
+    Quita los textos redundantes y los ``None`` y, en los lotes, deja solo
+    los destinatarios fallidos en ``results``.
+    """
+    if not settings.RESULT_COMPACT:
+        return result
+    compact = {
+        key: value for key, value in result.items()
+        if key not in VERBOSE_FIELDS and value is not None
+    }
+    if "results" in compact:
+        compact["results"] = [
+            {key: value for key, value in item.items() if value is not None}
+            for item in compact["results"] if not item["success"]
+        ]
+    return compact
+
+
+def init_batch_stats(batch_id: str, tasks: int, emails: int):
+    """Crea los contadores de un lote en modo aggregate"""
+    key = BATCH_STATS_KEY.format(batch_id=batch_id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hset(key, mapping={"tasks": tasks, "emails": emails})
+    if settings.RESULT_EXPIRES:
+        pipe.expire(key, settings.RESULT_EXPIRES)
+    pipe.execute()
+
+
+def record_batch_stats(batch_id: Optional[str], result: dict):
+    """Suma el resultado de una tarea de lote a los contadores de su lote"""
+    if not batch_id:
+        return
+    key = BATCH_STATS_KEY.format(batch_id=batch_id)
+    pipe = get_redis().pipeline(transaction=False)
+    # "failed" cuenta solo los fallos definitivos; los reintentados siguen pendientes
+    pipe.hincrby(key, "sent", result["sent"])
+    pipe.hincrby(key, "failed", result["dead_lettered"])
+    pipe.hincrby(key, "retried", result["retried"])
+    pipe.hincrby(key, "deferred", result["deferred"])
+    pipe.hincrby(key, "tasks_done", 1)
+    pipe.execute()
+
+
+def register_batch_task(batch_id: Optional[str], task_id: str):
+    """Añade al lote una tarea creada por el worker (reintento o aplazamiento)"""
+    if not batch_id:
+        return
+    key = BATCH_CHILDREN_KEY.format(batch_id=batch_id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.rpush(key, task_id)
+    if settings.RESULT_EXPIRES:
+        pipe.expire(key, settings.RESULT_EXPIRES)
+    pipe.execute()
+
+
+async def fetch_batch_stats(redis_client, batch_id: str) -> Optional[dict]:
+    """Contadores de un lote en modo aggregate o ``None`` si no existen"""
+    stats = await redis_client.hgetall(BATCH_STATS_KEY.format(batch_id=batch_id))
+    if not stats:
+        return None
+    return {key.decode(): int(value) for key, value in stats.items()}
@@ -0,0 +1,165 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from celery.signals import worker_ready, worker_shutdown
+from app.config import settings
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Claves en Redis (misma base de datos que el broker):
+#   SCHEDULE_KEY          ZSET  task_id -> send_at (epoch)
+#   SCHEDULE_PAYLOAD_KEY  HASH  task_id -> "<lista del broker o stream>\n<mensaje ya serializado>"
+#
+# Mueve a las listas del broker los mensajes vencidos, hasta ARGV[1] por
+# llamada; los destinos que empiezan por ARGV[2] son streams (app.streams) y
+# se añaden con XADD. Es atómico: varios dispatchers a la vez nunca entregan
+# dos veces.
+RELEASE_LUA = """
+local now = redis.call('TIME')
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now[1] + now[2] / 1000000, 'LIMIT', 0, ARGV[1])
+if #due == 0 then
+    return 0
+end
+local payloads = redis.call('HMGET', KEYS[2], unpack(due))
+for i, payload in ipairs(payloads) do
+    if payload then
+        local sep = string.find(payload, '\\n', 1, true)
+        local key = string.sub(payload, 1, sep - 1)
+        if string.sub(key, 1, #ARGV[2]) == ARGV[2] then
+            redis.call('XADD', key, '*', 'message', string.sub(payload, sep + 1))
+        else
+            redis.call('LPUSH', key, string.sub(payload, sep + 1))
+        end
+    end
+end
+redis.call('ZREM', KEYS[1], unpack(due))
+redis.call('HDEL', KEYS[2], unpack(due))
+return #due
+"""
+
+
+def to_timestamp(send_at: Optional[datetime]) -> Optional[float]:
+    """
+    Epoch de ``send_at`` o ``None`` si hay que enviar ya.
+
+    Las fechas sin zona horaria se interpretan en UTC.
+    """
+    if send_at is None:
+        return None
+    if send_at.tzinfo is None:
+        send_at = send_at.replace(tzinfo=timezone.utc)
+    timestamp = send_at.timestamp()
+    return timestamp if timestamp > time.time() else None
+
+
+def schedule_messages(pipe, queue_key: str, messages: Dict[str, str], send_at: float):
+    """Añade a ``pipe`` los mensajes (``task_id -> mensaje``) programados para ``send_at``"""
+    pipe.hset(settings.SCHEDULE_PAYLOAD_KEY, mapping={
+        task_id: f"{queue_key}\n{message}" for task_id, message in messages.items()
+    })
+    pipe.zadd(settings.SCHEDULE_KEY, {task_id: send_at for task_id in messages})
+
+
+async def cancel_scheduled(redis_client, task_id: str) -> bool:
+    """Cancela un envío programado que todavía no se ha liberado"""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.zrem(settings.SCHEDULE_KEY, task_id)
+    pipe.hdel(settings.SCHEDULE_PAYLOAD_KEY, task_id)
+    removed, _ = await pipe.execute()
+    return bool(removed)
+
+
+async def scheduled_stats(redis_client) -> dict:
+    """Mensajes programados pendientes y fecha del próximo"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zcard(settings.SCHEDULE_KEY)
+    pipe.zrange(settings.SCHEDULE_KEY, 0, 0, withscores=True)
+    pending, first = await pipe.execute()
+    return {
+        "pending": pending,
+        "next_send_at": datetime.fromtimestamp(first[0][1], timezone.utc).isoformat() if first else None,
+    }
+
+
+class ScheduleDispatcher:
+    """
+    Libera los envíos programados cuando vencen.
+
+    En cada ciclo mueve hasta ``batch_size`` mensajes del ZSET a las listas
+    del broker con un solo ``EVAL``; si el lote sale lleno repite sin
+    esperar, así un pico de millones de mensajes vencidos se vacía a ritmo
+    de Redis. Los workers nunca tienen en memoria mensajes con ``eta``.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, interval: Optional[float] = None):
+        self.batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+        self.interval = settings.SCHEDULER_POLL_INTERVAL if interval is None else interval
+        self._release = get_redis().register_script(RELEASE_LUA)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def release_due(self) -> int:
+        """Libera un lote de mensajes vencidos y devuelve cuántos"""
+        return self._release(
+            keys=[settings.SCHEDULE_KEY, settings.SCHEDULE_PAYLOAD_KEY],
+            args=[self.batch_size, settings.STREAM_PREFIX + ":"],
+        )
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                released = self.release_due()
+            except Exception as e:
+                logger.error(f"Error liberando envíos programados: {str(e)}")
+                released = 0
+            if released:
+                logger.info(f"Liberados {released} envíos programados")
+            if released < self.batch_size:
+                self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="email-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+
+
+_dispatcher: Optional[ScheduleDispatcher] = None
+
+
+@worker_ready.connect
+def _start_dispatcher(**kwargs):
+    """Arranca el dispatcher en el proceso principal de cada worker si ``SCHEDULER_ENABLED``"""
+    global _dispatcher
+    if settings.SCHEDULER_ENABLED:
+        _dispatcher = ScheduleDispatcher()
+        _dispatcher.start()
+
+
+@worker_shutdown.connect
+def _stop_dispatcher(**kwargs):
+    if _dispatcher is not None:
+        _dispatcher.stop()
+
+
+def main():
+    """Dispatcher como proceso independiente: ``python -m app.scheduler``"""
+    logging.basicConfig(level=logging.INFO)
+    logger.info("📅 Dispatcher de envíos programados iniciado")
+    dispatcher = ScheduleDispatcher()
+    try:
+        dispatcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,245 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.config import settings
 from enum import Enum
 
 class TaskStatus(str, Enum):
     PENDING = "PENDING"
     STARTED = "STARTED"
+    PROGRESS = "PROGRESS"
     SUCCESS = "SUCCESS"
     FAILURE = "FAILURE"
     RETRY = "RETRY"
     REVOKED = "REVOKED"
 
-class EmailRequest(BaseModel):
+class MessageClass(str, Enum):
+    TRANSACTIONAL = "transactional"
+    BULK = "bulk"
+    LOW = "low"
+
+class ResultMode(str, Enum):
+    FULL = "full"
+    IGNORE = "ignore"
+    AGGREGATE = "aggregate"
+
+class Attachment(BaseModel):
+    # Referencia al contenido: el fichero no viaja en el mensaje del broker
+    path: Optional[str] = Field(None, min_length=1, max_length=1024)  # Relativa a ATTACHMENT_DIR
+    blob: Optional[str] = Field(None, pattern=r"^[0-9a-f]{32}$")    # ID devuelto por POST /attachments
+    filename: Optional[str] = Field(None, max_length=255)
+    content_type: Optional[str] = Field(None, pattern=r"^[\w.+-]+/[\w.+-]+$")
+
+    @model_validator(mode='after')
+    def check_reference(self):
+        if bool(self.path) == bool(self.blob):
+            raise ValueError("Indica 'path' o 'blob' (solo uno)")
+        if self.path and (self.path.startswith("/") or ".." in self.path.split("/")):
+            raise ValueError("'path' debe ser relativa a ATTACHMENT_DIR")
+        return self
+
+class AttachmentResponse(BaseModel):
+    blob: str
+    filename: str
+    content_type: str
+    size: int
+
+class EmailMessage(BaseModel):
     to: EmailStr
     subject: str
     body: str
     from_email: Optional[str] = None
+    attachments: List[Attachment] = []
+
+    def to_task_kwargs(self) -> dict:
+        """Argumentos de la tarea de envío (los adjuntos solo si los hay)"""
+        kwargs = {
+            "to_email": str(self.to),
+            "subject": self.subject,
+            "body": self.body,
+            "from_email": self.from_email,
+        }
+        if self.attachments:
+            kwargs["attachments"] = [attachment.model_dump(exclude_none=True) for attachment in self.attachments]
+        return kwargs
+
+class EmailRequest(EmailMessage):
+    queue: MessageClass = MessageClass.TRANSACTIONAL
+    priority: Optional[int] = Field(None, ge=0, le=9)
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=255)
+    send_at: Optional[datetime] = None  # Envío programado (UTC si no lleva zona horaria)
+
+class BulkMessage(EmailMessage):
+    # queue, priority y send_at son del lote e idempotency_key no se aplica
+    # en /send-emails: en un mensaje se rechazan (422) en lugar de ignorarlos
+    model_config = ConfigDict(extra='forbid')
+
+class EmailTemplate(BaseModel):
+    subject: str
+    body: str
+    from_email: Optional[str] = None
+    attachments: List[Attachment] = []
+
+TEMPLATE_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+class TemplateRequest(BaseModel):
+    subject: str
+    text: str
+    html: Optional[str] = None
+    from_email: Optional[str] = None
+
+class TemplateResponse(TemplateRequest):
+    template_id: str
+    version: int
+
+class TemplateRecipient(BaseModel):
+    to: EmailStr
+    variables: Dict[str, Any] = {}
+
+class BulkEmailRequest(BaseModel):
+    messages: List[BulkMessage] = []
+    template: Optional[EmailTemplate] = None
+    recipients: List[EmailStr] = []
+    template_id: Optional[str] = Field(None, pattern=TEMPLATE_ID_PATTERN)
+    variables: Dict[str, Any] = {}
+    personalized: List[TemplateRecipient] = []
+    batch_size: Optional[int] = Field(None, ge=1, le=1000)
+    queue: MessageClass = MessageClass.BULK
+    priority: Optional[int] = Field(None, ge=0, le=9)
+    result_mode: Optional[ResultMode] = None
+    send_at: Optional[datetime] = None
+
+    @model_validator(mode='after')
+    def check_mode(self):
+        # Modos: lista de mensajes, plantilla en línea + destinatarios o
+        # plantilla registrada + destinatarios (con variables opcionales)
+        modes = sum([bool(self.messages), bool(self.template), bool(self.template_id)])
+        if modes != 1:
+            raise ValueError("Usa solo uno de 'messages', 'template' o 'template_id'")
+        if self.template and not self.recipients:
+            raise ValueError("'template' requiere 'recipients'")
+        if self.template_id and not (self.recipients or self.personalized):
+            raise ValueError("'template_id' requiere 'recipients' o 'personalized'")
+        if (self.messages or self.template) and self.personalized:
+            raise ValueError("'personalized' solo se usa con 'template_id'")
+        total = len(self.messages) + len(self.recipients) + len(self.personalized)
+        if total > settings.BULK_MAX_MESSAGES:
+            raise ValueError(f"Máximo {settings.BULK_MAX_MESSAGES} mensajes por solicitud")
+        return self
+
+    def to_task_kwargs(self) -> List[dict]:
+        """Convierte la solicitud en los argumentos de cada tarea de envío"""
+        if self.template_id:
+            # Solo destinatario + variables: la plantilla se renderiza en el worker
+            return [
+                {"to_email": str(recipient)} for recipient in self.recipients
+            ] + [
+                {"to_email": str(recipient.to), "variables": recipient.variables}
+                for recipient in self.personalized
+            ]
+        if self.messages:
+            return [message.to_task_kwargs() for message in self.messages]
+        shared = {
+            "subject": self.template.subject,
+            "body": self.template.body,
+            "from_email": self.template.from_email,
+        }
+        if self.template.attachments:
+            # Mismas referencias en todos: el worker codifica el cuerpo una vez por lote
+            shared["attachments"] = [a.model_dump(exclude_none=True) for a in self.template.attachments]
+        return [{"to_email": str(recipient), **shared} for recipient in self.recipients]
+
+    def to_batches(self, template_version: Optional[int] = None, result_mode: str = ResultMode.FULL.value) -> List[dict]:
+        """Divide los mensajes en lotes para send_email_batch_task"""
+        kwargs_list = self.to_task_kwargs()
+        size = self.batch_size or settings.EMAIL_BATCH_SIZE
+        template = None
+        if self.template_id:
+            template = {"id": self.template_id, "version": template_version, "variables": self.variables}
+        batches = [
+            {"messages": kwargs_list[start:start + size], "template": template}
+            for start in range(0, len(kwargs_list), size)
+        ]
+        if result_mode != ResultMode.FULL.value:
+            for batch in batches:
+                batch["result_mode"] = result_mode
+        return batches
 
 class TaskResponse(BaseModel):
     task_id: str
     status: str
     message: str
+    duplicate: bool = False
+    send_at: Optional[datetime] = None
+
+class BulkTaskResponse(BaseModel):
+    batch_id: str
+    task_ids: List[str]  # Una tarea por lote de batch_size correos, no por correo
+    total: int
+    batch_size: int
+    status: str
+    message: str
+    send_at: Optional[datetime] = None
+
+class ScheduleStatsResponse(BaseModel):
+    pending: int
+    next_send_at: Optional[str] = None
 
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: TaskStatus
     result: Optional[dict] = None
     error: Optional[str] = None
-    progress: Optional[dict] = None
\ No newline at end of file
+    progress: Optional[dict] = None
+
+class BatchStatusRequest(BaseModel):
+    task_ids: List[str] = Field(..., min_length=1, max_length=settings.STATUS_BATCH_MAX)
+
+class TaskStateSummary(BaseModel):
+    task_id: str
+    status: str
+    error: Optional[str] = None
+
+class BatchStatusResponse(BaseModel):
+    batch_id: Optional[str] = None
+    mode: ResultMode = ResultMode.FULL
+    total: int
+    pending: int
+    success: int
+    failure: int
+    counts: Dict[str, int]
+    emails_sent: int
+    emails_failed: int
+    emails_pending: int = 0  # Reintentados o aplazados que aún no han terminado
+    tasks: List[TaskStateSummary]
+
+class DeadLetterEntry(BaseModel):
+    id: str
+    task_name: str
+    task_id: Optional[str] = None
+    to_email: str
+    domain: str
+    error: str
+    error_type: str
+    error_class: str
+    code: Optional[int] = None
+    attempts: int
+    failed_at: float
+    payload: Dict[str, Any]
+
+class DeadLetterListResponse(BaseModel):
+    total: int
+    count: int
+    next_cursor: Optional[str] = None
+    entries: List[DeadLetterEntry]
+
+class DeadLetterReplayRequest(BaseModel):
+    ids: List[str] = Field([], max_length=settings.DEAD_LETTER_REPLAY_MAX)
+    error_class: Optional[str] = None
+    domain: Optional[str] = None
+    code: Optional[int] = None
+    limit: int = Field(settings.DEAD_LETTER_REPLAY_MAX, ge=1, le=settings.DEAD_LETTER_REPLAY_MAX)
+    batch_size: Optional[int] = Field(None, ge=1, le=1000)
+    queue: MessageClass = MessageClass.BULK
+    priority: Optional[int] = Field(None, ge=0, le=9)
+    delete: bool = True
@@ -0,0 +1,169 @@
+import json
+import zlib
+from functools import lru_cache
+from typing import Callable, List, Tuple
+from kombu.serialization import registry
+from kombu.utils.json import dumps as kombu_json_dumps, loads as kombu_json_loads
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+# Serializadores de mensajes y resultados (CELERY_SERIALIZER)
+CODEC_JSON = "json"
+CODEC_MSGPACK = "msgpack"
+CODECS = (CODEC_JSON, CODEC_MSGPACK)
+
+# Compresión de cuerpos grandes (SERIALIZER_COMPRESSION)
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD)
+
+# Primer byte de los cuerpos de los codecs comprimidos
+_RAW = b"\x00"
+_COMPRESSED = b"\x01"
+
+
+def codec_available(codec: str) -> bool:
+    return codec == CODEC_JSON or (codec == CODEC_MSGPACK and msgpack is not None)
+
+
+def compression_available(compression: str) -> bool:
+    return compression != COMPRESSION_ZSTD or zstandard is not None
+
+
+def _base_codec(codec: str) -> Tuple[Callable[[object], bytes], Callable[[bytes], object]]:
+    """Codificador/decodificador a bytes del serializador base"""
+    if codec == CODEC_MSGPACK:
+        return (
+            lambda obj: msgpack.packb(obj, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, raw=False),
+        )
+    return (
+        lambda obj: kombu_json_dumps(obj).encode("utf-8"),
+        lambda data: kombu_json_loads(bytes(data).decode("utf-8")),
+    )
+
+
+def _compressor(compression: str) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    return zlib.compress, zlib.decompress
+
+
+def serializer_name(codec: str, compression: str) -> str:
+    """Nombre registrado en kombu (``json``, ``msgpack``, ``msgpack-zlib``...)"""
+    return codec if compression == COMPRESSION_NONE else f"{codec}-{compression}"
+
+
+def _register_compressed(codec: str, compression: str, threshold: int):
+    """
+    Registra ``<codec>-<compression>`` en kombu.
+
+    Los cuerpos de ``threshold`` bytes o más se comprimen; el primer byte
+    indica si el resto va comprimido, así los mensajes pequeños no pagan la
+    compresión.
+    """
+    encode, decode = _base_codec(codec)
+    compress, decompress = _compressor(compression)
+
+    def encoder(obj) -> bytes:
+        data = encode(obj)
+        if len(data) >= threshold:
+            return _COMPRESSED + compress(data)
+        return _RAW + data
+
+    def decoder(payload):
+        payload = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+        flag = payload[:1]
+        if flag == _COMPRESSED:
+            return decode(decompress(payload[1:]))
+        if flag == _RAW:
+            return decode(payload[1:])
+        # Resultado guardado antes de activar la compresión (sin byte de cabecera)
+        return decode(payload)
+
+    name = serializer_name(codec, compression)
+    registry.register(
+        name, encoder, decoder,
+        content_type=f"application/x-{name}",
+        content_encoding="binary",
+    )
+
+
+def register_serializers(threshold: int = None) -> List[str]:
+    """
+    Registra en kombu los codecs comprimidos disponibles.
+
+    Devuelve todos los nombres que los workers y la API deben aceptar, para
+    que los mensajes y resultados en vuelo se sigan leyendo al cambiar de
+    serializador.
+    """
+    threshold = settings.SERIALIZER_COMPRESSION_THRESHOLD if threshold is None else threshold
+    accepted = []
+    for codec in CODECS:
+        if not codec_available(codec):
+            continue
+        accepted.append(codec)
+        for compression in COMPRESSIONS[1:]:
+            if compression_available(compression):
+                _register_compressed(codec, compression, threshold)
+                accepted.append(serializer_name(codec, compression))
+    return accepted
+
+
+def configured_serializer() -> str:
+    """Serializador de ``CELERY_SERIALIZER`` + ``SERIALIZER_COMPRESSION`` (con fallback si falta la librería)"""
+    codec = settings.CELERY_SERIALIZER.lower()
+    if codec not in CODECS or not codec_available(codec):
+        logger.warning(f"CELERY_SERIALIZER '{codec}' no disponible, usando '{CODEC_JSON}'")
+        codec = CODEC_JSON
+    compression = settings.SERIALIZER_COMPRESSION.lower() or COMPRESSION_NONE
+    if compression not in COMPRESSIONS:
+        logger.warning(f"SERIALIZER_COMPRESSION inválido '{compression}', usando '{COMPRESSION_NONE}'")
+        compression = COMPRESSION_NONE
+    elif not compression_available(compression):
+        logger.warning(f"SERIALIZER_COMPRESSION '{compression}' requiere zstandard, usando '{COMPRESSION_ZLIB}'")
+        compression = COMPRESSION_ZLIB
+    return serializer_name(codec, compression)
+
+
+@lru_cache(maxsize=1)
+def uses_orjson() -> bool:
+    """Indica si las respuestas HTTP se serializan con orjson (``API_JSON_RESPONSE``)"""
+    if settings.API_JSON_RESPONSE.lower() != "orjson":
+        return False
+    if orjson is None:
+        logger.warning("API_JSON_RESPONSE=orjson pero orjson no está instalado, usando json")
+        return False
+    return True
+
+
+def response_class():
+    """Clase de respuesta por defecto de FastAPI"""
+    # Import diferido: los workers también importan este módulo
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    return ORJSONResponse if uses_orjson() else JSONResponse
+
+
+def dumps(obj) -> str:
+    """JSON para SSE y WebSocket con el mismo motor que las respuestas HTTP"""
+    if uses_orjson():
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
@@ -0,0 +1,317 @@
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+from app.config import settings
+from app.metrics import SMTP_AUTH, SMTP_CONNECT, SMTP_POOL_IN_USE, SMTP_POOL_MAX, SMTP_SEND
+from app.mime import PreparedMessage
+from app.tracing import span
+from app.worker_profiles import smtp_pool_size
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _send(server: smtplib.SMTP, message):
+    """Envía un ``PreparedMessage`` (bytes ya generados) o un objeto ``email.message``"""
+    start = time.perf_counter()
+    with span("smtp.send"):
+        if isinstance(message, PreparedMessage):
+            response = server.sendmail(message.from_addr, message.to_addrs, message.data)
+        else:
+            response = server.send_message(message)
+    SMTP_SEND.observe(time.perf_counter() - start)
+    return response
+
+
+class PooledSMTPConnection:
+    """Conexión SMTP autenticada con metadatos para reciclarla dentro del pool"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            # La conexión ya puede estar cerrada por el servidor
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Pool acotado de conexiones SMTP autenticadas para un proceso worker.
+
+    Las conexiones se reutilizan entre tareas para evitar el handshake
+    TCP + TLS + AUTH en cada correo. Se verifican con NOOP tras un periodo
+    de inactividad y se reciclan por tiempo de vida, inactividad o número
+    de mensajes enviados.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        use_ssl: bool = False,
+        use_tls: bool = True,
+        max_size: int = 4,
+        idle_timeout: float = 60.0,
+        max_lifetime: float = 600.0,
+        max_messages: int = 100,
+        health_check_interval: float = 15.0,
+        timeout: float = 30.0,
+        acquire_timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl or port == 465
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.max_messages = max_messages
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._in_use = 0
+        SMTP_POOL_MAX.set(max_size)
+
+    def _connect(self, on_phase: Optional[Callable[[str], None]] = None) -> PooledSMTPConnection:
+        """Abre y autentica una nueva conexión SMTP"""
+        if on_phase:
+            on_phase('connecting')
+
+        start = time.perf_counter()
+        if self.use_ssl:
+            logger.info(f"Conectando con SSL directo (puerto {self.port})")
+            with span("smtp.connect", {"smtp.ssl": True}):
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            logger.info(f"Conectando con STARTTLS (puerto {self.port})")
+            with span("smtp.connect"):
+                server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+        try:
+            if self.use_tls and not self.use_ssl:
+                with span("smtp.starttls"):
+                    server.starttls()
+            SMTP_CONNECT.observe(time.perf_counter() - start)
+
+            if on_phase:
+                on_phase('authenticating')
+
+            if self.user:
+                start = time.perf_counter()
+                with span("smtp.login"):
+                    server.login(self.user, self.password)
+                SMTP_AUTH.observe(time.perf_counter() - start)
+        except BaseException:
+            # Sin esto el socket queda abierto hasta que lo recoja el GC
+            server.close()
+            raise
+
+        return PooledSMTPConnection(server)
+
+    def _is_reusable(self, conn: PooledSMTPConnection) -> bool:
+        """Indica si una conexión inactiva puede volver a usarse"""
+        now = time.monotonic()
+        if now - conn.created_at > self.max_lifetime:
+            return False
+        if now - conn.last_used > self.idle_timeout:
+            return False
+        if conn.messages_sent >= self.max_messages:
+            return False
+        if now - conn.last_used > self.health_check_interval:
+            try:
+                code, _ = conn.server.noop()
+                return code == 250
+            except smtplib.SMTPException:
+                return False
+            except OSError:
+                return False
+        return True
+
+    def acquire(self, on_phase: Optional[Callable[[str], None]] = None) -> PooledSMTPConnection:
+        """Obtiene una conexión sana del pool o abre una nueva"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError("No hay conexiones SMTP disponibles en el pool")
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    conn = self._connect(on_phase)
+                    break
+                if self._is_reusable(conn):
+                    break
+                conn.close()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        SMTP_POOL_IN_USE.inc()
+        return conn
+
+    def release(self, conn: PooledSMTPConnection, discard: bool = False):
+        """Devuelve una conexión al pool (o la cierra si está rota o agotada)"""
+        conn.last_used = time.monotonic()
+        if discard or conn.messages_sent >= self.max_messages:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+        with self._lock:
+            self._in_use -= 1
+        SMTP_POOL_IN_USE.dec()
+        self._slots.release()
+
+    @contextmanager
+    def connection(self, on_phase: Optional[Callable[[str], None]] = None):
+        """Context manager que presta una conexión y la devuelve al terminar"""
+        conn = self.acquire(on_phase)
+        discard = False
+        try:
+            yield conn
+        except (smtplib.SMTPServerDisconnected, OSError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def send_message(self, message, on_phase: Optional[Callable[[str], None]] = None):
+        """
+        Envía un mensaje usando una conexión del pool.
+
+        Si el servidor cerró la conexión reutilizada se reintenta una única
+        vez con una conexión nueva.
+        """
+        for attempt in range(2):
+            try:
+                with self.connection(on_phase) as conn:
+                    if on_phase:
+                        on_phase('sending')
+                    response = _send(conn.server, message)
+                    conn.messages_sent += 1
+                    return response
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+                logger.warning("Conexión SMTP cerrada por el servidor, reconectando")
+
+    def send_messages(self, messages: list, on_phase: Optional[Callable[[str], None]] = None) -> list:
+        """
+        Envía varios mensajes por una misma sesión SMTP.
+
+        Devuelve una lista paralela a ``messages`` con ``None`` para cada
+        mensaje enviado o la excepción que lo rechazó. Si el servidor corta
+        la conexión se reconecta y se reintenta ese mensaje una única vez.
+        Cada conexión envía como mucho ``max_messages``; un lote más grande
+        continúa por una conexión nueva.
+        """
+        errors = [None] * len(messages)
+        index = 0
+        disconnected_at = None
+
+        while index < len(messages):
+            try:
+                with self.connection(on_phase) as conn:
+                    if on_phase:
+                        on_phase('sending')
+                    while index < len(messages):
+                        try:
+                            _send(conn.server, messages[index])
+                            conn.messages_sent += 1
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                            errors[index] = e
+                        index += 1
+                        if conn.messages_sent >= self.max_messages:
+                            # Conexión agotada: se cierra al devolverla y el
+                            # resto del lote sigue por otra
+                            break
+            except smtplib.SMTPServerDisconnected as e:
+                if disconnected_at == index:
+                    errors[index] = e
+                    index += 1
+                disconnected_at = index
+                logger.warning("Conexión SMTP cerrada por el servidor durante el lote, reconectando")
+            except (smtplib.SMTPException, OSError) as e:
+                # Error de conexión/autenticación: el resto del lote no se puede enviar
+                for pending in range(index, len(messages)):
+                    errors[pending] = e
+                break
+
+        return errors
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            }
+
+    def close_all(self):
+        """Cierra todas las conexiones inactivas del pool"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+
+_pool: Optional[SMTPConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """Devuelve el pool SMTP del proceso actual (se recrea tras un fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = SMTPConnectionPool(
+                    host=settings.SMTP_HOST,
+                    port=settings.SMTP_PORT,
+                    user=settings.SMTP_USER,
+                    password=settings.SMTP_PASSWORD,
+                    use_ssl=settings.SMTP_USE_SSL,
+                    use_tls=settings.SMTP_USE_TLS,
+                    max_size=smtp_pool_size(),
+                    idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+                    max_lifetime=settings.SMTP_POOL_MAX_LIFETIME,
+                    max_messages=settings.SMTP_POOL_MAX_MESSAGES,
+                    health_check_interval=settings.SMTP_POOL_HEALTH_CHECK_INTERVAL,
+                    timeout=settings.SMTP_TIMEOUT,
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def close_smtp_pool():
+    """Cierra el pool del proceso actual si existe"""
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close_all()
+    _pool = None
@@ -0,0 +1,182 @@
+import time
+from collections import Counter
+from typing import List, Optional
+import redis.asyncio as aioredis
+from app.celery_app import celery_app
+from app.config import settings
+from app.metrics import REDIS_STATUS
+from app.results import BATCH_CHILDREN_KEY
+from app.schemas import TaskStatusResponse, TaskStatus, TaskStateSummary, BatchStatusResponse, ResultMode
+import logging
+
+logger = logging.getLogger(__name__)
+
+READY_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Cliente Redis asíncrono compartido por la API (pool de conexiones propio)"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _redis
+
+
+async def close_async_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+
+
+def decode_task_meta(task_id: str, raw: Optional[bytes]) -> dict:
+    """
+    Decodifica la meta de una tarea leída del backend de resultados.
+
+    Usa el serializador del backend de Celery, así que las excepciones de
+    tareas fallidas se reconstruyen igual que con ``AsyncResult``.
+    """
+    if raw is None:
+        return {"task_id": task_id, "status": "PENDING", "result": None}
+    return celery_app.backend.decode_result(raw)
+
+
+async def fetch_task_meta(task_id: str) -> dict:
+    """Lee la meta de una tarea con un único GET asíncrono"""
+    key = celery_app.backend.get_key_for_task(task_id)
+    start = time.perf_counter()
+    raw = await get_async_redis().get(key)
+    REDIS_STATUS.observe(time.perf_counter() - start)
+    return decode_task_meta(task_id, raw)
+
+
+def build_status_response(task_id: str, meta: dict) -> TaskStatusResponse:
+    """Convierte la meta del backend en la respuesta de /status"""
+    status = meta["status"]
+    info = meta.get("result")
+
+    response = TaskStatusResponse(
+        task_id=task_id,
+        status=TaskStatus(status) if status in TaskStatus.__members__ else TaskStatus.PENDING
+    )
+
+    if status == "SUCCESS":
+        response.result = info
+    elif status == "FAILURE" or isinstance(info, BaseException):
+        response.error = str(info)
+    else:
+        response.progress = info if info else None
+
+    return response
+
+
+async def fetch_many_task_meta(task_ids: List[str]) -> List[dict]:
+    """Lee la meta de muchas tareas con un único MGET"""
+    if not task_ids:
+        return []
+    get_key = celery_app.backend.get_key_for_task
+    keys = [get_key(task_id) for task_id in task_ids]
+    start = time.perf_counter()
+    raws = await get_async_redis().mget(keys)
+    REDIS_STATUS.observe(time.perf_counter() - start)
+    return [decode_task_meta(task_id, raw) for task_id, raw in zip(task_ids, raws)]
+
+
+async def fetch_group_task_ids(group_id: str) -> Optional[List[str]]:
+    """
+    Devuelve los IDs de las tareas de un grupo guardado con GroupResult.save()
+
+    Incluye al final los reintentos y aplazamientos que los workers han
+    añadido al lote (un solo round trip para ambas claves).
+    """
+    backend = celery_app.backend
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.get(backend.get_key_for_group(group_id))
+    pipe.lrange(BATCH_CHILDREN_KEY.format(batch_id=group_id), 0, -1)
+    raw, added = await pipe.execute()
+    if raw is None:
+        return None
+    # Formato de GroupResult.as_tuple(): ((group_id, parent), [((task_id, parent), None), ...])
+    _, children = backend.decode(raw)["result"]
+    return [child[0][0] for child in children] + [task_id.decode() for task_id in added]
+
+
+def summarize(task_ids: List[str], metas: List[dict], batch_id: str = None) -> BatchStatusResponse:
+    """
+    Estados compactos por tarea más los totales agregados
+
+    En las tareas de lote solo cuentan como fallidos los destinatarios que
+    fueron a dead letters; los reintentados o aplazados siguen pendientes
+    hasta que termina la tarea que los reenvía (y que los contará ella).
+    """
+    tasks = []
+    counts = Counter()
+    sent = failed = pending_emails = 0
+    statuses = {task_id: meta["status"] for task_id, meta in zip(task_ids, metas)}
+    for task_id, meta in zip(task_ids, metas):
+        status = meta["status"]
+        info = meta.get("result")
+        counts[status] += 1
+        error = str(info) if isinstance(info, BaseException) else None
+        if status == "SUCCESS" and isinstance(info, dict):
+            # Tareas de lote: sumar destinatarios; tareas individuales: un correo
+            if "sent" in info:
+                sent += info["sent"]
+                failed += info.get("dead_lettered", 0)
+                for count, child in ((info.get("retried", 0), info.get("retry_task_id")),
+                                     (info.get("deferred", 0), info.get("deferred_task_id"))):
+                    if count and statuses.get(child) not in READY_STATES:
+                        pending_emails += count
+            elif info.get("success"):
+                sent += 1
+            else:
+                failed += 1
+                error = info.get("error")
+        elif status == "FAILURE":
+            # send_email_task termina en FAILURE tras un error permanente
+            failed += 1
+        tasks.append(TaskStateSummary(task_id=task_id, status=status, error=error))
+
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        total=len(tasks),
+        pending=counts["PENDING"] + counts["STARTED"] + counts["PROGRESS"] + counts["RETRY"],
+        success=counts["SUCCESS"],
+        failure=counts["FAILURE"] + counts["REVOKED"],
+        counts=dict(counts),
+        emails_sent=sent,
+        emails_failed=failed,
+        emails_pending=pending_emails,
+        tasks=tasks,
+    )
+
+
+def summarize_aggregate(batch_id: str, stats: dict) -> BatchStatusResponse:
+    """
+    Estado de un lote en modo ``aggregate`` a partir de sus contadores.
+
+    No hay resultados por tarea: ``total``, ``pending``, ``success`` y
+    ``failure`` cuentan correos en lugar de tareas.
+    """
+    emails = stats.get("emails", 0)
+    sent = stats.get("sent", 0)
+    failed = stats.get("failed", 0)
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        mode=ResultMode.AGGREGATE,
+        total=emails,
+        pending=max(0, emails - sent - failed),
+        success=sent,
+        failure=failed,
+        counts=stats,
+        emails_sent=sent,
+        emails_failed=failed,
+        emails_pending=max(0, emails - sent - failed),
+        tasks=[],
+    )
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set
+from celery import states
+from app.celery_app import celery_app
+from app.config import settings
+from app.serialization import dumps
+from app.status import get_async_redis, fetch_many_task_meta, decode_task_meta, build_status_response
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StatusHub:
+    """
+    Reparte las actualizaciones del backend de resultados a los clientes.
+
+    El backend Redis de Celery publica cada cambio de estado en un canal con
+    el mismo nombre que la clave ``celery-task-meta-<id>``. La API mantiene
+    una sola conexión pub/sub por proceso y reparte los mensajes a colas
+    asyncio en memoria, así cada cliente SSE/WebSocket no ocupa una conexión
+    a Redis.
+    """
+
+    def __init__(self):
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._listeners: Dict[bytes, Set[asyncio.Queue]] = {}
+        self._has_channels = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def _channel(self, task_id: str) -> bytes:
+        return celery_app.backend.get_key_for_task(task_id)
+
+    async def subscribe(self, task_ids: List[str]) -> asyncio.Queue:
+        """Crea una cola que recibe la meta de cada actualización de ``task_ids``"""
+        queue = asyncio.Queue()
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = get_async_redis().pubsub()
+            new_channels = []
+            for task_id in task_ids:
+                channel = self._channel(task_id)
+                if channel not in self._listeners:
+                    self._listeners[channel] = set()
+                    new_channels.append(channel)
+                self._listeners[channel].add(queue)
+            if new_channels:
+                await self._pubsub.subscribe(*new_channels)
+                self._has_channels.set()
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read_loop())
+        return queue
+
+    async def unsubscribe(self, queue: asyncio.Queue, task_ids: List[str]):
+        async with self._lock:
+            stale = []
+            for task_id in task_ids:
+                channel = self._channel(task_id)
+                listeners = self._listeners.get(channel)
+                if listeners is None:
+                    continue
+                listeners.discard(queue)
+                if not listeners:
+                    del self._listeners[channel]
+                    stale.append(channel)
+            if stale:
+                await self._pubsub.unsubscribe(*stale)
+            if not self._listeners:
+                self._has_channels.clear()
+
+    async def _read_loop(self):
+        prefix_len = len(celery_app.backend.task_keyprefix)
+        while True:
+            await self._has_channels.wait()
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error leyendo actualizaciones de estado: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"]
+            listeners = self._listeners.get(channel)
+            if not listeners:
+                continue
+            task_id = channel[prefix_len:].decode()
+            try:
+                meta = decode_task_meta(task_id, message["data"])
+            except Exception as e:
+                logger.error(f"Error decodificando estado de tarea {task_id}: {str(e)}")
+                continue
+            for queue in list(listeners):
+                queue.put_nowait((task_id, meta))
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        self._listeners.clear()
+        self._has_channels.clear()
+
+
+_hub: Optional[StatusHub] = None
+
+
+def get_status_hub() -> StatusHub:
+    global _hub
+    if _hub is None:
+        _hub = StatusHub()
+    return _hub
+
+
+async def close_status_hub():
+    global _hub
+    if _hub is not None:
+        await _hub.close()
+        _hub = None
+
+
+def event_payload(task_id: str, meta: dict) -> dict:
+    """Evento enviado al cliente (mismo formato que /status/{task_id})"""
+    return build_status_response(task_id, meta).model_dump(mode="json")
+
+
+async def task_events(task_ids: List[str], timeout: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+    """
+    Genera eventos de estado para ``task_ids`` hasta que todas terminan.
+
+    Emite primero el estado actual de cada tarea y después cada cambio
+    publicado por los workers. Devuelve ``None`` periódicamente como
+    keepalive mientras no hay eventos.
+    """
+    hub = get_status_hub()
+    timeout = settings.STATUS_STREAM_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    pending = set(task_ids)
+
+    # Suscribirse antes de leer el estado actual para no perder eventos
+    queue = await hub.subscribe(task_ids)
+    try:
+        for task_id, meta in zip(task_ids, await fetch_many_task_meta(task_ids)):
+            yield event_payload(task_id, meta)
+            if meta["status"] in states.READY_STATES:
+                pending.discard(task_id)
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                task_id, meta = await asyncio.wait_for(
+                    queue.get(), timeout=min(remaining, settings.STATUS_STREAM_KEEPALIVE)
+                )
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield event_payload(task_id, meta)
+            if meta["status"] in states.READY_STATES:
+                pending.discard(task_id)
+    finally:
+        await hub.unsubscribe(queue, task_ids)
+
+
+async def sse_stream(task_ids: List[str]) -> AsyncIterator[str]:
+    """Adapta ``task_events`` al formato Server-Sent Events"""
+    async for event in task_events(task_ids):
+        if event is None:
+            yield ": keepalive\n\n"
+        else:
+            yield f"event: {event['status']}\ndata: {dumps(event)}\n\n"
+    yield "event: end\ndata: {}\n\n"
@@ -0,0 +1,375 @@
+"""
+Transporte alternativo a Celery para ``/send-email`` sobre Redis Streams.
+
+Con ``EMAIL_TRANSPORT=streams`` la API añade cada correo con ``XADD`` al
+stream de su clase de mensaje y los consumidores (``python -m
+app.streams``) los leen por lotes con ``XREADGROUP`` en un consumer group.
+Cada entrada se confirma (``XACK`` + ``XDEL``) solo después del envío SMTP;
+las que deja pendientes un consumidor caído se reclaman con ``XAUTOCLAIM``
+pasados ``STREAM_CLAIM_IDLE`` segundos, sin visibility timeout.
+
+El resultado se guarda en el backend de resultados de Celery con el mismo
+formato, así que ``/status`` funciona igual. Reintentos y ``send_at`` pasan
+por el ZSET del scheduler, que libera las entradas al stream.
+"""
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+import redis
+from app.celery_app import celery_app, MESSAGE_CLASS_QUEUES
+from app.config import settings
+from app.redis_client import get_redis
+from app.scheduler import ScheduleDispatcher, schedule_messages
+from app.tasks import send_email_sync, send_email_task
+from app.progress import ProgressReporter
+from app.rate_limit import get_rate_limiter, throttle_delay
+from app.delivery_errors import EmailDeliveryError, PERMANENT, TRANSIENT, classify_error, retry_delay
+from app.dead_letter import record_dead_letter
+from app.idempotency import SENT, claim_delivery, mark_delivered, release_delivery
+from app.results import compact_result
+from app.smtp_pool import close_smtp_pool
+from app.worker_profiles import smtp_pool_size
+from app.metrics import (
+    EMAILS_SENT, REDIS_PUBLISH, RETRY_IN_FLIGHT, RETRY_RATE_LIMITED, RETRY_TRANSIENT,
+    record_failure, start_worker_exporter,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_CELERY = "celery"
+TRANSPORT_STREAMS = "streams"
+
+# Campo de cada entrada del stream: {"id": task_id, "kwargs": {...}} en JSON
+MESSAGE_FIELD = "message"
+
+
+def streams_enabled() -> bool:
+    return settings.EMAIL_TRANSPORT.lower() == TRANSPORT_STREAMS
+
+
+def stream_key(queue: str) -> str:
+    """Stream de una cola (``email_stream:email_transactional``...)"""
+    return f"{settings.STREAM_PREFIX}:{queue}"
+
+
+def encode_message(task_id: str, kwargs: dict) -> str:
+    return json.dumps({"id": task_id, "kwargs": kwargs})
+
+
+async def enqueue(redis_client, queue: str, task_id: str, kwargs: dict,
+                  send_at: Optional[float] = None):
+    """
+    Añade un correo al stream de ``queue`` (un solo ``XADD``).
+
+    Con ``send_at`` la entrada espera en el ZSET del scheduler, igual que
+    los mensajes de Celery programados.
+    """
+    key = stream_key(queue)
+    message = encode_message(task_id, kwargs)
+    start = time.perf_counter()
+    if send_at is None:
+        await redis_client.xadd(key, {MESSAGE_FIELD: message})
+    else:
+        pipe = redis_client.pipeline(transaction=False)
+        schedule_messages(pipe, key, {task_id: message}, send_at)
+        await pipe.execute()
+    REDIS_PUBLISH.observe(time.perf_counter() - start)
+
+
+class StreamWorker:
+    """
+    Consumidor de los streams de correo.
+
+    Lee hasta ``batch_size`` entradas por ``XREADGROUP`` mientras haya hilos
+    libres (``concurrency``), por orden de clase (transactional antes que
+    bulk y low), envía cada una en un hilo y confirma las
+    terminadas en un pipeline por vuelta. Cada ``STREAM_CLAIM_INTERVAL``
+    segundos reclama con ``XAUTOCLAIM`` las entradas de consumidores caídos;
+    las que superan ``STREAM_MAX_DELIVERIES`` entregas van a dead letters.
+    """
+
+    def __init__(self, queues: Optional[Iterable[str]] = None, consumer: Optional[str] = None,
+                 concurrency: Optional[int] = None, batch_size: Optional[int] = None):
+        # En orden de clase: transactional primero
+        self.streams = [stream_key(queue) for queue in (queues or MESSAGE_CLASS_QUEUES.values())]
+        self.group = settings.STREAM_GROUP
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        # Por defecto, un hilo por conexión del pool SMTP (ver WORKER_PROFILE)
+        self.concurrency = concurrency or settings.STREAM_CONCURRENCY or smtp_pool_size()
+        self.batch_size = batch_size or settings.STREAM_BATCH_SIZE
+        self._redis = get_redis()
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="stream-sender")
+        self._in_flight = 0
+        self._slot_freed = threading.Condition()
+        # (stream, entry_id) enviados y pendientes de XACK
+        self._done = deque()
+        self._stop = threading.Event()
+
+    def ensure_groups(self):
+        """Crea los streams y el consumer group si no existen"""
+        for stream in self.streams:
+            try:
+                self._redis.xgroup_create(stream, self.group, id="0", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    def _submit(self, stream: bytes, entry_id: bytes, fields: Optional[dict], redelivered: bool = False):
+        with self._slot_freed:
+            self._in_flight += 1
+        self._executor.submit(self._process, stream, entry_id, fields, redelivered)
+
+    def _process(self, stream: bytes, entry_id: bytes, fields: Optional[dict], redelivered: bool):
+        try:
+            if fields:
+                message = json.loads(fields[MESSAGE_FIELD.encode()])
+                self.deliver(stream.decode(), message["id"], message["kwargs"], redelivered)
+            self._done.append((stream, entry_id))
+        except Exception as e:
+            # Sin ack: la entrada queda pendiente y se reclamará más tarde
+            logger.error(f"Error procesando la entrada {entry_id.decode()} de {stream.decode()}: {str(e)}")
+        finally:
+            with self._slot_freed:
+                self._in_flight -= 1
+                self._slot_freed.notify()
+
+    def _ack(self):
+        """Confirma y borra del stream las entradas terminadas (un round trip)"""
+        if not self._done:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        while self._done:
+            stream, entry_id = self._done.popleft()
+            pipe.xack(stream, self.group, entry_id)
+            pipe.xdel(stream, entry_id)
+        pipe.execute()
+
+    def _free_slots(self) -> int:
+        with self._slot_freed:
+            if self._in_flight >= self.concurrency:
+                self._slot_freed.wait(timeout=settings.STREAM_BLOCK_MS / 1000)
+            return self.concurrency - self._in_flight
+
+    def reclaim(self, free: int) -> int:
+        """
+        Reclama como mucho ``free`` entradas pendientes de consumidores inactivos.
+
+        Igual que ``_read``, no pasa de los hilos libres: lo que no cabe se
+        reclama en la siguiente vuelta.
+        """
+        claimed = 0
+        min_idle = int(settings.STREAM_CLAIM_IDLE * 1000)
+        for stream in self.streams:
+            start = "0-0"
+            while claimed < free:
+                response = self._redis.xautoclaim(
+                    stream, self.group, self.consumer, min_idle, start_id=start,
+                    count=min(free - claimed, self.batch_size),
+                )
+                start, entries = response[0], response[1]
+                if entries:
+                    deliveries = {
+                        pending["message_id"]: pending["times_delivered"]
+                        for pending in self._redis.xpending_range(
+                            stream, self.group, min=entries[0][0], max=entries[-1][0],
+                            count=len(entries), consumername=self.consumer,
+                        )
+                    }
+                for entry_id, fields in entries:
+                    claimed += 1
+                    if fields and deliveries.get(entry_id, 0) > settings.STREAM_MAX_DELIVERIES:
+                        self._dead_letter_poison(stream, entry_id, fields)
+                        continue
+                    self._submit(stream.encode(), entry_id, fields, redelivered=True)
+                if start in (b"0-0", "0-0"):
+                    break
+        if claimed:
+            logger.warning(f"Reclamadas {claimed} entradas pendientes de consumidores inactivos")
+        return claimed
+
+    def _dead_letter_poison(self, stream: str, entry_id: bytes, fields: dict):
+        # La entrada tumba a los consumidores (o no termina nunca): no reintentar más
+        message = json.loads(fields[MESSAGE_FIELD.encode()])
+        if celery_app.backend.get_task_meta(message["id"])["status"] == "SUCCESS":
+            # Se envió pero nunca se llegó a confirmar
+            self._done.append((stream.encode(), entry_id))
+            return
+        error = EmailDeliveryError(f"Entrada entregada más de {settings.STREAM_MAX_DELIVERIES} veces sin confirmar")
+        logger.error(f"{error} ({entry_id.decode()} en {stream}), enviada a dead letters")
+        record_dead_letter(
+            send_email_task.name, message["kwargs"], error, PERMANENT,
+            task_id=message["id"], attempts=settings.STREAM_MAX_DELIVERIES,
+        )
+        celery_app.backend.mark_as_failure(message["id"], error)
+        self._done.append((stream.encode(), entry_id))
+
+    def _retry(self, stream: str, task_id: str, kwargs: dict, countdown: float):
+        """Vuelve a añadir el correo al stream dentro de ``countdown`` segundos"""
+        pipe = self._redis.pipeline(transaction=False)
+        schedule_messages(pipe, stream, {task_id: encode_message(task_id, kwargs)}, time.time() + countdown)
+        pipe.execute()
+
+    def deliver(self, stream: str, task_id: str, kwargs: dict, redelivered: bool = False):
+        """
+        Envía un correo con la misma semántica que ``send_email_task``.
+
+        Rate limiting, idempotencia, reintentos con backoff y dead letters
+        funcionan igual; el resultado se guarda en el backend de Celery.
+        """
+        to_email = kwargs["to_email"]
+        attempt = kwargs.get("attempt", 0)
+        idempotency_key = kwargs.get("idempotency_key")
+        backend = celery_app.backend
+
+        if redelivered and backend.get_task_meta(task_id)["status"] == "SUCCESS":
+            # El consumidor anterior envió el correo pero murió antes del XACK
+            logger.info(f"Tarea {task_id} ya enviada, se confirma la entrada reclamada")
+            return
+
+        if idempotency_key:
+            claimed, state = claim_delivery(idempotency_key, task_id)
+            if not claimed and state == SENT:
+                logger.info(f"Correo con clave {idempotency_key} ya enviado, se omite el reenvío")
+                backend.mark_as_done(task_id, compact_result({
+                    "success": True,
+                    "duplicate": True,
+                    "message": f"Correo ya enviado a {to_email}",
+                    "to": to_email,
+                    "subject": kwargs["subject"],
+                }))
+                return
+            if not claimed:
+                countdown = retry_delay(0)
+                logger.info(f"Correo con clave {idempotency_key} en envío por otro consumidor, reintento en {countdown}s")
+                RETRY_IN_FLIGHT.inc()
+                self._retry(stream, task_id, kwargs, countdown)
+                return
+
+        granted, wait = get_rate_limiter().acquire([to_email])
+        if not granted[0]:
+            logger.info(f"Límite de envío alcanzado para {to_email}, reintento en {throttle_delay(wait)}s")
+            RETRY_RATE_LIMITED.inc()
+            if idempotency_key:
+                release_delivery(idempotency_key, task_id)
+            self._retry(stream, task_id, kwargs, throttle_delay(wait))
+            return
+
+        try:
+            result = send_email_sync(
+                to_email, kwargs["subject"], kwargs["body"], kwargs.get("from_email"),
+                reporter=ProgressReporter(), attachments=kwargs.get("attachments"),
+            )
+        except Exception as e:
+            error_class, code = classify_error(e)
+            record_failure(error_class, code)
+            if idempotency_key:
+                release_delivery(idempotency_key, task_id)
+            if error_class == TRANSIENT and attempt < settings.EMAIL_MAX_RETRIES:
+                countdown = retry_delay(attempt)
+                logger.warning(f"Error transitorio enviando a {to_email}, reintento {attempt + 1} en {countdown}s: {str(e)}")
+                RETRY_TRANSIENT.inc()
+                backend.mark_as_retry(task_id, e)
+                self._retry(stream, task_id, {**kwargs, "attempt": attempt + 1}, countdown)
+                return
+
+            logger.error(f"Error {error_class} enviando a {to_email}: {str(e)}")
+            payload = {key: value for key, value in kwargs.items() if key not in ("attempt", "idempotency_key")}
+            record_dead_letter(
+                send_email_task.name, payload, e, error_class, code, task_id=task_id, attempts=attempt + 1,
+            )
+            backend.mark_as_failure(task_id, EmailDeliveryError(f"Error enviando correo: {str(e)}"))
+            return
+
+        EMAILS_SENT.inc()
+        if idempotency_key:
+            mark_delivered(idempotency_key, task_id)
+        backend.mark_as_done(task_id, compact_result(result))
+
+    def _read(self, free: int) -> list:
+        """
+        Lee como mucho ``free`` entradas, vaciando antes los streams de más prioridad.
+
+        ``XREADGROUP`` aplica ``count`` a cada stream, así que se lee stream a
+        stream descontando lo recibido. Si no hay nada se bloquea en los
+        ``free`` streams más prioritarios, una entrada por stream.
+        """
+        response = []
+        for stream in self.streams:
+            if free <= 0:
+                break
+            for key, entries in self._redis.xreadgroup(
+                self.group, self.consumer, {stream: ">"}, count=min(free, self.batch_size),
+            ) or ():
+                response.append((key, entries))
+                free -= len(entries)
+        if response:
+            return response
+        return self._redis.xreadgroup(
+            self.group, self.consumer, {stream: ">" for stream in self.streams[:free]},
+            count=1, block=settings.STREAM_BLOCK_MS,
+        ) or []
+
+    def run(self):
+        """Bucle principal hasta ``stop()``; al salir espera los envíos en curso"""
+        self.ensure_groups()
+        logger.info(f"📨 Consumidor {self.consumer} leyendo {', '.join(self.streams)} ({self.concurrency} hilos)")
+        next_claim = 0.0
+        while not self._stop.is_set():
+            try:
+                self._ack()
+                free = self._free_slots()
+                if free <= 0:
+                    continue
+                if time.monotonic() >= next_claim:
+                    claimed = self.reclaim(free)
+                    if claimed < free:
+                        # Si se llenaron los hilos puede quedar más: reclamar en la siguiente vuelta
+                        next_claim = time.monotonic() + settings.STREAM_CLAIM_INTERVAL
+                    free -= claimed
+                    if free <= 0:
+                        continue
+                response = self._read(free)
+            except redis.RedisError as e:
+                logger.error(f"Error leyendo de los streams: {str(e)}")
+                self._stop.wait(1)
+                continue
+            for stream, entries in response or ():
+                for entry_id, fields in entries:
+                    self._submit(stream, entry_id, fields)
+
+        self._executor.shutdown(wait=True)
+        self._ack()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    """Consumidor como proceso independiente: ``python -m app.streams``"""
+    logging.basicConfig(level=settings.LOG_LEVEL.upper())
+    worker = StreamWorker()
+    dispatcher = None
+    if settings.SCHEDULER_ENABLED:
+        # Libera al stream los reintentos y los envíos programados
+        dispatcher = ScheduleDispatcher()
+        dispatcher.start()
+    start_worker_exporter()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: worker.stop())
+    try:
+        worker.run()
+    finally:
+        if dispatcher is not None:
+            dispatcher.stop()
+        close_smtp_pool()
+
+
+if __name__ == "__main__":
+    main()
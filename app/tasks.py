@@ -1,64 +1,84 @@
 import asyncio
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import uuid
 from celery import current_task
 from app.celery_app import celery_app
 from app.config import settings
+from app.smtp_pool import get_smtp_pool, close_smtp_pool
+from app.async_smtp import get_async_engine, close_async_engine
+from app.progress import ProgressReporter
+from app.mime import MessageBuilder, PreparedMessage
+from app.templating import render_template
+from app.rate_limit import get_rate_limiter, throttle_delay
+from app.delivery_errors import EmailDeliveryError, TRANSIENT, classify_error, retry_delay
+from app.dead_letter import record_dead_letter
+from app.metrics import (
+    EMAILS_SENT, RETRY_IN_FLIGHT, RETRY_RATE_LIMITED, RETRY_TRANSIENT, record_failure
+)
+from app.idempotency import SENT, claim_delivery, mark_delivered, release_delivery
+from app.results import RESULT_FULL, RESULT_AGGREGATE, compact_result, record_batch_stats, register_batch_task
+from celery.signals import worker_process_shutdown, worker_shutdown
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_email_sync(to_email: str, subject: str, body: str, from_email: str = None):
-    """Función síncrona para enviar correos electrónicos usando smtplib"""
-    if not from_email:
-        from_email = settings.SMTP_USER
+PHASE_MESSAGES = {
+    'connecting': 'Conectando al servidor SMTP',
+    'authenticating': 'Autenticando usuario',
+    'sending': 'Enviando correo a {to}',
+}
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _close_smtp_pool(**kwargs):
+    """
+    Cierra las conexiones SMTP del pool al terminar el proceso worker
+
+    Con pools de hilos no hay procesos hijos y ``worker_process_shutdown``
+    no se emite: las conexiones se cierran en ``worker_shutdown``.
+    """
+    close_smtp_pool()
+    close_async_engine()
+
+def build_message(to_email: str, subject: str, body: str, from_email: str = None,
+                  html: str = None, attachments: list = None,
+                  builder: MessageBuilder = None) -> PreparedMessage:
+    """
+    Construye el mensaje de un correo (texto, HTML y adjuntos opcionales)
     
-    # Crear el mensaje
-    message = MIMEMultipart()
-    message["From"] = from_email
-    message["To"] = to_email
-    message["Subject"] = subject
+    Con un ``builder`` compartido (lotes) el cuerpo y los adjuntos comunes
+    se codifican una sola vez y solo cambia la cabecera ``To``.
+    """
+    return (builder or MessageBuilder()).build(to_email, subject, body, from_email, html, attachments)
+
+def build_batch_message(item: dict, template: dict = None, builder: MessageBuilder = None) -> PreparedMessage:
+    """Construye un mensaje de lote, renderizando la plantilla si la hay"""
+    if template:
+        variables = {**(template.get("variables") or {}), **(item.get("variables") or {})}
+        rendered = render_template(template["id"], template["version"], variables)
+        return build_message(
+            item["to_email"], rendered["subject"], rendered["body"],
+            item.get("from_email") or rendered["from_email"], rendered["html"],
+            item.get("attachments"), builder
+        )
+    return build_message(
+        item["to_email"], item["subject"], item["body"], item.get("from_email"),
+        attachments=item.get("attachments"), builder=builder
+    )
+
+def send_email_sync(to_email: str, subject: str, body: str, from_email: str = None,
+                    reporter: ProgressReporter = None, attachments: list = None):
+    """Función síncrona para enviar correos electrónicos usando smtplib"""
+    message = build_message(to_email, subject, body, from_email, attachments=attachments)
+    if reporter is None:
+        reporter = ProgressReporter(current_task or None)
     
-    # Agregar el cuerpo del mensaje
-    message.attach(MIMEText(body, "plain"))
+    def report_phase(step: str):
+        # Actualizar progreso según la fase SMTP en curso
+        reporter.update({'step': step, 'message': PHASE_MESSAGES[step].format(to=to_email)})
     
     try:
-        # Actualizar progreso
-        if current_task:
-            current_task.update_state(
-                state='PROGRESS',
-                meta={'step': 'connecting', 'message': 'Conectando al servidor SMTP'}
-            )
-        
-        # Usar la configuración que sabemos que funciona
-        if settings.SMTP_PORT == 465:
-            # Puerto 465: SSL directo con smtplib
-            logger.info("Conectando con SSL directo (puerto 465)")
-            server = smtplib.SMTP_SSL(settings.SMTP_HOST, 465)
-        else:
-            # Puerto 587: STARTTLS con smtplib
-            logger.info("Conectando con STARTTLS (puerto 587)")
-            server = smtplib.SMTP(settings.SMTP_HOST, 587)
-            server.starttls()
-        
-        if current_task:
-            current_task.update_state(
-                state='PROGRESS',
-                meta={'step': 'authenticating', 'message': 'Autenticando usuario'}
-            )
-        
-        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        
-        if current_task:
-            current_task.update_state(
-                state='PROGRESS',
-                meta={'step': 'sending', 'message': f'Enviando correo a {to_email}'}
-            )
-        
-        # Enviar el correo
-        server.send_message(message)
-        server.quit()
+        # Reutilizar una conexión autenticada del pool del proceso
+        get_smtp_pool().send_message(message, on_phase=report_phase)
         
         logger.info(f"Correo enviado exitosamente a {to_email}")
         return {
@@ -70,28 +90,257 @@ def send_email_sync(to_email: str, subject: str, body: str, from_email: str = No
         
     except Exception as e:
         logger.error(f"Error enviando correo a {to_email}: {str(e)}")
-        raise Exception(f"Error enviando correo: {str(e)}")
+        # Propagar la excepción original para poder clasificarla (4xx vs 5xx)
+        raise
 
 @celery_app.task(bind=True, name='send_email_task')
-def send_email_task(self, to_email: str, subject: str, body: str, from_email: str = None):
-    """Tarea de Celery para enviar correos electrónicos"""
+def send_email_task(self, to_email: str, subject: str, body: str, from_email: str = None,
+                    attempt: int = 0, idempotency_key: str = None, attachments: list = None):
+    """
+    Tarea de Celery para enviar correos electrónicos
+    
+    Los errores transitorios (4xx, desconexiones, timeouts) se reintentan con
+    backoff exponencial y jitter hasta ``EMAIL_MAX_RETRIES`` veces. Los
+    permanentes (5xx) y los transitorios que agotan los reintentos se guardan
+    en el stream de dead letters y la tarea termina en FAILURE.
+    
+    Con ``idempotency_key`` el correo se reserva en Redis antes de enviarlo:
+    si el mensaje se entrega dos veces (reinicio del worker, visibility
+    timeout) la segunda entrega no vuelve a enviarlo.
+    
+    ``attachments`` son referencias (``path`` dentro de ``ATTACHMENT_DIR`` o
+    ``blob`` subido con ``POST /attachments``): el contenido no viaja en el
+    mensaje del broker.
+    """
+    if idempotency_key:
+        claimed, state = claim_delivery(idempotency_key, self.request.id)
+        if not claimed and state == SENT:
+            logger.info(f"Correo con clave {idempotency_key} ya enviado, se omite el reenvío")
+            return compact_result({
+                "success": True,
+                "duplicate": True,
+                "message": f"Correo ya enviado a {to_email}",
+                "to": to_email,
+                "subject": subject,
+            })
+        if not claimed:
+            # Otra entrega del mismo correo está enviándolo: comprobar más tarde
+            countdown = retry_delay(0)
+            logger.info(f"Correo con clave {idempotency_key} en envío por otro worker, reintento en {countdown}s")
+            RETRY_IN_FLIGHT.inc()
+            raise self.retry(countdown=countdown, max_retries=float("inf"))
+    
+    # Los tokens se piden después de la reserva: un duplicado no gasta cupo
+    granted, wait = get_rate_limiter().acquire([to_email])
+    if not granted[0]:
+        # Sin tokens para la cuenta o el dominio: reencolar con retardo en lugar de fallar.
+        # La espera por rate limit no agota los reintentos (max_retries=None usaría el límite por defecto)
+        logger.info(f"Límite de envío alcanzado para {to_email}, reintento en {throttle_delay(wait)}s")
+        RETRY_RATE_LIMITED.inc()
+        if idempotency_key:
+            release_delivery(idempotency_key, self.request.id)
+        raise self.retry(countdown=throttle_delay(wait), max_retries=float("inf"))
+    
+    reporter = ProgressReporter(self)
     try:
         # Actualizar estado inicial
-        self.update_state(
-            state='STARTED',
-            meta={'step': 'initializing', 'message': 'Iniciando envío de correo'}
-        )
+        reporter.started({'step': 'initializing', 'message': 'Iniciando envío de correo'})
         
         # Usar función síncrona con smtplib (más confiable)
-        result = send_email_sync(to_email, subject, body, from_email)
-        
-        return result
+        result = send_email_sync(to_email, subject, body, from_email, reporter=reporter, attachments=attachments)
         
     except Exception as e:
-        logger.error(f"Error en tarea de envío de correo: {str(e)}")
-        # Return error instead of raising to avoid Celery exception issues
-        return {
-            "success": False,
-            "error": str(e),
-            "message": f"Error enviando correo: {str(e)}"
-        }
\ No newline at end of file
+        error_class, code = classify_error(e)
+        record_failure(error_class, code)
+        reporter.finish()
+        if idempotency_key:
+            release_delivery(idempotency_key, self.request.id)
+        if error_class == TRANSIENT and attempt < settings.EMAIL_MAX_RETRIES:
+            countdown = retry_delay(attempt)
+            logger.warning(f"Error transitorio enviando a {to_email}, reintento {attempt + 1} en {countdown}s: {str(e)}")
+            RETRY_TRANSIENT.inc()
+            raise self.retry(
+                exc=e, countdown=countdown, max_retries=float("inf"),
+                kwargs={**(self.request.kwargs or {}), "attempt": attempt + 1},
+            )
+        
+        logger.error(f"Error {error_class} en tarea de envío de correo: {str(e)}")
+        record_dead_letter(
+            self.name,
+            {"to_email": to_email, "subject": subject, "body": body, "from_email": from_email,
+             **({"attachments": attachments} if attachments else {})},
+            e, error_class, code, task_id=self.request.id, attempts=attempt + 1,
+        )
+        raise EmailDeliveryError(f"Error enviando correo: {str(e)}") from e
+    
+    EMAILS_SENT.inc()
+    if idempotency_key:
+        mark_delivered(idempotency_key, self.request.id)
+    result["backend_writes"] = reporter.finish()
+    return compact_result(result)
+
+def _requeue_batch(task, retry_task, messages: list, attempt: int, template: dict, countdown: float,
+                   result_mode: str = RESULT_FULL):
+    """
+    Reencola ``messages`` en un nuevo lote manteniendo la cola, prioridad,
+    grupo y modo de resultado del original
+    
+    En modo ``full`` la nueva tarea se registra en el lote antes de
+    publicarla, así ``/status/group`` la sigue hasta su estado final.
+    """
+    delivery_info = task.request.delivery_info or {}
+    kwargs = {"messages": messages, "attempt": attempt, "template": template}
+    task_id = str(uuid.uuid4())
+    if result_mode != RESULT_FULL:
+        kwargs["result_mode"] = result_mode
+    elif not task.request.ignore_result:
+        register_batch_task(task.request.group, task_id)
+    return retry_task.apply_async(
+        kwargs=kwargs,
+        task_id=task_id,
+        countdown=countdown,
+        queue=delivery_info.get("routing_key"),
+        priority=delivery_info.get("priority"),
+        group_id=task.request.group,
+        ignore_result=bool(task.request.ignore_result),
+    )
+
+def _deliver_batch(task, messages: list, attempt: int, send_messages, retry_task,
+                   template: dict = None, result_mode: str = RESULT_FULL) -> dict:
+    """
+    Envía un lote con ``send_messages`` y reencola solo los destinatarios con
+    errores transitorios; los permanentes van al stream de dead letters
+    
+    ``send_messages`` recibe la lista de mensajes MIME y devuelve una lista
+    paralela con ``None`` o la excepción de cada envío. Con ``template``
+    ({"id", "version"}) cada mensaje solo trae ``to_email`` y ``variables``.
+    En modo ``aggregate`` el resultado se suma a los contadores del lote.
+    """
+    logger.info(f"Enviando lote de {len(messages)} correos (intento {attempt + 1})")
+    reporter = ProgressReporter(task)
+    
+    results = []
+    built = []
+    # Cuerpos y adjuntos comunes se codifican una vez para todo el lote
+    builder = MessageBuilder()
+    for item in messages:
+        try:
+            built.append(build_batch_message(item, template, builder))
+        except Exception as e:
+            built.append(e)
+    
+    # Reservar tokens del rate limiter solo para los mensajes que se van a
+    # enviar (los lotes no llevan clave de idempotencia: /send-emails la rechaza)
+    buildable = [i for i, message in enumerate(built) if not isinstance(message, Exception)]
+    granted, wait = get_rate_limiter().acquire([messages[i]["to_email"] for i in buildable])
+    throttled = {i for i, ok in zip(buildable, granted) if not ok}
+    
+    to_send = [built[i] for i, ok in zip(buildable, granted) if ok]
+    reporter.update({'step': 'sending', 'message': PHASE_MESSAGES['sending'].format(to=f"{len(to_send)} destinatarios")})
+    send_errors = iter(send_messages(to_send))
+    
+    failed = 0
+    retryable = []
+    dead_lettered = 0
+    deferred = []
+    for index, (item, message) in enumerate(zip(messages, built)):
+        if index in throttled:
+            deferred.append(item)
+            continue
+        error = message if isinstance(message, Exception) else next(send_errors)
+        if error is None:
+            results.append({"to": item["to_email"], "success": True})
+            continue
+        
+        failed += 1
+        error_class, code = classify_error(error)
+        record_failure(error_class, code)
+        logger.error(f"Error {error_class} enviando correo a {item['to_email']}: {str(error)}")
+        results.append({
+            "to": item["to_email"], "success": False, "error": str(error),
+            "error_class": error_class, "code": code,
+        })
+        if error_class == TRANSIENT and attempt < settings.EMAIL_BATCH_MAX_RETRIES:
+            retryable.append(item)
+        else:
+            # Permanente (5xx, plantilla inválida) o sin reintentos: no se vuelve a encolar
+            payload = {**item, "template": template} if template else item
+            record_dead_letter(
+                task.name, payload, error, error_class, code,
+                task_id=task.request.id, attempts=attempt + 1,
+            )
+            dead_lettered += 1
+    
+    retry_task_id = None
+    if retryable:
+        # Reintentar solo los destinatarios con errores transitorios
+        retry = _requeue_batch(
+            task, retry_task, retryable, attempt + 1, template,
+            countdown=retry_delay(attempt, base=settings.EMAIL_BATCH_RETRY_DELAY),
+            result_mode=result_mode,
+        )
+        retry_task_id = retry.id
+        RETRY_TRANSIENT.inc(len(retryable))
+        logger.info(f"Reencolados {len(retryable)} correos fallidos en la tarea {retry_task_id}")
+    
+    deferred_task_id = None
+    if deferred:
+        # Sin tokens para estos destinatarios: mismo intento, cuando el bucket se recargue
+        deferred_task_id = _requeue_batch(
+            task, retry_task, deferred, attempt, template, countdown=throttle_delay(wait),
+            result_mode=result_mode,
+        ).id
+        RETRY_RATE_LIMITED.inc(len(deferred))
+        logger.info(f"Aplazados {len(deferred)} correos por rate limit en la tarea {deferred_task_id}")
+    
+    sent = len(messages) - failed - len(deferred)
+    EMAILS_SENT.inc(sent)
+    result = {
+        "success": not failed,
+        "total": len(messages),
+        "sent": sent,
+        "failed": failed,
+        "retried": len(retryable),
+        "dead_lettered": dead_lettered,
+        "deferred": len(deferred),
+        "results": results,
+        "retry_task_id": retry_task_id,
+        "deferred_task_id": deferred_task_id,
+        "backend_writes": reporter.finish(),
+        "message": f"Lote enviado: {sent}/{len(messages)} correos"
+    }
+    if result_mode == RESULT_AGGREGATE:
+        record_batch_stats(task.request.group, result)
+    return compact_result(result)
+
+@celery_app.task(bind=True, name='send_email_batch_task')
+def send_email_batch_task(self, messages: list, attempt: int = 0, template: dict = None,
+                          result_mode: str = RESULT_FULL):
+    """
+    Tarea de Celery para enviar un lote de correos por una sola sesión SMTP
+    
+    Cada elemento de ``messages`` tiene los mismos campos que los argumentos
+    de ``send_email_task`` (o ``to_email`` + ``variables`` si se indica
+    ``template``). Los destinatarios con errores transitorios se reencolan
+    en un nuevo lote (hasta ``EMAIL_BATCH_MAX_RETRIES`` veces, con backoff y
+    jitter); los enviados no se repiten.
+    """
+    return _deliver_batch(
+        self, messages, attempt, get_smtp_pool().send_messages, send_email_batch_task,
+        template, result_mode
+    )
+
+@celery_app.task(bind=True, name='send_email_async_batch_task')
+def send_email_async_batch_task(self, messages: list, attempt: int = 0, template: dict = None,
+                                result_mode: str = RESULT_FULL):
+    """
+    Tarea de Celery para enviar un lote de correos concurrentemente
+    
+    Usa el motor asyncio del proceso (aiosmtplib) para mantener hasta
+    ``ASYNC_SMTP_CONCURRENCY`` envíos en vuelo sobre ``ASYNC_SMTP_POOL_SIZE``
+    conexiones, en lugar de enviar un correo detrás de otro.
+    """
+    return _deliver_batch(
+        self, messages, attempt, get_async_engine().send_messages, send_email_async_batch_task,
+        template, result_mode
+    )
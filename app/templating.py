@@ -0,0 +1,93 @@
+import json
+from functools import lru_cache
+from typing import Optional
+from jinja2 import StrictUndefined
+from jinja2.sandbox import SandboxedEnvironment
+from app.config import settings
+from app.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Claves en Redis:
+#   email_template:<id>            -> versión vigente
+#   email_template:<id>:<version>  -> JSON con subject/text/html/from_email (inmutable)
+#   email_template_seq:<id>        -> contador de versiones
+TEMPLATE_KEY = "email_template:{template_id}"
+TEMPLATE_VERSION_KEY = "email_template:{template_id}:{version}"
+TEMPLATE_SEQ_KEY = "email_template_seq:{template_id}"
+
+# Las plantillas llegan por la API: se renderizan en sandbox
+text_env = SandboxedEnvironment(undefined=StrictUndefined, autoescape=False)
+html_env = SandboxedEnvironment(undefined=StrictUndefined, autoescape=True)
+
+class CompiledTemplate:
+    """Plantilla de correo con sus partes ya compiladas"""
+
+    def __init__(self, template_id: str, version: int, source: dict):
+        self.template_id = template_id
+        self.version = version
+        self.from_email = source.get("from_email")
+        self.subject = text_env.from_string(source["subject"])
+        self.text = text_env.from_string(source["text"])
+        self.html = html_env.from_string(source["html"]) if source.get("html") else None
+
+    def render(self, variables: dict) -> dict:
+        return {
+            "subject": self.subject.render(variables),
+            "body": self.text.render(variables),
+            "html": self.html.render(variables) if self.html else None,
+            "from_email": self.from_email,
+        }
+
+
+def compile_source(template_id: str, version: int, source: dict) -> CompiledTemplate:
+    """Compila una plantilla (lanza jinja2.TemplateSyntaxError si no es válida)"""
+    return CompiledTemplate(template_id, version, source)
+
+
+@lru_cache(maxsize=settings.TEMPLATE_CACHE_SIZE)
+def get_compiled_template(template_id: str, version: int) -> CompiledTemplate:
+    """
+    Devuelve una versión de plantilla compilada.
+
+    Las versiones son inmutables, así que la caché LRU por proceso no
+    necesita invalidación: solo se consulta Redis la primera vez.
+    """
+    raw = get_redis().get(TEMPLATE_VERSION_KEY.format(template_id=template_id, version=version))
+    if raw is None:
+        raise LookupError(f"Plantilla {template_id} v{version} no encontrada")
+    logger.info(f"Compilando plantilla {template_id} v{version}")
+    return compile_source(template_id, version, json.loads(raw))
+
+
+def render_template(template_id: str, version: int, variables: dict) -> dict:
+    """Renderiza asunto, texto y HTML de una plantilla para un destinatario"""
+    return get_compiled_template(template_id, version).render(variables)
+
+
+async def register_template(redis_client, template_id: str, source: dict) -> int:
+    """Guarda una nueva versión de la plantilla y la marca como vigente"""
+    # Validar sintaxis antes de reservar una versión
+    compile_source(template_id, 0, source)
+    version = await redis_client.incr(TEMPLATE_SEQ_KEY.format(template_id=template_id))
+    await redis_client.set(
+        TEMPLATE_VERSION_KEY.format(template_id=template_id, version=version), json.dumps(source)
+    )
+    await redis_client.set(TEMPLATE_KEY.format(template_id=template_id), version)
+    return version
+
+
+async def get_current_version(redis_client, template_id: str) -> Optional[int]:
+    """Versión vigente de una plantilla o ``None`` si no existe"""
+    version = await redis_client.get(TEMPLATE_KEY.format(template_id=template_id))
+    return int(version) if version is not None else None
+
+
+async def get_template_source(redis_client, template_id: str) -> Optional[dict]:
+    """Fuente de la versión vigente de una plantilla"""
+    version = await get_current_version(redis_client, template_id)
+    if version is None:
+        return None
+    raw = await redis_client.get(TEMPLATE_VERSION_KEY.format(template_id=template_id, version=version))
+    return {"template_id": template_id, "version": version, **json.loads(raw)}
@@ -0,0 +1,240 @@
+from contextlib import nullcontext
+from typing import Optional
+from celery.signals import task_prerun, task_postrun, worker_init
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # pragma: no cover - dependencia opcional
+    trace = None
+
+ENABLED = settings.TRACING_ENABLED and trace is not None
+
+# Cabecera del mensaje de Celery con la hora (epoch) desde la que cuenta la
+# espera en cola: la publicación o el send_at de un envío programado
+ENQUEUED_AT_HEADER = "trace_enqueued_at"
+
+# Rutas que no se trazan (sondas y scrapes)
+UNTRACED_PATHS = ("/health", "/metrics")
+
+_NULL_SPAN = nullcontext()
+_tracer = None
+# task_id -> (span, token) de las tareas en curso en este proceso
+_task_spans = {}
+
+
+def setup_tracing(service_name: str):
+    """
+    Configura el TracerProvider del proceso (una vez).
+
+    El muestreo se decide en la raíz (la solicitud HTTP) con
+    ``TRACING_SAMPLE_RATIO``; el resto de spans siguen esa decisión. Los
+    spans se exportan en segundo plano por lotes y se descartan si la cola
+    del exportador se llena.
+    """
+    global _tracer
+    if not ENABLED or _tracer is not None:
+        return
+    exporter = _exporter()
+    if exporter is None:
+        return
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(__name__)
+    logger.info(f"🔎 Tracing activo ({settings.TRACING_EXPORTER}, muestreo {settings.TRACING_SAMPLE_RATIO})")
+
+
+def _exporter():
+    kind = settings.TRACING_EXPORTER.lower()
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("TRACING_EXPORTER=otlp requiere opentelemetry-exporter-otlp-proto-http, tracing deshabilitado")
+            return None
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    if kind == "file":
+        # Un span JSON por línea; el fichero se comparte entre procesos en modo append
+        return ConsoleSpanExporter(
+            out=open(settings.TRACING_FILE, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    if kind == "console":
+        return ConsoleSpanExporter()
+    logger.warning(f"TRACING_EXPORTER inválido '{kind}', tracing deshabilitado")
+    return None
+
+
+def _recording() -> bool:
+    return _tracer is not None and trace.get_current_span().is_recording()
+
+
+def span(name: str, attributes: Optional[dict] = None):
+    """
+    Span hijo del span actual, solo si este se está muestreando.
+
+    Sin traza activa (tracing deshabilitado, solicitud no muestreada o código
+    fuera de una solicitud) devuelve un contexto vacío y no crea nada.
+    """
+    if not ENABLED or not _recording():
+        return _NULL_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def producer_span(name: str, attributes: Optional[dict] = None):
+    """Como ``span`` pero de tipo PRODUCER (publicación en el broker)"""
+    if not ENABLED or not _recording():
+        return _NULL_SPAN
+    return _tracer.start_as_current_span(name, kind=SpanKind.PRODUCER, attributes=attributes)
+
+
+def inject_headers() -> Optional[dict]:
+    """Cabeceras ``traceparent``/``tracestate`` del span actual (None si no se muestrea)"""
+    if not ENABLED or not _recording():
+        return None
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+def with_current_context(coro):
+    """
+    Envuelve ``coro`` para que corra con el contexto de traza del llamador.
+
+    Para corrutinas que se ejecutan en el loop de otro hilo
+    (``run_coroutine_threadsafe``): sin esto sus spans no tendrían padre.
+    """
+    if not ENABLED or not _recording():
+        return coro
+    ctx = otel_context.get_current()
+
+    async def run():
+        token = otel_context.attach(ctx)
+        try:
+            return await coro
+        finally:
+            otel_context.detach(token)
+
+    return run()
+
+
+def record_validation():
+    """
+    Span ``request.validate`` desde el inicio de la solicitud hasta ahora.
+
+    Se llama al entrar en el handler: cubre la lectura del cuerpo y la
+    validación de pydantic que hace FastAPI antes de llamarlo.
+    """
+    if not ENABLED or not _recording():
+        return
+    parent = trace.get_current_span()
+    _tracer.start_span("request.validate", start_time=parent.start_time).end()
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI: un span SERVER por solicitud HTTP.
+
+    Continúa la traza si la solicitud trae ``traceparent``; si no, aquí se
+    decide el muestreo de toda la traza (API, broker y worker).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _tracer is None or scope["type"] != "http" or scope["path"].startswith(UNTRACED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}", context=propagate.extract(carrier), kind=SpanKind.SERVER,
+        ) as server_span:
+            status_code = 500
+
+            async def send_wrapper(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if server_span.is_recording():
+                    server_span.update_name(f"{scope['method']} {_route_path(scope)}")
+                    server_span.set_attribute("http.status_code", status_code)
+                    if status_code >= 500:
+                        server_span.set_status(Status(StatusCode.ERROR))
+
+
+def _route_path(scope) -> str:
+    # Nombre de baja cardinalidad: /status/{task_id} en lugar del ID concreto
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(str(value), "{" + name + "}", 1)
+    return path
+
+
+@worker_init.connect
+def _setup_worker_tracing(**kwargs):
+    # En el proceso principal, antes del fork: BatchSpanProcessor rearranca
+    # su hilo en cada hijo prefork
+    setup_tracing(settings.TRACING_SERVICE_NAME + "-worker")
+
+
+@task_prerun.connect
+def _start_task_span(task_id=None, task=None, **kwargs):
+    """Continúa la traza de la publicación: espera en cola y span de la tarea"""
+    if _tracer is None:
+        return
+    request = task.request
+    traceparent = getattr(request, "traceparent", None)
+    if not traceparent:
+        return
+    parent = propagate.extract({"traceparent": traceparent, "tracestate": getattr(request, "tracestate", None) or ""})
+    delivery_info = request.delivery_info or {}
+    queue = delivery_info.get("routing_key") or ""
+
+    enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at and not request.retries:
+        # Los reintentos llevan las cabeceras originales: su espera incluiría el countdown
+        wait = _tracer.start_span(
+            "email.queue_wait", context=parent, kind=SpanKind.CONSUMER,
+            start_time=int(enqueued_at * 1e9), attributes={"messaging.destination.name": queue},
+        )
+        wait.end()
+
+    task_span = _tracer.start_span(task.name, context=parent, kind=SpanKind.CONSUMER, attributes={
+        "celery.task_id": task_id,
+        "celery.retries": request.retries or 0,
+        "messaging.destination.name": queue,
+    })
+    token = otel_context.attach(trace.set_span_in_context(task_span))
+    _task_spans[task_id] = (task_span, token)
+
+
+@task_postrun.connect
+def _end_task_span(task_id=None, state=None, **kwargs):
+    active = _task_spans.pop(task_id, None)
+    if active is None:
+        return
+    task_span, token = active
+    task_span.set_attribute("celery.state", state or "")
+    if state == "FAILURE":
+        task_span.set_status(Status(StatusCode.ERROR))
+    task_span.end()
+    otel_context.detach(token)
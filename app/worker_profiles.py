@@ -0,0 +1,95 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+from typing import Optional
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pools de Celery (-P)
+POOL_PREFORK = "prefork"
+POOL_THREADS = "threads"
+POOL_GEVENT = "gevent"
+POOLS = (POOL_PREFORK, POOL_THREADS, POOL_GEVENT)
+
+# concurrency/max_tasks_per_child en None = valor por defecto de Celery
+# (un proceso por CPU, sin reciclar)
+WorkerProfile = namedtuple('WorkerProfile', [
+    'name', 'pool', 'concurrency', 'prefetch_multiplier', 'acks_late', 'max_tasks_per_child',
+])
+
+WORKER_PROFILES = {
+    # send_email_task pasa casi todo el tiempo esperando al relay SMTP: muchos
+    # hilos en un solo proceso, cada uno con su conexión del pool SMTP
+    'io': WorkerProfile('io', POOL_THREADS, 50, 4, True, None),
+    # Un proceso por CPU para plantillas pesadas o mensajes MIME grandes; se
+    # reciclan para acotar la memoria
+    'cpu': WorkerProfile('cpu', POOL_PREFORK, None, 4, True, 1000),
+    # Lotes de EMAIL_BATCH_SIZE correos: duran segundos, así que cada proceso
+    # reserva uno solo y no retiene lotes que otro worker libre podría enviar
+    'batch': WorkerProfile('batch', POOL_PREFORK, None, 1, True, 100),
+}
+
+# Sin WORKER_PROFILE: los valores por defecto de Celery
+DEFAULT_PROFILE = WorkerProfile('', POOL_PREFORK, None, 4, False, None)
+
+
+@lru_cache(maxsize=1)
+def worker_profile() -> WorkerProfile:
+    """Perfil de ``WORKER_PROFILE`` con las sobrescrituras ``WORKER_*``/``TASK_ACKS_LATE`` aplicadas"""
+    name = settings.WORKER_PROFILE.lower()
+    profile = WORKER_PROFILES.get(name, DEFAULT_PROFILE)
+    if name and name not in WORKER_PROFILES:
+        logger.warning(f"WORKER_PROFILE inválido '{name}', usando los valores por defecto de Celery")
+
+    pool = settings.WORKER_POOL.lower()
+    if pool and pool not in POOLS:
+        logger.warning(f"WORKER_POOL inválido '{pool}', usando '{profile.pool}'")
+        pool = ""
+    acks_late = settings.TASK_ACKS_LATE.lower()
+    return profile._replace(
+        pool=pool or profile.pool,
+        concurrency=settings.WORKER_CONCURRENCY or profile.concurrency,
+        prefetch_multiplier=settings.WORKER_PREFETCH_MULTIPLIER or profile.prefetch_multiplier,
+        acks_late=profile.acks_late if not acks_late else acks_late == "true",
+        max_tasks_per_child=settings.WORKER_MAX_TASKS_PER_CHILD or profile.max_tasks_per_child,
+    )
+
+
+def celery_options(profile: Optional[WorkerProfile] = None) -> dict:
+    """
+    Configuración de Celery del perfil.
+
+    Los flags de la línea de comandos (``-P``, ``--concurrency``...) siguen
+    teniendo prioridad. ``gevent`` necesita además ``-P gevent`` en la línea
+    de comandos: Celery solo aplica el monkey patching si lo ve en ``argv``.
+    """
+    profile = profile or worker_profile()
+    return {
+        'worker_pool': profile.pool,
+        'worker_concurrency': profile.concurrency,
+        'worker_prefetch_multiplier': profile.prefetch_multiplier,
+        # Con acks_late el mensaje se confirma al terminar: si el worker muere a
+        # mitad de envío, Redis lo reentrega tras BROKER_VISIBILITY_TIMEOUT
+        'task_acks_late': profile.acks_late,
+        'task_reject_on_worker_lost': profile.acks_late,
+        'worker_max_tasks_per_child': profile.max_tasks_per_child,
+    }
+
+
+def smtp_pool_size(profile: Optional[WorkerProfile] = None) -> int:
+    """
+    Conexiones SMTP por proceso.
+
+    ``SMTP_POOL_SIZE`` es el máximo también con pools de hilos: los hilos
+    que no encuentran conexión libre esperan a que se devuelva una. Con
+    ``SMTP_POOL_SIZE=0`` el pool se ajusta al perfil: una conexión por hilo
+    (la concurrencia) o una por proceso en ``prefork``.
+    """
+    if settings.SMTP_POOL_SIZE:
+        return settings.SMTP_POOL_SIZE
+    profile = profile or worker_profile()
+    if profile.pool == POOL_PREFORK:
+        return 1
+    return profile.concurrency or os.cpu_count() or 1
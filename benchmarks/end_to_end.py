@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmark de extremo a extremo: API -> Redis -> workers -> SMTP.
+
+Levanta un SMTP sink local (``benchmarks/smtp_sink.py``), un ``redis-server``
+temporal (o usa ``--redis-url``), la API con uvicorn y ``--workers`` workers
+de Celery, y lanza ``--messages`` correos contra ``/send-email`` (o lotes de
+``--batch`` contra ``/send-emails``) con ``--concurrency`` clientes a la vez,
+mientras ``--status-pollers`` clientes consultan ``/status/{task_id}``.
+
+Mide:
+
+- ``enqueue``: correos aceptados por segundo y latencia HTTP de la API.
+- ``delivery``: correos por segundo hasta que llegan al sink y latencia de
+  extremo a extremo (petición HTTP -> DATA aceptado) por correo.
+- ``status``: latencia de ``/status/{task_id}`` bajo carga.
+- ``workers``: tareas y correos por segundo de cada worker.
+
+La salida es JSON por stdout. Con ``--baseline`` compara contra un informe
+anterior y termina con código 1 si alguna métrica empeora más de
+``--tolerance``, para detectar regresiones entre versiones:
+
+    PYTHONPATH=. python benchmarks/end_to_end.py --messages 5000 --concurrency 100 > baseline.json
+    PYTHONPATH=. python benchmarks/end_to_end.py --messages 5000 --concurrency 100 --baseline baseline.json
+
+Requiere las dependencias de requirements.txt y benchmarks/requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+import httpx
+import redis
+from app.celery_app import celery_app
+from benchmarks.smtp_sink import SMTPSink, SUBJECT_PREFIX
+from benchmarks.status_latency import percentile
+
+# Métricas comparadas con --baseline: (ruta en el informe, True si más es mejor)
+REGRESSION_METRICS = (
+    (("enqueue", "messages_per_second"), True),
+    (("enqueue", "latency_ms", "p95"), False),
+    (("delivery", "messages_per_second"), True),
+    (("delivery", "latency_ms", "p95"), False),
+    (("status", "latency_ms", "p95"), False),
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def latency_summary(values_ms: list) -> dict:
+    return {
+        "p50": round(percentile(values_ms, 50), 2),
+        "p95": round(percentile(values_ms, 95), 2),
+        "p99": round(percentile(values_ms, 99), 2),
+        "max": round(max(values_ms), 2) if values_ms else 0.0,
+    }
+
+
+def wait_until(check, timeout: float, what: str):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Tiempo agotado esperando {what}")
+
+
+def start_redis() -> tuple:
+    """``redis-server`` temporal sin persistencia"""
+    binary = shutil.which("redis-server")
+    if binary is None:
+        raise SystemExit("redis-server no está en el PATH: usa --redis-url")
+    port = free_port()
+    process = subprocess.Popen(
+        [binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"redis://127.0.0.1:{port}/0"
+    wait_until(lambda: redis.Redis.from_url(url).ping(), 10, "Redis")
+    return url, process
+
+
+def start_api(env: dict, port: int, api_workers: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        ["uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(api_workers), "--log-level", "warning"],
+        env=env, stdout=sys.stderr,
+    )
+    wait_until(lambda: httpx.get(f"http://127.0.0.1:{port}/").status_code == 200, 30, "la API")
+    return process
+
+
+def start_workers(env: dict, count: int, args) -> list:
+    command = ["celery", "-A", "app.celery_app", "worker", "--loglevel=warning"]
+    if args.worker_concurrency:
+        command.append(f"--concurrency={args.worker_concurrency}")
+    return [
+        subprocess.Popen(command + [f"--hostname=bench{index}@%h"], env=env, stdout=sys.stderr)
+        for index in range(count)
+    ]
+
+
+def stop_processes(processes: list):
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+    for process in processes:
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def bench_message(run_id: str, seq: int) -> dict:
+    return {
+        "to": f"benchmark{seq}@example.com",
+        "subject": f"{SUBJECT_PREFIX} {run_id} {seq}",
+        "body": f"Mensaje de benchmark {seq}",
+        "from_email": "benchmark@example.com",
+    }
+
+
+async def sender(client: httpx.AsyncClient, requests: asyncio.Queue, run_id: str, batch: int,
+                 sent_at: dict, task_ids: list, latencies: list, errors: list):
+    """Envía peticiones de la cola hasta vaciarla"""
+    while True:
+        try:
+            seqs = requests.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        messages = [bench_message(run_id, seq) for seq in seqs]
+        start = time.time()
+        try:
+            if batch > 1:
+                response = await client.post("/send-emails", json={"messages": messages, "batch_size": batch})
+            else:
+                response = await client.post("/send-email", json=messages[0])
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+            data = response.json()
+            task_ids.extend(data.get("task_ids") or [data["task_id"]])
+            for seq in seqs:
+                sent_at[seq] = start
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        finally:
+            latencies.append((time.time() - start) * 1000)
+
+
+async def status_poller(client: httpx.AsyncClient, task_ids: list, stop: asyncio.Event,
+                        latencies: list, errors: list):
+    while not stop.is_set():
+        if not task_ids:
+            await asyncio.sleep(0.05)
+            continue
+        start = time.perf_counter()
+        try:
+            response = await client.get(f"/status/{random.choice(task_ids)}")
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def drive(api_url: str, sink: SMTPSink, args) -> dict:
+    """Genera la carga, espera a que el sink reciba todo y devuelve las medidas"""
+    requests = asyncio.Queue()
+    batch = max(1, args.batch)
+    for start in range(0, args.messages, batch):
+        requests.put_nowait(list(range(start, min(start + batch, args.messages))))
+
+    sent_at, task_ids = {}, []
+    enqueue_latencies, enqueue_errors = [], []
+    status_latencies, status_errors = [], []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.concurrency + args.status_pollers)
+
+    async with httpx.AsyncClient(base_url=api_url, timeout=60, limits=limits) as client:
+        pollers = [
+            asyncio.create_task(status_poller(client, task_ids, stop, status_latencies, status_errors))
+            for _ in range(args.status_pollers)
+        ]
+        started = time.time()
+        await asyncio.gather(*[
+            sender(client, requests, sink.run_id, batch, sent_at, task_ids, enqueue_latencies, enqueue_errors)
+            for _ in range(args.concurrency)
+        ])
+        enqueued = time.time()
+
+        accepted = len(sent_at)
+        deadline = time.time() + args.timeout
+        while len(sink.arrivals) < accepted and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        stop.set()
+        await asyncio.gather(*pollers)
+
+    arrivals = sink.arrivals
+    delivered = len(arrivals)
+    last_arrival = max(arrivals.values()) if arrivals else enqueued
+    delivery_seconds = max(last_arrival - started, 1e-9)
+    enqueue_seconds = max(enqueued - started, 1e-9)
+    return {
+        "enqueue": {
+            "messages": accepted,
+            "requests": len(enqueue_latencies),
+            "errors": len(enqueue_errors),
+            "seconds": round(enqueue_seconds, 3),
+            "messages_per_second": round(accepted / enqueue_seconds, 1),
+            "latency_ms": latency_summary(enqueue_latencies),
+        },
+        "delivery": {
+            "delivered": delivered,
+            "complete": delivered >= args.messages,
+            "seconds": round(delivery_seconds, 3),
+            "messages_per_second": round(delivered / delivery_seconds, 1),
+            "latency_ms": latency_summary([
+                (arrived - sent_at[seq]) * 1000 for seq, arrived in arrivals.items() if seq in sent_at
+            ]),
+        },
+        "status": {
+            "requests": len(status_latencies),
+            "errors": len(status_errors),
+            "latency_ms": latency_summary(status_latencies),
+        },
+    }
+
+
+def worker_report(connection, workers: int, messages_per_second: float) -> dict:
+    """Tareas ejecutadas por cada worker (``inspect stats``) y su parte del throughput"""
+    stats = celery_app.control.inspect(timeout=2, connection=connection).stats() or {}
+    tasks = {host: sum(info.get("total", {}).values()) for host, info in stats.items()}
+    total = sum(tasks.values()) or 1
+    return {
+        "count": workers,
+        "messages_per_second_per_worker": round(messages_per_second / max(workers, 1), 1),
+        "hosts": {
+            host: {"tasks": count, "messages_per_second": round(messages_per_second * count / total, 1)}
+            for host, count in sorted(tasks.items())
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Métricas que empeoran más de ``tolerance`` respecto a ``baseline``"""
+    regressions = []
+    for path, higher_is_better in REGRESSION_METRICS:
+        current, previous = report, baseline
+        for key in path:
+            current, previous = current.get(key, {}), previous.get(key, {})
+        if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+            continue
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append({
+                "metric": ".".join(path), "baseline": previous, "current": current,
+                "change": round(change, 3),
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo con SMTP falso")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Clientes HTTP enviando a la vez")
+    parser.add_argument("--batch", type=int, default=1, help="Correos por petición (>1 usa /send-emails)")
+    parser.add_argument("--status-pollers", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--worker-profile", default="io", help="WORKER_PROFILE de los workers")
+    parser.add_argument("--worker-concurrency", type=int, default=0)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="Segundos por mensaje en el sink")
+    parser.add_argument("--redis-url", help="Redis existente (se vacía la base de datos); por defecto redis-server temporal")
+    parser.add_argument("--timeout", type=float, default=300, help="Espera máxima de la entrega (s)")
+    parser.add_argument("--baseline", help="Informe JSON anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo permitido")
+    args = parser.parse_args()
+
+    processes = []
+    sink = SMTPSink(latency=args.smtp_latency, run_id=uuid.uuid4().hex[:12])
+    try:
+        if args.redis_url:
+            redis_url = args.redis_url
+            redis.Redis.from_url(redis_url).flushdb()
+        else:
+            redis_url, redis_process = start_redis()
+            processes.append(redis_process)
+
+        smtp_port = sink.start()
+        env = dict(
+            os.environ,
+            REDIS_URL=redis_url,
+            SMTP_HOST="127.0.0.1", SMTP_PORT=str(smtp_port),
+            SMTP_USE_TLS="false", SMTP_USE_SSL="false", SMTP_USER="", SMTP_PASSWORD="",
+            RATE_LIMIT_ENABLED="false",
+            WORKER_PROFILE=args.worker_profile,
+        )
+        # stdout queda para el informe JSON
+        env.setdefault("LOG_LEVEL", "WARNING")
+        api_port = free_port()
+        print(f"📊 API :{api_port}, {args.workers} workers ({args.worker_profile}), SMTP sink :{smtp_port}",
+              file=sys.stderr)
+        processes.append(start_api(env, api_port, args.api_workers))
+        processes.extend(start_workers(env, args.workers, args))
+
+        # Conexión con las opciones de transporte de la app (separador de bindings incluido)
+        connection = celery_app.connection_for_write(redis_url)
+        wait_until(lambda: len(celery_app.control.ping(timeout=1, connection=connection)) >= args.workers,
+                   60, "los workers")
+
+        report = {
+            "config": {
+                "messages": args.messages, "concurrency": args.concurrency, "batch": args.batch,
+                "status_pollers": args.status_pollers, "workers": args.workers,
+                "worker_profile": args.worker_profile, "worker_concurrency": args.worker_concurrency,
+                "api_workers": args.api_workers, "smtp_latency": args.smtp_latency,
+                "cpus": os.cpu_count(),
+            },
+        }
+        report.update(asyncio.run(drive(f"http://127.0.0.1:{api_port}", sink, args)))
+        report["workers"] = worker_report(connection, args.workers, report["delivery"]["messages_per_second"])
+    finally:
+        stop_processes(processes[::-1])
+        sink.stop()
+
+    exit_code = 0 if report["delivery"]["complete"] else 1
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if baseline.get("config") != report["config"]:
+            print("⚠️ El informe base usa otra configuración: la comparación no es fiable", file=sys.stderr)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        for regression in report["regressions"]:
+            print(f"❌ Regresión en {regression['metric']}: {regression['baseline']} -> "
+                  f"{regression['current']} ({regression['change']:+.0%})", file=sys.stderr)
+        if report["regressions"]:
+            exit_code = 1
+    print(json.dumps(report, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
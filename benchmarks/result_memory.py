@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria del backend de resultados por modo de retención.
+
+Escribe en Redis lo mismo que escribirían los workers (con el backend
+``EmailResultBackend``) para ``--sends`` correos y extrapola el uso por
+millón de envíos en cada modo, para envíos individuales (``single``) y
+lotes de ``/send-emails`` (``bulk``):
+
+- ``full``: un resultado completo por tarea (+ el grupo en los lotes)
+- ``compact``: igual con ``RESULT_COMPACT=true``
+- ``ignore``: mensajes con ``ignore_result`` (nada por tarea)
+- ``aggregate``: solo los contadores ``email_batch_stats:<id>`` por lote
+
+Uso:
+    PYTHONPATH=. python benchmarks/result_memory.py --redis-url redis://localhost:6379/15 --sends 20000
+
+La base de datos indicada debe estar vacía: se vacía entre modos.
+"""
+import argparse
+import json
+import sys
+import uuid
+from types import SimpleNamespace
+import redis
+from app.celery_app import celery_app
+from app.config import settings
+from app.results import EmailResultBackend, BATCH_STATS_KEY, compact_result
+
+# /send-email guarda siempre su resultado; los modos ignore/aggregate son de /send-emails
+WORKLOADS = {
+    "single": ("full", "compact"),
+    "bulk": ("full", "compact", "ignore", "aggregate"),
+}
+
+def single_result(index: int) -> dict:
+    """Resultado de send_email_task tal como lo devuelve la tarea"""
+    to = f"usuario{index}@example.com"
+    return {
+        "success": True,
+        "message": f"Correo enviado exitosamente a {to}",
+        "to": to,
+        "subject": "Confirmación de tu pedido",
+        "backend_writes": 4,
+    }
+
+
+def batch_result(start: int, size: int) -> dict:
+    """Resultado de send_email_batch_task para ``size`` destinatarios enviados"""
+    return {
+        "success": True,
+        "total": size,
+        "sent": size,
+        "failed": 0,
+        "retried": 0,
+        "dead_lettered": 0,
+        "deferred": 0,
+        "results": [{"to": f"usuario{start + i}@example.com", "success": True} for i in range(size)],
+        "retry_task_id": None,
+        "deferred_task_id": None,
+        "backend_writes": 3,
+        "message": f"Lote enviado: {size}/{size} correos",
+    }
+
+
+def used_memory(client: redis.Redis):
+    """``used_memory`` de INFO o ``None`` si el servidor no lo expone"""
+    try:
+        return client.info("memory")["used_memory"]
+    except redis.ResponseError:
+        return None
+
+
+def payload_bytes(client: redis.Redis, keys: list) -> int:
+    """Bytes de claves y valores escritos (sin la sobrecarga interna de Redis)"""
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        if key.startswith(BATCH_STATS_KEY.split("{")[0]):
+            pipe.hgetall(key)
+        else:
+            pipe.strlen(key)
+    total = 0
+    for key, value in zip(keys, pipe.execute()):
+        if isinstance(value, dict):
+            value = sum(len(field) + len(item) for field, item in value.items())
+        total += len(key) + value
+    return total
+
+
+def write_mode(backend: EmailResultBackend, client: redis.Redis, mode: str, workload: str,
+               sends: int, batch_size: int) -> list:
+    """Escribe los resultados de ``sends`` envíos y devuelve las claves creadas"""
+    ignored = SimpleNamespace(ignore_result=True)
+    settings.RESULT_COMPACT = mode == "compact"
+    keys = []
+
+    def store(task_id: str, result: dict):
+        if mode == "ignore":
+            backend.store_result(task_id, result, "SUCCESS", request=ignored)
+        else:
+            backend.store_result(task_id, compact_result(result), "SUCCESS")
+            keys.append(backend.get_key_for_task(task_id).decode())
+
+    if workload == "single":
+        for index in range(sends):
+            store(str(uuid.uuid4()), single_result(index))
+        return keys
+
+    for group_start in range(0, sends, batch_size * 10):
+        # Un lote de /send-emails: 10 tareas de batch_size correos
+        batch_id = str(uuid.uuid4())
+        task_ids = []
+        for start in range(group_start, min(sends, group_start + batch_size * 10), batch_size):
+            result = batch_result(start, min(batch_size, sends - start))
+            if mode == "aggregate":
+                key = BATCH_STATS_KEY.format(batch_id=batch_id)
+                client.hset(key, mapping={"tasks": 10, "emails": batch_size * 10})
+                for field in ("sent", "failed", "retried", "deferred"):
+                    client.hincrby(key, field, result[field])
+                client.hincrby(key, "tasks_done", 1)
+            else:
+                task_ids.append(str(uuid.uuid4()))
+                store(task_ids[-1], result)
+        if mode == "aggregate":
+            keys.append(BATCH_STATS_KEY.format(batch_id=batch_id))
+        elif mode != "ignore":
+            celery_app.GroupResult(batch_id, [celery_app.AsyncResult(t) for t in task_ids]).save(backend=backend)
+            keys.append(backend.get_key_for_group(batch_id).decode())
+    return keys
+
+
+def run(redis_url: str, sends: int, batch_size: int, sends_per_day: int) -> dict:
+    client = redis.Redis.from_url(redis_url)
+    if client.dbsize():
+        sys.exit(f"La base de datos {redis_url} no está vacía; usa una dedicada al benchmark")
+
+    backend = EmailResultBackend(app=celery_app, url=redis_url)
+    retention_days = settings.RESULT_EXPIRES / 86400 if settings.RESULT_EXPIRES else None
+    report = {
+        "sends": sends,
+        "batch_size": batch_size,
+        "result_expires_s": settings.RESULT_EXPIRES,
+        "sends_per_day": sends_per_day,
+        "workloads": {},
+    }
+    try:
+        for workload, workload_modes in WORKLOADS.items():
+            modes = {}
+            for mode in workload_modes:
+                before = used_memory(client)
+                keys = write_mode(backend, client, mode, workload, sends, batch_size)
+                after = used_memory(client)
+                if before is not None:
+                    written, method = max(0, after - before), "used_memory"
+                else:
+                    written, method = payload_bytes(client, keys), "payload_bytes"
+                per_send = written / sends
+                modes[mode] = {
+                    "keys": len(keys),
+                    "bytes_per_send": round(per_send, 1),
+                    "mb_per_million_sends": round(per_send * 1_000_000 / 2**20, 1),
+                    # Memoria estable con el TTL actual (null = crece sin límite)
+                    "retained_mb": round(per_send * sends_per_day * retention_days / 2**20, 1)
+                    if retention_days else None,
+                    "method": method,
+                }
+                client.flushdb()
+            report["workloads"][workload] = modes
+    finally:
+        client.flushdb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria del backend de resultados por modo")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--sends", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=settings.EMAIL_BATCH_SIZE)
+    parser.add_argument("--sends-per-day", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"📊 Midiendo memoria de resultados para {args.sends} envíos...", file=sys.stderr)
+    print(json.dumps(run(args.redis_url, args.sends, args.batch_size, args.sends_per_day), indent=2))
+
+
+if __name__ == "__main__":
+    main()
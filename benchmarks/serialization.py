@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de los serializadores de mensajes, resultados y respuestas.
+
+Para cada codec registrado (``json``, ``msgpack`` y sus variantes
+``-zlib``/``-zstd``) mide el CPU por mensaje de los dos round trips que
+dominan el sistema:
+
+- ``enqueue``: la API construye el mensaje (``PipelinedPublisher._build``),
+  lo inserta con ``LPUSH`` y el worker lo saca y decodifica el cuerpo.
+- ``status``: el worker codifica el resultado, lo guarda con ``SET`` y la API
+  lo lee con ``GET`` y lo decodifica como ``/status``.
+
+Cada round trip se mide para un envío individual (``single``) y para un lote
+de ``--batch-size`` correos (``bulk``). Además compara ``json`` y ``orjson``
+al renderizar la respuesta de ``/status/group``.
+
+Uso:
+    PYTHONPATH=. python benchmarks/serialization.py --redis-url redis://localhost:6379/15 --messages 2000
+
+Solo usa claves ``benchmark:serialization:*`` y las borra al terminar.
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+import redis
+from kombu.serialization import prepare_accept_content
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.celery_app import celery_app
+from app.config import settings
+from app.publisher import PipelinedPublisher
+from app.results import EmailResultBackend
+from app.schemas import BatchStatusResponse
+from app.serialization import register_serializers, orjson
+
+QUEUE_KEY = "benchmark:serialization:queue"
+RESULT_KEY = "benchmark:serialization:result:{index}"
+
+
+def single_kwargs(index: int) -> dict:
+    return {
+        "to_email": f"usuario{index}@example.com",
+        "subject": "Confirmación de tu pedido",
+        "body": "Hola, tu pedido #%d está en camino. Gracias por tu compra." % index,
+        "from_email": "tienda@example.com",
+    }
+
+
+def batch_kwargs(index: int, size: int) -> dict:
+    return {"messages": [single_kwargs(index * size + i) for i in range(size)], "template": None}
+
+
+def single_result(index: int) -> dict:
+    to = f"usuario{index}@example.com"
+    return {"success": True, "message": f"Correo enviado exitosamente a {to}", "to": to,
+            "subject": "Confirmación de tu pedido", "backend_writes": 4}
+
+
+def batch_result(index: int, size: int) -> dict:
+    return {
+        "success": True, "total": size, "sent": size, "failed": 0, "retried": 0,
+        "dead_lettered": 0, "deferred": 0,
+        "results": [{"to": f"usuario{index * size + i}@example.com", "success": True} for i in range(size)],
+        "retry_task_id": None, "deferred_task_id": None, "backend_writes": 3,
+        "message": f"Lote enviado: {size}/{size} correos",
+    }
+
+
+def measure(fn, count: int) -> dict:
+    """CPU (``process_time``) y tiempo real por operación, en microsegundos"""
+    cpu, wall = time.process_time(), time.perf_counter()
+    fn()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {"cpu_us": round(cpu / count * 1e6, 1), "wall_us": round(wall / count * 1e6, 1)}
+
+
+def bench_enqueue(client, channel, publisher, queue, task_name: str, kwargs_list: list) -> dict:
+    """Construir + LPUSH (API) y RPOP + decodificar (worker)"""
+    messages = []
+
+    def build():
+        messages.extend(
+            publisher._build(channel, task_name, str(uuid.uuid4()), kwargs, None, None, 0, queue)
+            for kwargs in kwargs_list
+        )
+
+    def push_pop():
+        pipe = client.pipeline(transaction=False)
+        for start in range(0, len(messages), publisher.chunk_size):
+            pipe.lpush(QUEUE_KEY, *messages[start:start + publisher.chunk_size])
+        pipe.execute()
+        # El worker solo acepta los content types de accept_content
+        accept = prepare_accept_content(celery_app.conf.accept_content)
+        for raw in client.rpop(QUEUE_KEY, len(messages)):
+            message = channel.Message(json.loads(raw), channel=channel)
+            message.accept = accept
+            message.decode()
+
+    count = len(kwargs_list)
+    api = measure(build, count)
+    round_trip = measure(push_pop, count)
+    return {
+        "api": api,
+        "broker_and_worker": round_trip,
+        "bytes": round(sum(len(m) for m in messages) / count),
+    }
+
+
+def bench_status(client, backend, results: list) -> dict:
+    """Codificar + SET (worker) y GET + decodificar (API)"""
+    encoded = []
+
+    def encode_and_store():
+        pipe = client.pipeline(transaction=False)
+        for index, result in enumerate(results):
+            meta = backend._get_result_meta(result, "SUCCESS", None, None)
+            encoded.append(backend.encode(meta))
+            pipe.set(RESULT_KEY.format(index=index), encoded[-1])
+        pipe.execute()
+
+    def fetch_and_decode():
+        keys = [RESULT_KEY.format(index=index) for index in range(len(results))]
+        for raw in client.mget(keys):
+            backend.decode_result(raw)
+
+    count = len(results)
+    return {
+        "worker": measure(encode_and_store, count),
+        "api": measure(fetch_and_decode, count),
+        "bytes": round(sum(len(e) for e in encoded) / count),
+    }
+
+
+def bench_http(tasks: int, count: int) -> dict:
+    """Render de la respuesta de /status/group con json y orjson"""
+    response = BatchStatusResponse(
+        batch_id=str(uuid.uuid4()), total=tasks, pending=0, success=tasks, failure=0,
+        counts={"SUCCESS": tasks}, emails_sent=tasks * 100, emails_failed=0,
+        tasks=[{"task_id": str(uuid.uuid4()), "status": "SUCCESS", "error": None} for _ in range(tasks)],
+    )
+    content = jsonable_encoder(response)
+    classes = {"json": JSONResponse}
+    if orjson is not None:
+        classes["orjson"] = ORJSONResponse
+    report = {}
+    for name, response_class in classes.items():
+        renderer = response_class(content=content)
+        report[name] = measure(lambda: [renderer.render(content) for _ in range(count)], count)
+        report[name]["bytes"] = len(renderer.render(content))
+    return report
+
+
+def run(redis_url: str, count: int, batch_size: int, threshold: int) -> dict:
+    client = redis.Redis.from_url(redis_url)
+    codecs = register_serializers(threshold)
+    publisher = PipelinedPublisher()
+    original = celery_app.conf.task_serializer
+    report = {"messages": count, "batch_size": batch_size, "compression_threshold": threshold, "codecs": {}}
+
+    workloads = {
+        "single": ("send_email_task", [single_kwargs(i) for i in range(count)],
+                   [single_result(i) for i in range(count)]),
+        "bulk": ("send_email_batch_task",
+                 [batch_kwargs(i, batch_size) for i in range(max(1, count // batch_size))],
+                 [batch_result(i, batch_size) for i in range(max(1, count // batch_size))]),
+    }
+    try:
+        with celery_app.connection_for_write() as conn:
+            channel = conn.default_channel
+            for codec in codecs:
+                celery_app.conf.task_serializer = codec
+                backend = EmailResultBackend(app=celery_app, url=redis_url, serializer=codec)
+                report["codecs"][codec] = {}
+                for workload, (task_name, kwargs_list, results) in workloads.items():
+                    queue = publisher._route(task_name, {})
+                    report["codecs"][codec][workload] = {
+                        "enqueue": bench_enqueue(client, channel, publisher, queue, task_name, kwargs_list),
+                        "status": bench_status(client, backend, results),
+                    }
+                    client.delete(QUEUE_KEY, *[RESULT_KEY.format(index=i) for i in range(len(results))])
+    finally:
+        celery_app.conf.task_serializer = original
+        client.delete(QUEUE_KEY, *[RESULT_KEY.format(index=i) for i in range(count)])
+    report["http_group_status"] = bench_http(batch_size, count)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU por mensaje de cada serializador")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=settings.EMAIL_BATCH_SIZE)
+    parser.add_argument("--threshold", type=int, default=settings.SERIALIZER_COMPRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    print(f"📊 Midiendo serializadores con {args.messages} mensajes...", file=sys.stderr)
+    print(json.dumps(run(args.redis_url, args.messages, args.batch_size, args.threshold), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Servidor SMTP falso para benchmarks: acepta todo y no entrega nada.
+
+Habla lo justo del protocolo (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT)
+sobre asyncio, sin dependencias. Puede simular la latencia de un relay real
+con ``--latency`` y anota la hora de llegada de cada mensaje cuyo asunto
+empiece por ``bench <run_id> <n>``, para medir la latencia de extremo a
+extremo (ver ``benchmarks/end_to_end.py``).
+
+Uso independiente (apuntando los workers a él con ``SMTP_HOST``/``SMTP_PORT``
+y ``SMTP_USE_TLS=false``):
+    PYTHONPATH=. python benchmarks/smtp_sink.py --port 2525 --latency 0.05
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+SUBJECT_PREFIX = "bench"
+
+
+class SMTPSink:
+    """Sink SMTP en un hilo propio con su event loop"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 run_id: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.run_id = run_id
+        self.received = 0
+        self.bytes = 0
+        # Número de mensaje del benchmark -> hora de llegada (time.time())
+        self.arrivals: Dict[int, float] = {}
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _record(self, data: bytes):
+        self.received += 1
+        self.bytes += len(data)
+        headers = data.split(b"\r\n\r\n", 1)[0]
+        for line in headers.split(b"\r\n"):
+            if line[:8].lower() != b"subject:":
+                continue
+            parts = line[8:].decode("utf-8", "replace").split()
+            if len(parts) >= 3 and parts[0] == SUBJECT_PREFIX and parts[1] == self.run_id and parts[2].isdigit():
+                self.arrivals.setdefault(int(parts[2]), time.time())
+            break
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"220 smtp-sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-smtp-sink\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    chunks = []
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b".\r\n", b""):
+                            break
+                        chunks.append(chunk)
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self._record(b"".join(chunks))
+                    writer.write(b"250 OK\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    # HELO, MAIL, RCPT, RSET, NOOP...
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def start(self) -> int:
+        """Arranca el servidor y devuelve el puerto (útil con ``port=0``)"""
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._loop.run_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor SMTP falso para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por mensaje")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.latency)
+    sink.start()
+    print(f"📭 SMTP sink escuchando en {args.host}:{sink.port}", file=sys.stderr)
+    try:
+        last = 0
+        while True:
+            time.sleep(1)
+            if sink.received != last:
+                print(f"{sink.received} mensajes ({sink.received - last}/s)", file=sys.stderr)
+                last = sink.received
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia del endpoint /status/{task_id} con muchos clientes
+consultando a la vez.
+
+Uso:
+    python benchmarks/status_latency.py --pollers 1000 --duration 30
+
+Requiere la API en ejecución (uvicorn app.main:app) y las dependencias de
+benchmarks/requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import httpx
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def create_task(client: httpx.AsyncClient) -> str:
+    """Crea una tarea real para consultar su estado"""
+    response = await client.post("/send-email", json={
+        "to": "benchmark@example.com",
+        "subject": "Benchmark /status",
+        "body": "Mensaje de benchmark"
+    })
+    response.raise_for_status()
+    return response.json()["task_id"]
+
+
+async def poller(client: httpx.AsyncClient, task_id: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(f"/status/{task_id}")
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(base_url: str, pollers: int, duration: float, task_id: str = None) -> dict:
+    limits = httpx.Limits(max_connections=pollers, max_keepalive_connections=pollers)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        if not task_id:
+            task_id = await create_task(client)
+
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            poller(client, task_id, deadline, latencies, errors) for _ in range(pollers)
+        ))
+
+    return {
+        "endpoint": "/status/{task_id}",
+        "pollers": pollers,
+        "duration_s": duration,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / duration, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2) if latencies else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia de /status")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--pollers", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--task-id", default=None, help="Consultar una tarea existente")
+    args = parser.parse_args()
+
+    print(f"📊 {args.pollers} clientes consultando /status durante {args.duration}s...", file=sys.stderr)
+    report = asyncio.run(run(args.base_url, args.pollers, args.duration, args.task_id))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
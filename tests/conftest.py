@@ -0,0 +1,15 @@
+import pytest
+
+# Scripts contra el servidor en marcha (se ejecutan con python tests/<script>.py)
+collect_ignore = ["test_api.py", "test_api_complete.py", "test_docker.py"]
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """Redis en memoria (fakeredis con Lua) en lugar del cliente de los workers"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr("app.redis_client._redis", client)
+    yield client
+    client.flushall()
@@ -0,0 +1,56 @@
+import smtplib
+import aiosmtplib
+from app.delivery_errors import classify_error, retry_delay, TRANSIENT, PERMANENT
+
+
+def test_smtp_4xx_es_transitorio():
+    """Una respuesta 4xx se reintenta"""
+    error = smtplib.SMTPResponseException(451, b"Try again later")
+    assert classify_error(error) == (TRANSIENT, 451)
+
+
+def test_smtp_5xx_es_permanente():
+    """Una respuesta 5xx va directa a dead letters"""
+    error = smtplib.SMTPResponseException(550, b"Mailbox unavailable")
+    assert classify_error(error) == (PERMANENT, 550)
+
+
+def test_destinatarios_rechazados_usa_su_codigo():
+    """Los rechazos de destinatario se clasifican por su código SMTP"""
+    error = smtplib.SMTPRecipientsRefused({"a@example.com": (452, b"Too many recipients")})
+    assert classify_error(error) == (TRANSIENT, 452)
+
+    error = aiosmtplib.SMTPRecipientsRefused([
+        aiosmtplib.SMTPRecipientRefused(550, "No such user", "a@example.com")
+    ])
+    assert classify_error(error) == (PERMANENT, 550)
+
+
+def test_aiosmtplib_respuesta():
+    """Los errores de aiosmtplib usan el mismo criterio que los de smtplib"""
+    assert classify_error(aiosmtplib.SMTPResponseException(421, "Busy")) == (TRANSIENT, 421)
+    assert classify_error(aiosmtplib.SMTPResponseException(554, "Rejected")) == (PERMANENT, 554)
+
+
+def test_errores_de_red_son_transitorios():
+    """Desconexiones, timeouts y errores de socket se reintentan"""
+    for error in (smtplib.SMTPServerDisconnected("closed"),
+                  aiosmtplib.SMTPServerDisconnected("closed"),
+                  aiosmtplib.SMTPConnectError("refused"),
+                  aiosmtplib.SMTPTimeoutError("timeout"),
+                  ConnectionRefusedError(),
+                  TimeoutError()):
+        assert classify_error(error) == (TRANSIENT, None), error
+
+
+def test_otros_errores_son_permanentes():
+    """Un error que no es de SMTP ni de red no mejora al reintentar"""
+    assert classify_error(ValueError("plantilla inválida")) == (PERMANENT, None)
+    assert classify_error(KeyError("variable")) == (PERMANENT, None)
+
+
+def test_retry_delay_con_limite_y_jitter():
+    """El retardo crece exponencialmente, con tope y con la mitad aleatoria"""
+    for attempt in range(10):
+        delay = min(100.0, 2.0 * (2 ** attempt))
+        assert delay / 2 <= retry_delay(attempt, base=2.0, cap=100.0) <= delay
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from app.idempotency import (
+    DELIVERY_KEY, IDEMPOTENCY_KEY, SENDING, SENT,
+    claim_delivery, claim_task_id, mark_delivered, release_delivery, release_task_id,
+)
+
+
+def test_claim_delivery_una_sola_vez(redis_client):
+    """Solo la primera entrega del mensaje puede enviar el correo"""
+    assert claim_delivery("k1", "task-1") == (True, None)
+    assert claim_delivery("k1", "task-1") == (False, SENDING)
+    assert claim_delivery("k1", "task-2") == (False, SENDING)
+
+
+def test_mark_delivered(redis_client):
+    """Tras enviar, las entregas repetidas ven el correo como enviado"""
+    claim_delivery("k1", "task-1")
+    mark_delivered("k1", "task-1")
+    assert redis_client.get(DELIVERY_KEY.format(key="k1")) == b"sent:task-1"
+    assert claim_delivery("k1", "task-2") == (False, SENT)
+
+
+def test_release_delivery_permite_reintentar(redis_client):
+    """Un fallo libera la reserva y el reintento puede enviar"""
+    claim_delivery("k1", "task-1")
+    release_delivery("k1", "task-1")
+    assert claim_delivery("k1", "task-1") == (True, None)
+
+
+def test_release_delivery_no_borra_reserva_ajena(redis_client):
+    """Una tarea no libera la reserva ni el envío de otra"""
+    claim_delivery("k1", "task-1")
+    release_delivery("k1", "task-2")
+    assert claim_delivery("k1", "task-2") == (False, SENDING)
+
+    mark_delivered("k1", "task-1")
+    release_delivery("k1", "task-1")
+    assert claim_delivery("k1", "task-3") == (False, SENT)
+
+
+def test_claim_delivery_expira(redis_client):
+    """Si el worker muere a mitad, la reserva expira y otro puede enviar"""
+    claim_delivery("k1", "task-1")
+    assert redis_client.ttl(DELIVERY_KEY.format(key="k1")) > 0
+    redis_client.delete(DELIVERY_KEY.format(key="k1"))
+    assert claim_delivery("k1", "task-2") == (True, None)
+
+
+def test_claim_task_id():
+    """La API devuelve la tarea ya creada para una clave repetida"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        assert await claim_task_id(client, "k1", "task-1") is None
+        assert await claim_task_id(client, "k1", "task-2") == "task-1"
+        assert await client.ttl(IDEMPOTENCY_KEY.format(key="k1")) > 0
+
+        # Si no se pudo encolar, la clave queda libre (solo la libera su tarea)
+        await release_task_id(client, "k1", "task-2")
+        assert await claim_task_id(client, "k1", "task-3") == "task-1"
+        await release_task_id(client, "k1", "task-1")
+        assert await claim_task_id(client, "k1", "task-3") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from app.publisher import BackgroundPublisher
+
+
+class StubPublisher:
+    """Sustituye a PipelinedPublisher: registra los lotes y puede retener uno"""
+
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.error = error
+        self.started = threading.Event()
+        self.proceed = threading.Event()
+        self.proceed.set()
+
+    def publish(self, task_name, kwargs_list, priority=0, options=None, task_ids=None, trace_headers=None):
+        self.started.set()
+        self.proceed.wait(5)
+        self.batches.append(list(task_ids))
+        if self.error:
+            raise self.error
+        return task_ids
+
+
+def test_publica_en_micro_lotes():
+    """Las tareas que llegan juntas se publican en un solo lote"""
+    stub = StubPublisher()
+    publisher = BackgroundPublisher(publisher=stub, batch_size=10, max_wait=0.05)
+
+    async def scenario():
+        return await asyncio.gather(*[
+            publisher.enqueue("send_email_task", {"to_email": f"{i}@example.com"}) for i in range(3)
+        ])
+
+    task_ids = asyncio.run(scenario())
+    assert stub.batches == [task_ids]
+    assert publisher.stats()["published"] == 3
+
+
+def test_handler_cancelado_no_tumba_el_hilo():
+    """Cancelar a un handler que espera no deja colgados a los demás ni a los siguientes"""
+    stub = StubPublisher()
+    stub.proceed.clear()
+    publisher = BackgroundPublisher(publisher=stub, batch_size=10, max_wait=0.05)
+
+    async def scenario():
+        waiters = [
+            asyncio.create_task(publisher.enqueue("send_email_task", {"to_email": f"{i}@example.com"}))
+            for i in range(3)
+        ]
+        # Lote en vuelo: se cancela uno de sus handlers antes de que Redis confirme
+        await asyncio.get_running_loop().run_in_executor(None, stub.started.wait, 5)
+        waiters[1].cancel()
+        await asyncio.sleep(0)
+        stub.proceed.set()
+
+        results = await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True), 5)
+        later = await asyncio.wait_for(publisher.enqueue("send_email_task", {"to_email": "x@example.com"}), 5)
+        return results, later
+
+    results, later = asyncio.run(scenario())
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert isinstance(results[0], str) and isinstance(results[2], str)
+    # El mensaje del handler cancelado se publica igual
+    assert len(stub.batches[0]) == 3
+    assert stub.batches[-1] == [later]
+
+
+def test_error_de_publicacion_llega_a_todos():
+    """Si falla el lote, cada handler recibe la excepción y el hilo sigue vivo"""
+    stub = StubPublisher(error=ConnectionError("redis caído"))
+    publisher = BackgroundPublisher(publisher=stub, batch_size=10, max_wait=0.05)
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(*[
+            publisher.enqueue("send_email_task", {"to_email": f"{i}@example.com"}) for i in range(2)
+        ], return_exceptions=True), 5)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert publisher.stats()["failed"] == 2
+
+    stub.error = None
+    assert isinstance(asyncio.run(asyncio.wait_for(
+        publisher.enqueue("send_email_task", {"to_email": "x@example.com"}), 5
+    )), str)
@@ -0,0 +1,54 @@
+import time
+from app.config import settings
+from app.scheduler import ScheduleDispatcher, schedule_messages
+
+QUEUE = "email_bulk"
+STREAM = f"{settings.STREAM_PREFIX}:email_bulk"
+
+
+def schedule(redis_client, key, messages, send_at):
+    pipe = redis_client.pipeline(transaction=False)
+    schedule_messages(pipe, key, messages, send_at)
+    pipe.execute()
+
+
+def test_release_due_solo_vencidos(redis_client):
+    """Solo se liberan los mensajes cuyo send_at ya pasó"""
+    now = time.time()
+    schedule(redis_client, QUEUE, {"t1": "m1", "t2": "m2"}, now - 10)
+    schedule(redis_client, QUEUE, {"t3": "m3"}, now + 3600)
+
+    assert ScheduleDispatcher(batch_size=10).release_due() == 2
+    assert sorted(redis_client.lrange(QUEUE, 0, -1)) == [b"m1", b"m2"]
+    assert redis_client.zrange(settings.SCHEDULE_KEY, 0, -1) == [b"t3"]
+    assert redis_client.hkeys(settings.SCHEDULE_PAYLOAD_KEY) == [b"t3"]
+
+
+def test_release_due_por_lotes(redis_client):
+    """Cada llamada libera como mucho batch_size mensajes y no repite ninguno"""
+    messages = {f"t{i}": f"m{i}" for i in range(5)}
+    schedule(redis_client, QUEUE, messages, time.time() - 1)
+    dispatcher = ScheduleDispatcher(batch_size=2)
+
+    assert [dispatcher.release_due() for _ in range(4)] == [2, 2, 1, 0]
+    assert sorted(redis_client.lrange(QUEUE, 0, -1)) == sorted(m.encode() for m in messages.values())
+    assert redis_client.zcard(settings.SCHEDULE_KEY) == 0
+
+
+def test_release_due_a_stream(redis_client):
+    """Los destinos con el prefijo de streams se publican con XADD"""
+    schedule(redis_client, STREAM, {"t1": "m1"}, time.time() - 1)
+
+    assert ScheduleDispatcher(batch_size=10).release_due() == 1
+    entries = redis_client.xrange(STREAM)
+    assert [fields for _, fields in entries] == [{b"message": b"m1"}]
+    assert not redis_client.exists(QUEUE)
+
+
+def test_release_due_sin_payload(redis_client):
+    """Un envío cancelado a medias (sin payload) se descarta sin error"""
+    redis_client.zadd(settings.SCHEDULE_KEY, {"t1": time.time() - 1})
+
+    assert ScheduleDispatcher(batch_size=10).release_due() == 1
+    assert redis_client.zcard(settings.SCHEDULE_KEY) == 0
+    assert not redis_client.exists(QUEUE)
@@ -0,0 +1,69 @@
+import pytest
+from pydantic import ValidationError
+from app.config import settings
+from app.schemas import BulkEmailRequest
+
+MESSAGE = {"to": "a@example.com", "subject": "Hola", "body": "Cuerpo"}
+TEMPLATE = {"subject": "Hola {{ name }}", "body": "Cuerpo"}
+
+
+def test_modo_mensajes():
+    """Una lista de mensajes genera una tarea por mensaje"""
+    request = BulkEmailRequest(messages=[MESSAGE, dict(MESSAGE, to="b@example.com")])
+    kwargs = request.to_task_kwargs()
+    assert [item["to_email"] for item in kwargs] == ["a@example.com", "b@example.com"]
+
+
+def test_modo_plantilla_registrada():
+    """Con template_id solo viajan destinatario y variables"""
+    request = BulkEmailRequest(
+        template_id="welcome",
+        recipients=["a@example.com"],
+        personalized=[{"to": "b@example.com", "variables": {"name": "Bea"}}],
+    )
+    assert request.to_task_kwargs() == [
+        {"to_email": "a@example.com"},
+        {"to_email": "b@example.com", "variables": {"name": "Bea"}},
+    ]
+
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"messages": [MESSAGE], "template": TEMPLATE, "recipients": ["a@example.com"]},
+    {"messages": [MESSAGE], "template_id": "welcome", "recipients": ["a@example.com"]},
+    {"template": TEMPLATE},
+    {"template_id": "welcome"},
+    {"messages": [MESSAGE], "personalized": [{"to": "b@example.com"}]},
+])
+def test_modos_invalidos(data):
+    """Hay que usar exactamente un modo y con sus campos obligatorios"""
+    with pytest.raises(ValidationError):
+        BulkEmailRequest(**data)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("idempotency_key", "k-1"),
+    ("queue", "transactional"),
+    ("priority", 9),
+    ("send_at", "2030-01-01T00:00:00Z"),
+])
+def test_opciones_por_mensaje_rechazadas(field, value):
+    """Las opciones de un envío individual no se ignoran en silencio dentro de un lote"""
+    with pytest.raises(ValidationError, match="Extra inputs are not permitted"):
+        BulkEmailRequest(messages=[dict(MESSAGE, **{field: value})])
+
+
+def test_limite_de_mensajes(monkeypatch):
+    """No se aceptan más de BULK_MAX_MESSAGES destinatarios por solicitud"""
+    monkeypatch.setattr(settings, "BULK_MAX_MESSAGES", 2)
+    BulkEmailRequest(template=TEMPLATE, recipients=["a@example.com", "b@example.com"])
+    with pytest.raises(ValidationError, match="Máximo 2"):
+        BulkEmailRequest(template=TEMPLATE, recipients=["a@example.com", "b@example.com", "c@example.com"])
+
+
+def test_batch_size_y_prioridad_fuera_de_rango():
+    """batch_size y priority se validan en la API"""
+    with pytest.raises(ValidationError):
+        BulkEmailRequest(messages=[MESSAGE], batch_size=0)
+    with pytest.raises(ValidationError):
+        BulkEmailRequest(messages=[MESSAGE], priority=10)
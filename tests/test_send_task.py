@@ -0,0 +1,69 @@
+import pytest
+from app import tasks
+from app.idempotency import DELIVERY_KEY, claim_delivery, mark_delivered
+from app.tasks import send_email_task
+
+
+class StubRateLimiter:
+    """Cuenta los tokens pedidos y concede o deniega todos"""
+
+    def __init__(self, grant: bool):
+        self.grant = grant
+        self.requested = []
+
+    def acquire(self, recipients):
+        self.requested.extend(recipients)
+        return [self.grant] * len(recipients), 1.0
+
+
+class Retry(Exception):
+    pass
+
+
+@pytest.fixture
+def task(redis_client, monkeypatch):
+    """send_email_task con la petición ``task-1`` y ``retry`` que solo lanza"""
+    def retry(**kwargs):
+        return Retry(kwargs)
+
+    monkeypatch.setattr(send_email_task, "retry", retry)
+    send_email_task.push_request(id="task-1", kwargs={})
+    yield send_email_task
+    send_email_task.pop_request()
+
+
+def run(task, key):
+    return task.run(to_email="a@example.com", subject="Hola", body="Cuerpo", idempotency_key=key)
+
+
+def test_duplicado_enviado_no_gasta_tokens(task, monkeypatch):
+    """Un correo ya enviado se omite sin pedir tokens al rate limiter"""
+    limiter = StubRateLimiter(grant=True)
+    monkeypatch.setattr(tasks, "get_rate_limiter", lambda: limiter)
+    mark_delivered("k1", "task-0")
+
+    result = run(task, "k1")
+    assert result["duplicate"] is True
+    assert limiter.requested == []
+
+
+def test_duplicado_en_vuelo_no_gasta_tokens(task, monkeypatch):
+    """Si otra entrega está enviando el correo se reintenta sin pedir tokens"""
+    limiter = StubRateLimiter(grant=True)
+    monkeypatch.setattr(tasks, "get_rate_limiter", lambda: limiter)
+    claim_delivery("k1", "task-0")
+
+    with pytest.raises(Retry):
+        run(task, "k1")
+    assert limiter.requested == []
+
+
+def test_sin_tokens_libera_la_reserva(task, monkeypatch, redis_client):
+    """Sin tokens la tarea se aplaza y deja libre la reserva para su reintento"""
+    limiter = StubRateLimiter(grant=False)
+    monkeypatch.setattr(tasks, "get_rate_limiter", lambda: limiter)
+
+    with pytest.raises(Retry):
+        run(task, "k1")
+    assert limiter.requested == ["a@example.com"]
+    assert not redis_client.exists(DELIVERY_KEY.format(key="k1"))
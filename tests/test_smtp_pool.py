@@ -0,0 +1,190 @@
+import smtplib
+import pytest
+from app.smtp_pool import SMTPConnectionPool
+
+
+class FakeSMTP:
+    """Sustituye a smtplib.SMTP: registra las conexiones y simula fallos"""
+
+    instances = []
+    noop_code = 250
+    login_error = None
+    # Número de envíos (global, desde 1) en los que el servidor corta la conexión
+    disconnect_on = ()
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.noops = 0
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        if FakeSMTP.login_error:
+            raise FakeSMTP.login_error
+
+    def noop(self):
+        self.noops += 1
+        if FakeSMTP.noop_code is None:
+            raise smtplib.SMTPServerDisconnected("cerrada")
+        return FakeSMTP.noop_code, b"OK"
+
+    def send_message(self, message):
+        FakeSMTP.sends += 1
+        if FakeSMTP.sends in FakeSMTP.disconnect_on:
+            raise smtplib.SMTPServerDisconnected("cerrada")
+        self.sent.append(message)
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.noop_code = 250
+    FakeSMTP.login_error = None
+    FakeSMTP.disconnect_on = ()
+    FakeSMTP.sends = 0
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    return FakeSMTP
+
+
+def make_pool(**kwargs):
+    options = dict(host="localhost", port=2525, user="user", password="secret", max_size=2)
+    options.update(kwargs)
+    return SMTPConnectionPool(**options)
+
+
+def test_reutiliza_la_conexion(smtp):
+    """Varios envíos seguidos usan una sola sesión SMTP"""
+    pool = make_pool()
+    for message in ("m1", "m2", "m3"):
+        pool.send_message(message)
+
+    assert len(smtp.instances) == 1
+    assert smtp.instances[0].sent == ["m1", "m2", "m3"]
+    assert pool.stats() == {"max_size": 2, "in_use": 0, "idle": 1}
+
+
+def test_recicla_por_inactividad(smtp):
+    """Una conexión inactiva más de idle_timeout se cierra y se abre otra"""
+    pool = make_pool(idle_timeout=60)
+    pool.send_message("m1")
+    pool._idle[0].last_used -= 61
+    pool.send_message("m2")
+
+    assert len(smtp.instances) == 2
+    assert smtp.instances[0].closed
+    assert smtp.instances[1].sent == ["m2"]
+
+
+def test_recicla_por_tiempo_de_vida(smtp):
+    """Una conexión más antigua que max_lifetime no se reutiliza aunque esté activa"""
+    pool = make_pool(max_lifetime=600)
+    pool.send_message("m1")
+    pool._idle[0].created_at -= 601
+    pool.send_message("m2")
+
+    assert len(smtp.instances) == 2
+    assert smtp.instances[0].closed
+
+
+def test_recicla_por_numero_de_mensajes(smtp):
+    """Tras max_messages envíos la conexión se cierra al devolverla"""
+    pool = make_pool(max_messages=2)
+    for message in ("m1", "m2", "m3"):
+        pool.send_message(message)
+
+    assert [conn.sent for conn in smtp.instances] == [["m1", "m2"], ["m3"]]
+    assert smtp.instances[0].closed
+    assert not smtp.instances[1].closed
+
+
+def test_lote_respeta_max_messages(smtp):
+    """Un lote mayor que max_messages se reparte en varias sesiones"""
+    pool = make_pool(max_messages=2)
+    errors = pool.send_messages(["m1", "m2", "m3", "m4", "m5"])
+
+    assert errors == [None] * 5
+    assert [conn.sent for conn in smtp.instances] == [["m1", "m2"], ["m3", "m4"], ["m5"]]
+    assert smtp.instances[0].closed and smtp.instances[1].closed
+    assert pool.stats()["in_use"] == 0
+
+
+def test_noop_tras_health_check_interval(smtp):
+    """Una conexión sin uso reciente se comprueba con NOOP antes de reutilizarla"""
+    pool = make_pool(health_check_interval=15, idle_timeout=60)
+    pool.send_message("m1")
+    pool.send_message("m2")
+    assert smtp.instances[0].noops == 0
+
+    pool._idle[0].last_used -= 20
+    pool.send_message("m3")
+    assert smtp.instances[0].noops == 1
+    assert len(smtp.instances) == 1
+
+
+@pytest.mark.parametrize("noop_code", [421, None])
+def test_noop_fallido_abre_otra_conexion(smtp, noop_code):
+    """Si el NOOP no responde 250 la conexión se descarta"""
+    pool = make_pool(health_check_interval=15, idle_timeout=60)
+    pool.send_message("m1")
+    pool._idle[0].last_used -= 20
+    smtp.noop_code = noop_code
+    pool.send_message("m2")
+
+    assert len(smtp.instances) == 2
+    assert smtp.instances[0].closed
+    assert smtp.instances[1].sent == ["m2"]
+
+
+def test_reconecta_una_vez_si_el_servidor_cierra(smtp):
+    """Un corte del servidor en una conexión reutilizada se reintenta con otra"""
+    pool = make_pool()
+    pool.send_message("m1")
+    smtp.disconnect_on = (2,)
+    pool.send_message("m2")
+
+    assert len(smtp.instances) == 2
+    assert smtp.instances[1].sent == ["m2"]
+    assert pool.stats() == {"max_size": 2, "in_use": 0, "idle": 1}
+
+
+def test_no_reconecta_mas_de_una_vez(smtp):
+    """Si también se corta la conexión nueva el error llega a la tarea"""
+    pool = make_pool()
+    smtp.disconnect_on = (1, 2)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send_message("m1")
+
+    assert len(smtp.instances) == 2
+    assert pool.stats()["in_use"] == 0
+
+
+def test_lote_reintenta_el_mensaje_cortado(smtp):
+    """En un lote, el mensaje en el que se cortó la conexión se reintenta una vez"""
+    pool = make_pool()
+    smtp.disconnect_on = (2, 3)
+    errors = pool.send_messages(["m1", "m2", "m3"])
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], smtplib.SMTPServerDisconnected)
+    assert [conn.sent for conn in smtp.instances] == [["m1"], [], ["m3"]]
+
+
+def test_login_fallido_cierra_el_socket(smtp):
+    """Un fallo de autenticación no deja la conexión abierta ni ocupa el pool"""
+    smtp.login_error = smtplib.SMTPAuthenticationError(535, b"Bad credentials")
+    pool = make_pool()
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        pool.send_message("m1")
+
+    assert smtp.instances[0].closed
+    assert pool.stats() == {"max_size": 2, "in_use": 0, "idle": 0}
@@ -0,0 +1,84 @@
+from app.schemas import ResultMode
+from app.status import summarize, summarize_aggregate
+
+
+def batch_result(sent=0, dead_lettered=0, retried=0, deferred=0, retry_task_id=None, deferred_task_id=None):
+    """Resultado de send_email_batch_task con los campos que usa summarize"""
+    return {
+        "status": "SUCCESS",
+        "result": {
+            "sent": sent,
+            "dead_lettered": dead_lettered,
+            "retried": retried,
+            "deferred": deferred,
+            "retry_task_id": retry_task_id,
+            "deferred_task_id": deferred_task_id,
+        },
+    }
+
+
+def test_tareas_individuales():
+    """Cada send_email_task cuenta como un correo enviado o fallido"""
+    metas = [
+        {"status": "SUCCESS", "result": {"success": True}},
+        {"status": "SUCCESS", "result": {"success": False, "error": "rechazado"}},
+        {"status": "FAILURE", "result": ValueError("permanente")},
+        {"status": "PENDING", "result": None},
+        {"status": "PROGRESS", "result": {"current": 1}},
+    ]
+    summary = summarize(["t1", "t2", "t3", "t4", "t5"], metas, batch_id="b1")
+
+    assert summary.batch_id == "b1"
+    assert (summary.total, summary.pending, summary.success, summary.failure) == (5, 2, 2, 1)
+    assert (summary.emails_sent, summary.emails_failed, summary.emails_pending) == (1, 2, 0)
+    assert summary.tasks[1].error == "rechazado"
+    assert summary.tasks[2].error == "permanente"
+
+
+def test_lote_con_reintento_pendiente():
+    """Los destinatarios reintentados siguen pendientes mientras su tarea no termina"""
+    metas = [
+        batch_result(sent=8, dead_lettered=1, retried=1, retry_task_id="retry-1"),
+        {"status": "PENDING", "result": None},
+    ]
+    summary = summarize(["batch-1", "retry-1"], metas)
+
+    assert (summary.emails_sent, summary.emails_failed, summary.emails_pending) == (8, 1, 1)
+    assert summary.pending == 1
+
+
+def test_lote_con_reintento_terminado():
+    """Cuando el reintento termina sus correos los cuenta él, no la tarea original"""
+    metas = [
+        batch_result(sent=8, dead_lettered=1, retried=1, deferred=2,
+                     retry_task_id="retry-1", deferred_task_id="deferred-1"),
+        batch_result(dead_lettered=1),
+        batch_result(sent=2),
+    ]
+    summary = summarize(["batch-1", "retry-1", "deferred-1"], metas)
+
+    assert (summary.emails_sent, summary.emails_failed, summary.emails_pending) == (10, 2, 0)
+    assert (summary.pending, summary.success) == (0, 3)
+
+
+def test_reintento_fuera_del_grupo_sigue_pendiente():
+    """Un reintento que aún no aparece en el grupo no se da por terminado"""
+    summary = summarize(["batch-1"], [batch_result(sent=3, retried=2, retry_task_id="retry-1")])
+    assert summary.emails_pending == 2
+
+
+def test_aggregate():
+    """En modo aggregate los totales cuentan correos a partir de los contadores"""
+    stats = {"tasks": 2, "emails": 10, "sent": 6, "failed": 1, "retried": 2, "deferred": 0, "tasks_done": 1}
+    summary = summarize_aggregate("b1", stats)
+
+    assert summary.mode == ResultMode.AGGREGATE
+    assert (summary.total, summary.pending, summary.success, summary.failure) == (10, 3, 6, 1)
+    assert (summary.emails_sent, summary.emails_failed, summary.emails_pending) == (6, 1, 3)
+    assert summary.tasks == []
+
+
+def test_aggregate_sin_contadores():
+    """Un lote recién creado no tiene envíos y nunca da pendientes negativos"""
+    summary = summarize_aggregate("b1", {"tasks": 1, "emails": 0})
+    assert (summary.total, summary.pending, summary.emails_pending) == (0, 0, 0)
@@ -0,0 +1,45 @@
+import time
+import pytest
+from app.config import settings
+from app.streams import StreamWorker, stream_key
+
+
+@pytest.fixture
+def worker(redis_client, monkeypatch):
+    """Consumidor con 3 hilos que registra las entradas en lugar de enviarlas"""
+    worker = StreamWorker(queues=["email_transactional", "email_bulk"], consumer="c-new",
+                          concurrency=3, batch_size=10)
+    worker.ensure_groups()
+    worker.submitted = []
+    monkeypatch.setattr(worker, "_submit", lambda stream, entry_id, fields, redelivered=False:
+                        worker.submitted.append((stream, entry_id)))
+    yield worker
+    worker._executor.shutdown(wait=False)
+
+
+def add(redis_client, queue, count):
+    for i in range(count):
+        redis_client.xadd(stream_key(queue), {"message": f"{queue}-{i}"})
+
+
+def test_read_respeta_hilos_libres_y_prioridad(worker, redis_client):
+    """Se lee como mucho una entrada por hilo libre, primero de transactional"""
+    add(redis_client, "email_bulk", 5)
+    add(redis_client, "email_transactional", 2)
+
+    counts = {stream: len(entries) for stream, entries in worker._read(3)}
+    assert counts == {stream_key("email_transactional").encode(): 2, stream_key("email_bulk").encode(): 1}
+
+
+def test_reclaim_respeta_hilos_libres(worker, redis_client, monkeypatch):
+    """XAUTOCLAIM no reclama más entradas de las que caben en los hilos libres"""
+    monkeypatch.setattr(settings, "STREAM_CLAIM_IDLE", 0.05)
+    add(redis_client, "email_bulk", 5)
+    # Un consumidor que murió con las 5 entradas pendientes
+    redis_client.xreadgroup(worker.group, "c-dead", {stream_key("email_bulk"): ">"}, count=10)
+    time.sleep(0.1)
+
+    assert worker.reclaim(2) == 2
+    assert len(worker.submitted) == 2
+    assert worker.reclaim(10) == 3
+    assert len({entry_id for _, entry_id in worker.submitted}) == 5